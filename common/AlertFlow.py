@@ -1,120 +1,434 @@
+import random
+import selectors
 import socket
+import struct
 import sys
-from threading import Thread, RLock
-from typing import Optional, cast
+import time
+from collections import deque
+from enum import Enum
+from threading import Condition, RLock, Thread
+from typing import Iterator, Optional, cast
 
 TCP_TIMEOUT = 10_000 # milliseconds
+LISTEN_BACKLOG = 4096 # connections (capped by the kernel)
+MAX_FRAME_LENGTH = 1 << 20 # bytes
+LARGE_FRAME_LENGTH = 1 << 16 # bytes (larger incomplete frames are received into their own buffer)
+RECEIVE_BUFFER_SIZE = 1 << 18 # bytes (shared by every connection)
+
+SEND_BATCH_SIZE = 511 # alerts (two buffers each, plus the frame header, out of 1024 for sendmsg)
+OUTBOX_SIZE = 4096 # alerts (default limit)
+
+RECONNECT_MINIMUM_DELAY = 0.1 # seconds
+RECONNECT_MAXIMUM_DELAY = 30.0 # seconds
+RECONNECT_TIMEOUT = 5.0 # seconds
+
+# A connection starts with a frame holding the agent's host name. Every other frame holds a batch
+# of alerts, each one preceded by its length.
+FRAME_LENGTH_STRUCT = struct.Struct('>I') # Counts itself
+ALERT_LENGTH_STRUCT = struct.Struct('>I')
 
 class AlertFlowException(Exception):
     pass
 
+def reconnect_delays() -> Iterator[float]:
+    # Exponential backoff, with jitter so that agents don't reconnect all at once
+    delay = RECONNECT_MINIMUM_DELAY
+    while True:
+        yield random.uniform(delay / 2, delay)
+        delay = min(delay * 2, RECONNECT_MAXIMUM_DELAY)
+
+# What happens to an alert sent when the outbox is full
+class AlertFlowOverflowPolicy(Enum):
+    DROP_OLDEST = 0 # The oldest queued alert is dropped
+    DROP_NEWEST = 1 # The new alert is dropped
+    RAISE = 2 # The new alert is dropped, and send raises AlertFlowException
+
+class AlertFlowConnectionState:
+    def __init__(self, connection: socket.socket):
+        self.connection = connection
+        self.host: Optional[str] = None # Until the handshake is received
+
+        # What doesn't form a complete frame yet. Usually empty, so that idle connections don't
+        # hold any buffer.
+        self.received = b''
+
+        # A large frame being received, and how much of it has arrived
+        self.frame: Optional[bytearray] = None
+        self.frame_received = 0
+
+# pylint: disable-next=too-many-instance-attributes
 class AlertFlow:
-    def __init__(self, own_host_name: str, bind_port: Optional[int] = None):
-        self.__socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.__socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_USER_TIMEOUT, TCP_TIMEOUT)
+    def __init__(self,
+                 own_host_name: str,
+                 bind_port: Optional[int] = None,
+                 outbox_size: int = OUTBOX_SIZE,
+                 overflow_policy: AlertFlowOverflowPolicy = AlertFlowOverflowPolicy.DROP_OLDEST):
+
+        if outbox_size < 1:
+            raise AlertFlowException('Outbox size must be positive')
 
-        self.__own_host_name = own_host_name
+        self.__socket = AlertFlow.__create_socket()
+
+        own_host_name_bytes = own_host_name.encode('utf-8')
+        self.__handshake = \
+            FRAME_LENGTH_STRUCT.pack(FRAME_LENGTH_STRUCT.size + len(own_host_name_bytes)) + \
+            own_host_name_bytes
         if bind_port is not None:
+            self.__socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1) # Quick restarts
             self.__socket.bind(('0.0.0.0', bind_port))
 
-        self.__connected_addr: Optional[str] = None
-        self.__connected_port: Optional[int] = None
+        self.__connected_addr_port: Optional[tuple[str, int]] = None
         self.__lock = RLock()
 
+        # Alerts waiting for the flusher thread, which is started on connection and also reconnects
+        self.__outbox: deque[bytes] = deque()
+        self.__outbox_size = outbox_size
+        self.__overflow_policy = overflow_policy
+        self.__outbox_condition = Condition()
+        self.__flusher: Optional[Thread] = None
+        self.__closing = False
+
+        self.__dropped_alerts = 0
+        self.__reconnections = 0
+
+    @staticmethod
+    def __create_socket() -> socket.socket:
+        new_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        new_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_USER_TIMEOUT, TCP_TIMEOUT)
+        new_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1) # Batching is done here
+        return new_socket
+
     def connect(self, addr: str, port: int) -> None:
         with self.__lock:
             self.__socket.connect((addr, port))
-            self.__connected_addr = addr
-            self.__connected_port = port
+            self.__socket.sendall(self.__handshake)
+            self.__connected_addr_port = (addr, port)
+
+        with self.__outbox_condition:
+            if self.__flusher is None:
+                self.__flusher = Thread(target=self.__flush_loop)
+                self.__flusher.daemon = True
+                self.__flusher.start()
 
     def close(self) -> None:
+        # Queued alerts are flushed first, unless the connection is down
+        with self.__outbox_condition:
+            self.__closing = True
+            self.__outbox_condition.notify()
+            flusher = self.__flusher
+
+        if flusher is not None:
+            flusher.join()
+
         with self.__lock:
             self.__socket.close()
 
-    def __construct_segment(self, message: bytes) -> bytes:
-        own_host_name_bytes = self.__own_host_name.encode('utf-8') + b'\0'
-        segment_length = len(message) + len(own_host_name_bytes) + 2
-        length_bytes = segment_length.to_bytes(2, 'big')
+    def send(self, message: bytes) -> None:
+        # Queued for the flusher thread, which sends it right away unless it's busy sending others
+        # or reconnecting
+        if FRAME_LENGTH_STRUCT.size + ALERT_LENGTH_STRUCT.size + len(message) > MAX_FRAME_LENGTH:
+            raise AlertFlowException('Message too large')
+
+        with self.__outbox_condition:
+            if len(self.__outbox) >= self.__outbox_size:
+                self.__dropped_alerts += 1
+                if self.__overflow_policy == AlertFlowOverflowPolicy.RAISE:
+                    raise AlertFlowException('Outbox full')
+                if self.__overflow_policy == AlertFlowOverflowPolicy.DROP_NEWEST:
+                    return
+
+                self.__outbox.popleft()
+
+            self.__outbox.append(message)
+            self.__outbox_condition.notify()
 
-        return length_bytes + own_host_name_bytes + message
+    def stats(self) -> dict[str, float]:
+        with self.__outbox_condition:
+            return {
+                'queued_alerts': len(self.__outbox),
+                'dropped_alerts': self.__dropped_alerts,
+                'reconnections': self.__reconnections
+            }
 
-    def __reconnect(self) -> None:
+    def __flush_loop(self) -> None:
         while True:
-            print(
-                f'AlertFlow connection to {self.__connected_addr} dropped: Attempting reconnection',
-                file=sys.stderr)
+            with self.__outbox_condition:
+                while not self.__outbox and not self.__closing:
+                    self.__outbox_condition.wait()
+
+                if not self.__outbox:
+                    return
+
+                # Whatever piled up while the last batch was being sent goes out together, in as
+                # large a frame as allowed
+                batch: list[bytes] = []
+                frame_length = FRAME_LENGTH_STRUCT.size
+                while self.__outbox and len(batch) < SEND_BATCH_SIZE:
+                    frame_length += ALERT_LENGTH_STRUCT.size + len(self.__outbox[0])
+                    if frame_length > MAX_FRAME_LENGTH:
+                        break
+
+                    batch.append(self.__outbox.popleft())
 
             try:
-                try:
-                    self.__socket.close()
-                except OSError:
-                    pass
-
-                self.__socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                self.__socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_USER_TIMEOUT, TCP_TIMEOUT)
-                self.connect(cast(str, self.__connected_addr), cast(int, self.__connected_port))
-                print(f'AlertFlow reconnection to {self.__connected_addr} succeeded',
-                      file=sys.stderr)
-                return
+                self.__send_batch(batch)
+                continue
             except OSError:
                 pass
 
-    def send(self, message: bytes) -> None:
-        segment = self.__construct_segment(message)
+            # Segments cut by the old connection can't be resumed, so the batch is sent again
+            with self.__outbox_condition:
+                self.__outbox.extendleft(reversed(batch))
+                self.__trim_outbox()
+
+            if not self.__reconnect():
+                return
+
+    def __trim_outbox(self) -> None:
+        while len(self.__outbox) > self.__outbox_size:
+            self.__dropped_alerts += 1
+            if self.__overflow_policy == AlertFlowOverflowPolicy.DROP_OLDEST:
+                self.__outbox.popleft()
+            else:
+                self.__outbox.pop()
+
+    def __reconnect(self) -> bool:
+        # Runs on the flusher thread, so senders keep queueing alerts in the meantime. Gives up
+        # once the connection is closed.
+        print(f'AlertFlow connection to {self.__connected_addr_port} dropped: Reconnecting',
+              file=sys.stderr)
+
+        delays = reconnect_delays()
+        while True:
+            if self.__wait_while_not_closing(next(delays)):
+                return False
+
+            new_socket = AlertFlow.__create_socket()
+            try:
+                new_socket.settimeout(RECONNECT_TIMEOUT)
+                new_socket.connect(cast(tuple[str, int], self.__connected_addr_port))
+                new_socket.sendall(self.__handshake)
+                new_socket.settimeout(None)
+            except OSError:
+                new_socket.close()
+                continue
+
+            with self.__lock:
+                old_socket, self.__socket = self.__socket, new_socket
+            old_socket.close()
+
+            with self.__outbox_condition:
+                self.__reconnections += 1
+
+            print(f'AlertFlow reconnection to {self.__connected_addr_port} succeeded',
+                  file=sys.stderr)
+            return True
+
+    def __wait_while_not_closing(self, timeout: float) -> bool:
+        end_time = time.time() + timeout
+        with self.__outbox_condition:
+            while not self.__closing and time.time() < end_time:
+                self.__outbox_condition.wait(end_time - time.time())
+
+            return self.__closing
+
+    def __send_batch(self, batch: list[bytes]) -> None:
+        # Messages are never copied: the frame is its header followed by every alert's length and
+        # message
+        frame_length = FRAME_LENGTH_STRUCT.size + \
+            ALERT_LENGTH_STRUCT.size * len(batch) + sum(len(message) for message in batch)
+
+        buffers = [FRAME_LENGTH_STRUCT.pack(frame_length)]
+        for message in batch:
+            buffers.append(ALERT_LENGTH_STRUCT.pack(len(message)))
+            buffers.append(message)
 
         with self.__lock:
-            total_sent = 0
-            while total_sent < len(segment):
-                try:
-                    sent = self.__socket.send(segment[total_sent:])
-                    if sent == 0:
-                        self.__reconnect()
+            AlertFlow.__send_buffers(self.__socket, buffers)
+
+    @staticmethod
+    def __send_buffers(connection: socket.socket, buffers: list[bytes]) -> None:
+        remaining: list[bytes | memoryview] = list(buffers)
+        while remaining:
+            sent = connection.sendmsg(remaining)
+            if sent == 0:
+                raise ConnectionError('AlertFlow connection closed')
 
-                    total_sent += sent
-                except OSError:
-                    self.__reconnect()
+            # Only the partially sent buffer is sliced, through a view
+            sent_buffers = 0
+            while sent_buffers < len(remaining) and sent >= len(remaining[sent_buffers]):
+                sent -= len(remaining[sent_buffers])
+                sent_buffers += 1
+
+            del remaining[:sent_buffers]
+            if sent > 0:
+                remaining[0] = memoryview(remaining[0])[sent:]
 
     def connection_acceptance_loop(self) -> None:
+        # Every agent connection is handled from this thread, as its sockets become readable
         with self.__lock:
-            self.__socket.listen()
+            self.__socket.listen(LISTEN_BACKLOG)
+            self.__socket.setblocking(False)
+
+            selector = selectors.DefaultSelector()
+            selector.register(self.__socket, selectors.EVENT_READ)
+
+            # Connections are read one at a time, so they can all share a buffer that fits an
+            # incomplete frame and many complete ones
+            buffer = bytearray(RECEIVE_BUFFER_SIZE)
             while True:
+                for key, _ in selector.select():
+                    if key.fileobj is self.__socket:
+                        self.__accept_connections(selector)
+                    else:
+                        self.__handle_readable_connection(selector, key.data, buffer)
+
+    def __accept_connections(self, selector: selectors.BaseSelector) -> None:
+        while True:
+            try:
                 connection, _ = self.__socket.accept()
-                connection_thread = Thread(target=self.__connection_loop, args=(connection,))
-                connection_thread.daemon = True
-                connection_thread.start()
+            except (BlockingIOError, ConnectionAbortedError):
+                return
 
-    def __receive_fixed_length(self, connection: socket.socket, length: int) -> bytes:
-        total_received = b''
-        remaining_bytes = length
-        while remaining_bytes > 0:
-            received = connection.recv(remaining_bytes)
-            if received == b'':
-                raise AlertFlowException('Connection ended')
+            connection.setblocking(False)
+            state = AlertFlowConnectionState(connection)
+            selector.register(connection, selectors.EVENT_READ, state)
 
-            total_received += received
-            remaining_bytes -= len(received)
+    @staticmethod
+    def __close_connection(selector: selectors.BaseSelector, connection: socket.socket) -> None:
+        selector.unregister(connection)
+        try:
+            connection.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        connection.close()
 
-        return total_received
+    def __handle_readable_connection(self,
+                                     selector: selectors.BaseSelector,
+                                     state: AlertFlowConnectionState,
+                                     buffer: bytearray) -> None:
 
-    def __connection_loop(self, connection: socket.socket) -> None:
         try:
-            while True:
-                segment_length = int.from_bytes(self.__receive_fixed_length(connection, 2), 'big')
-                remaining_segment = self.__receive_fixed_length(connection, segment_length - 2)
+            if state.frame is not None:
+                self.__receive_large_frame(selector, state)
+            else:
+                self.__receive_frames(selector, state, buffer)
+        except AlertFlowException:
+            print('Closing AlertFlow connection due to invalid state', file=sys.stderr)
+            AlertFlow.__close_connection(selector, state.connection)
+
+    @staticmethod
+    def __receive_into(selector: selectors.BaseSelector,
+                       state: AlertFlowConnectionState,
+                       view: memoryview) -> int:
+
+        # Returns 0 when there was nothing to receive, closing the connection if it ended
+        try:
+            received = state.connection.recv_into(view)
+        except BlockingIOError:
+            return 0
+        except OSError:
+            received = 0
+
+        if received == 0:
+            AlertFlow.__close_connection(selector, state.connection)
+        return received
 
+    def __receive_frames(self,
+                         selector: selectors.BaseSelector,
+                         state: AlertFlowConnectionState,
+                         buffer: bytearray) -> None:
+
+        # The incomplete frame from the last read goes before the newly received data. It's always
+        # small, as large frames are moved to their own buffer.
+        view = memoryview(buffer)
+        pending = len(state.received)
+        view[:pending] = state.received
+
+        received = AlertFlow.__receive_into(selector, state, view[pending:])
+        if received == 0:
+            return
+
+        end = pending + received
+        parsed_end = self.__handle_received_frames(state, buffer, view, end)
+
+        # The length of an incomplete frame was already checked while parsing
+        if end - parsed_end >= FRAME_LENGTH_STRUCT.size:
+            frame_length, = FRAME_LENGTH_STRUCT.unpack_from(buffer, parsed_end)
+            if frame_length > LARGE_FRAME_LENGTH:
+                state.frame = bytearray(frame_length)
+                state.frame[:end - parsed_end] = view[parsed_end:end]
+                state.frame_received = end - parsed_end
+                state.received = b''
+                return
+
+        state.received = bytes(view[parsed_end:end])
+
+    def __receive_large_frame(self,
+                              selector: selectors.BaseSelector,
+                              state: AlertFlowConnectionState) -> None:
+
+        # Received in place, and never past the end of the frame
+        frame = cast(bytearray, state.frame)
+        view = memoryview(frame)
+        received = AlertFlow.__receive_into(selector, state, view[state.frame_received:])
+        if received == 0:
+            return
+
+        state.frame_received += received
+        if state.frame_received == len(frame):
+            state.frame = None
+            self.__handle_received_frames(state, frame, view, len(frame))
+
+    def __handle_received_frames(self,
+                                 state: AlertFlowConnectionState,
+                                 buffer: bytearray,
+                                 view: memoryview,
+                                 end: int) -> int:
+
+        # Every complete frame is parsed in place. Only messages are copied, when delivered.
+        start = 0
+        while end - start >= FRAME_LENGTH_STRUCT.size:
+            frame_length, = FRAME_LENGTH_STRUCT.unpack_from(buffer, start)
+            if not FRAME_LENGTH_STRUCT.size <= frame_length <= MAX_FRAME_LENGTH:
+                raise AlertFlowException('Invalid frame length')
+            if end - start < frame_length:
+                break
+
+            frame_start = start + FRAME_LENGTH_STRUCT.size
+            frame_end = start + frame_length
+            if state.host is None:
                 try:
-                    host_end = remaining_segment.index(b'\0')
-                    host = remaining_segment[:host_end].decode('utf-8')
-                    message = remaining_segment[host_end + 1:]
-                except (UnicodeError, ValueError):
-                    print('Closing AlertFlow connection due to invalid state', file=sys.stderr)
-                    connection.shutdown(socket.SHUT_RDWR)
-                    connection.close()
-                    return
+                    state.host = str(view[frame_start:frame_end], 'utf-8')
+                except UnicodeError as e:
+                    raise AlertFlowException('Invalid handshake') from e
+            else:
+                self.__handle_alerts(state.host, buffer, view, frame_start, frame_end)
 
-                self.handle_message(message, host)
-        except AlertFlowException:
-            pass
+            start = frame_end
+
+        return start
+
+    # pylint: disable-next=too-many-arguments,too-many-positional-arguments
+    def __handle_alerts(self,
+                        host: str,
+                        buffer: bytearray,
+                        view: memoryview,
+                        start: int,
+                        end: int) -> None:
+
+        while start < end:
+            if end - start < ALERT_LENGTH_STRUCT.size:
+                raise AlertFlowException('Invalid frame')
+
+            alert_length, = ALERT_LENGTH_STRUCT.unpack_from(buffer, start)
+            alert_start = start + ALERT_LENGTH_STRUCT.size
+            alert_end = alert_start + alert_length
+            if alert_end > end:
+                raise AlertFlowException('Invalid frame')
+
+            self.handle_message(bytes(view[alert_start:alert_end]), host)
+            start = alert_end
 
     def handle_message(self, message: bytes, host: str) -> None:
         pass
@@ -0,0 +1,203 @@
+import socket
+import time
+from queue import Queue
+from threading import Thread
+from unittest import TestCase, main
+
+from .AlertFlow import (
+    AlertFlow, AlertFlowException, AlertFlowOverflowPolicy, ALERT_LENGTH_STRUCT,
+    FRAME_LENGTH_STRUCT, LARGE_FRAME_LENGTH, MAX_FRAME_LENGTH, RECONNECT_MAXIMUM_DELAY,
+    RECONNECT_MINIMUM_DELAY, reconnect_delays
+)
+
+TIMEOUT = 5.0 # seconds
+
+def free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as probe_socket:
+        probe_socket.bind(('127.0.0.1', 0))
+        return probe_socket.getsockname()[1]
+
+def frame(payload: bytes) -> bytes:
+    return FRAME_LENGTH_STRUCT.pack(FRAME_LENGTH_STRUCT.size + len(payload)) + payload
+
+def alerts_frame(alerts: list[bytes]) -> bytes:
+    return frame(b''.join(ALERT_LENGTH_STRUCT.pack(len(alert)) + alert for alert in alerts))
+
+# Server that records what it receives, running in the background
+class RecordingAlertFlow(AlertFlow):
+    def __init__(self, port: int):
+        super().__init__('server', port)
+        self.received: Queue[tuple[bytes, str]] = Queue()
+
+    def handle_message(self, message: bytes, host: str) -> None:
+        self.received.put((message, host))
+
+# pylint: disable-next=too-many-public-methods
+class AlertFlowTests(TestCase):
+    def setUp(self) -> None:
+        self.port = free_port()
+        self.server = RecordingAlertFlow(self.port)
+        server_thread = Thread(target=self.server.connection_acceptance_loop)
+        server_thread.daemon = True
+        server_thread.start()
+
+        # Wait for the server to be listening
+        end_time = time.time() + TIMEOUT
+        while True:
+            try:
+                socket.create_connection(('127.0.0.1', self.port)).close()
+                break
+            except ConnectionRefusedError:
+                if time.time() > end_time:
+                    raise
+                time.sleep(0.01)
+
+    def connect(self, host: bytes = b'agent') -> socket.socket:
+        connection = socket.create_connection(('127.0.0.1', self.port))
+        connection.settimeout(TIMEOUT)
+        connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.addCleanup(connection.close)
+        connection.sendall(frame(host))
+        return connection
+
+    def receive(self, count: int) -> list[tuple[bytes, str]]:
+        return [self.server.received.get(timeout=TIMEOUT) for _ in range(count)]
+
+    def assert_closed(self, connection: socket.socket) -> None:
+        try:
+            self.assertEqual(connection.recv(1), b'')
+        except ConnectionResetError:
+            pass
+
+    def test_client(self) -> None:
+        client = AlertFlow('agent')
+        client.connect('127.0.0.1', self.port)
+        for alert in [b'first', b'', b'third']:
+            client.send(alert)
+        client.close()
+
+        self.assertEqual(self.receive(3),
+                         [(b'first', 'agent'), (b'', 'agent'), (b'third', 'agent')])
+
+    def queue_while_disconnected(self, policy: AlertFlowOverflowPolicy) -> AlertFlow:
+        client = AlertFlow('agent', outbox_size=3, overflow_policy=policy)
+        for alert in [b'1', b'2', b'3', b'4']:
+            try:
+                client.send(alert)
+            except AlertFlowException:
+                pass
+        client.send(b'5')
+        return client
+
+    def assert_survivors(self, client: AlertFlow, alerts: list[bytes]) -> None:
+        self.assertEqual(client.stats()['queued_alerts'], 3)
+        self.assertEqual(client.stats()['dropped_alerts'], 2)
+
+        # Queued alerts go out once connected
+        client.connect('127.0.0.1', self.port)
+        client.close()
+        self.assertEqual(self.receive(3), [(alert, 'agent') for alert in alerts])
+
+    def test_drop_oldest(self) -> None:
+        client = self.queue_while_disconnected(AlertFlowOverflowPolicy.DROP_OLDEST)
+        self.assert_survivors(client, [b'3', b'4', b'5'])
+
+    def test_drop_newest(self) -> None:
+        client = self.queue_while_disconnected(AlertFlowOverflowPolicy.DROP_NEWEST)
+        self.assert_survivors(client, [b'1', b'2', b'3'])
+
+    def test_raise(self) -> None:
+        client = AlertFlow('agent', outbox_size=3, overflow_policy=AlertFlowOverflowPolicy.RAISE)
+        for alert in [b'1', b'2', b'3']:
+            client.send(alert)
+        for alert in [b'4', b'5']:
+            with self.assertRaises(AlertFlowException):
+                client.send(alert)
+
+        self.assert_survivors(client, [b'1', b'2', b'3'])
+
+    def test_reconnect_delays(self) -> None:
+        delays = reconnect_delays()
+        maximum_delay = RECONNECT_MINIMUM_DELAY
+        for _ in range(20):
+            delay = next(delays)
+            self.assertGreaterEqual(delay, maximum_delay / 2)
+            self.assertLessEqual(delay, maximum_delay)
+            maximum_delay = min(maximum_delay * 2, RECONNECT_MAXIMUM_DELAY)
+
+        # Capped
+        self.assertEqual(maximum_delay, RECONNECT_MAXIMUM_DELAY)
+
+    def test_handshake(self) -> None:
+        agent1 = self.connect(b'agent1')
+        agent2 = self.connect('agênt2'.encode('utf-8'))
+        agent1.sendall(alerts_frame([b'a']))
+        self.assertEqual(self.receive(1), [(b'a', 'agent1')])
+        agent2.sendall(alerts_frame([b'b']))
+        self.assertEqual(self.receive(1), [(b'b', 'agênt2')])
+
+    def test_several_alerts_per_frame(self) -> None:
+        connection = self.connect()
+        alerts = [bytes([i]) * i for i in range(100)]
+        connection.sendall(alerts_frame(alerts[:50]) + alerts_frame(alerts[50:]))
+        self.assertEqual(self.receive(100), [(alert, 'agent') for alert in alerts])
+
+    def test_frame_split_across_reads(self) -> None:
+        connection = self.connect()
+        data = alerts_frame([b'split alert', b'another one'])
+        for i in range(len(data)):
+            connection.sendall(data[i:i + 1])
+            time.sleep(0.001)
+
+        self.assertEqual(self.receive(2), [(b'split alert', 'agent'), (b'another one', 'agent')])
+
+    def test_large_frames(self) -> None:
+        connection = self.connect()
+        header_size = FRAME_LENGTH_STRUCT.size + ALERT_LENGTH_STRUCT.size
+        alerts = [bytes(range(256)) * (70_000 // 256), # Over LARGE_FRAME_LENGTH
+                  bytes(range(251)) * ((MAX_FRAME_LENGTH - header_size) // 251)]
+        alerts[1] += b'\0' * (MAX_FRAME_LENGTH - header_size - len(alerts[1])) # Exactly 1 MiB
+
+        for alert in alerts:
+            connection.sendall(alerts_frame([alert]))
+            self.assertEqual(self.receive(1), [(alert, 'agent')])
+
+    def test_small_frame_after_large_frame(self) -> None:
+        connection = self.connect()
+        large_alert = b'L' * (LARGE_FRAME_LENGTH * 2)
+
+        # Sent together, so the small frame arrives right after the end of the large one
+        connection.sendall(alerts_frame([large_alert]) + alerts_frame([b'small', b'alerts']))
+        self.assertEqual(self.receive(3),
+                         [(large_alert, 'agent'), (b'small', 'agent'), (b'alerts', 'agent')])
+
+        # And later frames too
+        connection.sendall(alerts_frame([b'later']))
+        self.assertEqual(self.receive(1), [(b'later', 'agent')])
+
+    def test_invalid_handshake(self) -> None:
+        self.assert_closed(self.connect(b'\xff'))
+
+    def test_alert_longer_than_frame(self) -> None:
+        connection = self.connect()
+        connection.sendall(frame(ALERT_LENGTH_STRUCT.pack(10) + b'short'))
+        self.assert_closed(connection)
+
+    def test_truncated_alert_length(self) -> None:
+        connection = self.connect()
+        connection.sendall(frame(ALERT_LENGTH_STRUCT.pack(1) + b'a' + b'\0\0'))
+        self.assertEqual(self.receive(1), [(b'a', 'agent')])
+        self.assert_closed(connection)
+
+    def test_oversized_frame(self) -> None:
+        connection = self.connect()
+        connection.sendall(FRAME_LENGTH_STRUCT.pack(MAX_FRAME_LENGTH + 1))
+        self.assert_closed(connection)
+
+    def test_frame_shorter_than_header(self) -> None:
+        connection = self.connect()
+        connection.sendall(FRAME_LENGTH_STRUCT.pack(FRAME_LENGTH_STRUCT.size - 1))
+        self.assert_closed(connection)
+
+if __name__ == '__main__':
+    main()
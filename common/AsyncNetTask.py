@@ -0,0 +1,270 @@
+import asyncio
+import time
+
+from sys import stderr
+from typing import Callable, Optional, cast
+
+from .NetTaskCongestionController import \
+    NetTaskCongestionController, NetTaskAIMDCongestionController
+from .NetTaskConnection import NetTaskAckCallback, MAXIMUM_WINDOW_SIZE, SEND_QUEUE_MAX_SIZE
+from .NetTaskConnectionTable import \
+    NetTaskConnectionTable, NetTaskRuntimeException, NetTaskStatsCallback, STATS_EXPORT_INTERVAL
+from .structs.Message import SerializationException
+from .structs.NetTaskSegment import NetTaskSegment
+
+# Keep answering retransmitted Close segments after closing, in case our last ACK got lost
+CLOSE_LINGER_TIME = 5 # seconds
+
+# NetTask driven by an asyncio event loop, with no background thread. Instances are created with
+# AsyncNetTask.create(), inside a running loop.
+class AsyncNetTask(asyncio.DatagramProtocol):
+    # pylint: disable-next=too-many-arguments,too-many-positional-arguments
+    def __init__(self,
+                 own_host_name: str,
+                 is_server: bool,
+                 selective_ack: bool = True,
+                 congestion_controller: Callable[[], NetTaskCongestionController] = \
+                     NetTaskAIMDCongestionController,
+                 mtu: Optional[int] = None,
+                 max_window_size: int = MAXIMUM_WINDOW_SIZE,
+                 max_send_queue_size: int = SEND_QUEUE_MAX_SIZE,
+                 pacing: bool = False):
+
+        self.__transport: Optional[asyncio.DatagramTransport] = None
+
+        # A single loop timer is armed for the earliest connection deadline
+        self.__timer_handle: Optional[asyncio.TimerHandle] = None
+        self.__timer_deadline: Optional[float] = None
+
+        # Events are replaced after being set, so that waiters are only woken once
+        self.__ready_event = asyncio.Event()
+        self.__connection_events: dict[str, asyncio.Event] = {}
+        self.__close_event: Optional[asyncio.Event] = None # Set by any connection, for closers
+
+        self.__connections = NetTaskConnectionTable(own_host_name,
+                                                    is_server,
+                                                    selective_ack,
+                                                    congestion_controller,
+                                                    mtu,
+                                                    self.__sendto,
+                                                    self.__ready_event.set,
+                                                    self.__on_connection_removed,
+                                                    max_window_size,
+                                                    max_send_queue_size,
+                                                    pacing)
+
+    @staticmethod
+    # pylint: disable-next=too-many-arguments,too-many-positional-arguments
+    async def create(own_host_name: str,
+                     bind_port: Optional[int] = None,
+                     selective_ack: bool = True,
+                     congestion_controller: Callable[[], NetTaskCongestionController] = \
+                         NetTaskAIMDCongestionController,
+                     mtu: Optional[int] = None,
+                     reuse_port: bool = False,
+                     max_window_size: int = MAXIMUM_WINDOW_SIZE,
+                     max_send_queue_size: int = SEND_QUEUE_MAX_SIZE,
+                     pacing: bool = False) -> 'AsyncNetTask':
+
+        nettask = AsyncNetTask(own_host_name,
+                               bind_port is not None,
+                               selective_ack,
+                               congestion_controller,
+                               mtu,
+                               max_window_size,
+                               max_send_queue_size,
+                               pacing)
+
+        loop = asyncio.get_running_loop()
+        await loop.create_datagram_endpoint(lambda: nettask,
+                                            local_addr=('0.0.0.0', bind_port or 0),
+                                            reuse_port=reuse_port or None)
+        return nettask
+
+    def connection_made(self, transport: asyncio.BaseTransport) -> None:
+        self.__transport = cast(asyncio.DatagramTransport, transport)
+
+    def connection_lost(self, exc: Optional[Exception]) -> None:
+        self.__transport = None
+        if self.__timer_handle is not None:
+            self.__timer_handle.cancel()
+            self.__timer_handle = None
+
+        self.__ready_event.set()
+        self.__notify_any_connection()
+        for host in list(self.__connection_events):
+            self.__notify_connection(host)
+
+    def error_received(self, exc: Exception) -> None:
+        pass # ICMP errors are handled like losses
+
+    def __sendto(self, segment_bytes: bytes, addr_port: tuple[str, int]) -> None:
+        if self.__transport is not None:
+            self.__transport.sendto(segment_bytes, addr_port)
+
+    async def __wait_for_connection(self, host: str) -> None:
+        event = self.__connection_events.get(host)
+        if event is None:
+            event = asyncio.Event()
+            self.__connection_events[host] = event
+
+        await event.wait()
+
+    async def __wait_for_any_connection(self) -> None:
+        if self.__close_event is None:
+            self.__close_event = asyncio.Event()
+
+        await self.__close_event.wait()
+
+    def __notify_any_connection(self) -> None:
+        if self.__close_event is not None:
+            self.__close_event.set()
+            self.__close_event = None
+
+    def __notify_connection(self, host: str) -> None:
+        self.__notify_any_connection()
+        event = self.__connection_events.pop(host, None)
+        if event is not None:
+            event.set()
+
+    def __on_connection_removed(self, host: str) -> None:
+        # Waiters find out that the connection is gone
+        self.__notify_connection(host)
+
+    def __arm_timer(self) -> None:
+        deadline = self.__connections.next_deadline()
+        if deadline == self.__timer_deadline or self.__transport is None:
+            return
+
+        if self.__timer_handle is not None:
+            self.__timer_handle.cancel()
+
+        self.__timer_deadline = deadline
+        if deadline is None:
+            self.__timer_handle = None
+        else:
+            self.__timer_handle = asyncio.get_running_loop().call_later(
+                max(deadline - time.time(), 0), self.__on_timer)
+
+    def __on_timer(self) -> None:
+        self.__timer_handle = None
+        self.__timer_deadline = None
+
+        self.__connections.handle_timeouts()
+        self.__arm_timer()
+
+    def datagram_received(self, data: bytes, addr: tuple[str, int]) -> None:
+        try:
+            segment = NetTaskSegment.deserialize(data)
+        except SerializationException:
+            print('NetTask ignored deserialization exception', file=stderr)
+            return
+
+        host, reply_segments = self.__connections.handle_received_segment(segment, addr, len(data))
+        if host is not None:
+            for reply_segment in reply_segments:
+                self.__connections.sendto(reply_segment, host)
+
+            self.__notify_connection(host)
+
+        self.__arm_timer()
+
+    def __assert_open(self) -> None:
+        if self.__transport is None:
+            raise NetTaskRuntimeException('Transport closed')
+
+    async def connect(self, host: str, addr_port: tuple[str, int]) -> None:
+        self.__assert_open()
+        self.__connections.connect(host, addr_port)
+        self.__arm_timer()
+
+        while True:
+            self.__assert_open()
+            if self.__connections.is_connected(host):
+                return
+            await self.__wait_for_connection(host)
+
+    async def receive(self) -> tuple[list[bytes], str]:
+        while True:
+            self.__assert_open()
+
+            received = self.__connections.receive()
+            self.__arm_timer()
+            if received is not None:
+                return received
+
+            self.__ready_event.clear()
+            await self.__ready_event.wait()
+
+    # on_acked is called from the event loop once the message is acknowledged, or once its
+    # connection is lost. It must not call the NetTask (setting a future's result is fine).
+    async def send(self,
+                   message: bytes,
+                   host: str,
+                   on_acked: Optional[NetTaskAckCallback] = None) -> None:
+
+        await self.send_many([message], host, on_acked)
+
+    def try_send(self,
+                 message: bytes,
+                 host: str,
+                 on_acked: Optional[NetTaskAckCallback] = None) -> bool:
+
+        self.__assert_open()
+        sent = self.__connections.send([message], host, on_acked) == 1
+        self.__arm_timer()
+        return sent
+
+    async def send_many(self,
+                        messages: list[bytes],
+                        host: str,
+                        on_acked: Optional[NetTaskAckCallback] = None) -> None:
+
+        while True:
+            self.__assert_open()
+            queued_count = self.__connections.send(messages, host, on_acked)
+            self.__arm_timer()
+            if queued_count == len(messages):
+                return
+
+            messages = messages[queued_count:]
+
+            await self.__wait_for_connection(host)
+
+    def congestion_window(self, host: str) -> int:
+        return self.__connections.congestion_window(host)
+
+    def connection_stats(self, host: str) -> dict[str, float]:
+        return self.__connections.connection_stats(host)
+
+    # Statistics of a connection, or counters added across every connection if no host is given
+    def stats(self, host: Optional[str] = None) -> dict[str, float]:
+        return self.__connections.stats(host)
+
+    # The callback is called periodically from the event loop, with the aggregate and the per-host
+    # statistics. It must not call the NetTask. None stops exporting.
+    def export_stats(self,
+                     callback: Optional[NetTaskStatsCallback],
+                     interval: float = STATS_EXPORT_INTERVAL) -> None:
+
+        self.__assert_open()
+        self.__connections.export_stats(callback, interval)
+        self.__arm_timer()
+
+    async def close(self, host: Optional[str] = None) -> None:
+        self.__assert_open()
+        hosts = self.__connections.start_closing(host)
+        while True:
+            self.__assert_open()
+
+            hosts = self.__connections.close(hosts)
+            self.__arm_timer()
+            if len(hosts) == 0:
+                break
+
+            # Every iteration retries all hosts, whichever of them made progress
+            await self.__wait_for_any_connection()
+
+        # Closing every connection also releases the socket
+        if host is None and self.__transport is not None:
+            asyncio.get_running_loop().call_later(CLOSE_LINGER_TIME, self.__transport.close)
@@ -1,132 +1,241 @@
+import selectors
 import socket
+import time
 
 from sys import stderr
-from threading import Condition, Thread
+from threading import Condition, RLock, Thread
 from typing import Any, Callable, Optional, Self, TypeVar
 
-from .NetTaskConnection import NetTaskConnection, NetTaskConnectionException
+from .NetTaskCongestionController import \
+    NetTaskCongestionController, NetTaskAIMDCongestionController
+from .NetTaskConnection import \
+    NetTaskAckCallback, MINIMUM_TIMEOUT, MAXIMUM_WINDOW_SIZE, SEND_QUEUE_MAX_SIZE
+from .NetTaskConnectionTable import \
+    NetTaskConnectionTable, NetTaskRuntimeException, NetTaskStatsCallback, STATS_EXPORT_INTERVAL
+from .NetTaskReceiveBufferPool import NetTaskReceiveBufferPool
 from .structs.Message import SerializationException
+from .structs.NetTaskAckSegmentBody import NetTaskAckSegmentBody
+from .structs.NetTaskSackSegmentBody import NetTaskSackSegmentBody
 from .structs.NetTaskSegment import NetTaskSegment
 
-class NetTaskRuntimeException(Exception):
-    pass
-
 T = TypeVar('T')
 
 # Check socket for periodical retransmissions in case connection beggining gets lost
 MINIMAL_SOCKET_TIMEOUT = 2
 
+RECEIVE_BATCH_SIZE = 64 # datagrams handled per lock acquisition
+MAXIMUM_DATAGRAM_SIZE = 1 << 16 # bytes
+
 # pylint: disable-next=too-many-instance-attributes
 class NetTask:
-    def __init__(self, own_host_name: str, bind_port: Optional[int] = None):
-        self.__socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
-        self.__own_host_name = own_host_name
+    # pylint: disable-next=too-many-arguments,too-many-positional-arguments
+    def __init__(self,
+                 own_host_name: str,
+                 bind_port: Optional[int] = None,
+                 selective_ack: bool = True,
+                 congestion_controller: Callable[[], NetTaskCongestionController] = \
+                     NetTaskAIMDCongestionController,
+                 mtu: Optional[int] = None,
+                 reuse_port: bool = False,
+                 max_window_size: int = MAXIMUM_WINDOW_SIZE,
+                 max_send_queue_size: int = SEND_QUEUE_MAX_SIZE,
+                 pacing: bool = False):
+
         self.__is_server = bind_port is not None
-        self.__accepting_connections = self.__is_server
+        self.__connections = NetTaskConnectionTable(own_host_name,
+                                                    self.__is_server,
+                                                    selective_ack,
+                                                    congestion_controller,
+                                                    mtu,
+                                                    self.__sendto,
+                                                    self.__notify_receivers,
+                                                    self.__on_connection_removed,
+                                                    max_window_size,
+                                                    max_send_queue_size,
+                                                    pacing)
+
+        self.__socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
         if self.__is_server:
+            # Many servers can share a port, with the kernel hashing each client to one of them
+            if reuse_port:
+                self.__socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
             self.__socket.bind(('0.0.0.0', bind_port))
 
-        self.__host_addr_port: dict[str, tuple[str, int]] = {}
-        self.__connections: dict[str, NetTaskConnection] = {}
+        # Wakes up the management thread when a timer earlier than the one it sleeps on is scheduled
+        self.__wakeup_receiver, self.__wakeup_sender = socket.socketpair()
+        self.__wakeup_receiver.setblocking(False)
+        self.__wakeup_sender.setblocking(False)
+        self.__sleep_deadline: Optional[float] = None
+
+        # Receivers wait for the ready queue. Senders wait on their connection's condition, which
+        # is only notified by segments from that connection. Closers wait for any connection, as
+        # they may be closing many.
+        self.__lock = RLock()
+        self.__receive_condition = Condition(self.__lock)
+        self.__connection_conditions: dict[str, Condition] = {}
+        self.__close_condition = Condition(self.__lock)
 
-        self.__condition = Condition()
         self.__bg_thread = Thread(target = self.__bg_loop)
         self.__bg_thread.daemon = True
         self.__bg_thread.start()
 
-    def __sendto(self, segment: NetTaskSegment, host: str) -> None:
+    def __wait_for_connection(self, host: str) -> None:
+        condition = self.__connection_conditions.get(host)
+        if condition is None:
+            condition = Condition(self.__lock)
+            self.__connection_conditions[host] = condition
+
+        condition.wait()
+
+    def __notify_connection(self, host: str) -> None:
+        self.__close_condition.notify_all()
+        condition = self.__connection_conditions.get(host)
+        if condition is not None:
+            condition.notify_all()
+
+    def __notify_receivers(self) -> None:
+        self.__receive_condition.notify()
+
+    def __on_connection_removed(self, host: str) -> None:
+        # Waiters find out that the connection is gone
+        self.__close_condition.notify_all()
+        condition = self.__connection_conditions.pop(host, None)
+        if condition is not None:
+            condition.notify_all()
+
+    def __notify_all(self) -> None:
+        self.__receive_condition.notify_all()
+        self.__close_condition.notify_all()
+        for condition in self.__connection_conditions.values():
+            condition.notify_all()
+
+    def __sendto(self, segment_bytes: bytes, addr_port: tuple[str, int]) -> None:
         try:
-            self.__socket.sendto(segment.serialize(), self.__host_addr_port[host])
+            self.__socket.sendto(segment_bytes, addr_port)
         except OSError:
             pass
 
+        self.__wake_up_if_needed()
+
+    def __wake_up_if_needed(self) -> None:
+        if self.__sleep_deadline is not None:
+            next_deadline = self.__connections.next_deadline()
+            if next_deadline is not None and next_deadline < self.__sleep_deadline:
+                self.__sleep_deadline = None
+                try:
+                    self.__wakeup_sender.send(b'\0')
+                except BlockingIOError:
+                    pass # Already woken up
+
     @staticmethod
     def __synchronized(f: Callable[..., T]) -> Callable[..., T]:
-        def wrapper(self: Self, *args: Any) -> T:
+        def wrapper(self: Self, *args: Any, **kwargs: Any) -> T:
             # pylint: disable=protected-access
-            with self.__condition:
+            with self.__lock:
                 if not self.__bg_thread.is_alive():
                     raise NetTaskRuntimeException('Management thread died unexpectedly')
-                return f(self, *args)
+                return f(self, *args, **kwargs)
 
         return wrapper
 
-    def __receive_next_segment(self) -> tuple[NetTaskSegment, str]:
-        while True:
-            segment_bytes, addr_port = self.__socket.recvfrom(1 << 16)
+    def __drain_socket(self, buffers: NetTaskReceiveBufferPool) \
+        -> list[tuple[memoryview, tuple[str, int]]]:
+
+        # Read everything the kernel already has, without blocking, up to a budget
+        datagrams: list[tuple[memoryview, tuple[str, int]]] = []
+        while len(datagrams) < RECEIVE_BATCH_SIZE:
             try:
-                segment = NetTaskSegment.deserialize(segment_bytes)
+                datagrams.append(buffers.receive_from(self.__socket))
+            except BlockingIOError:
+                break
+
+        return datagrams
+
+    @staticmethod
+    def __add_ack_segment(ack_segments: list[NetTaskSegment], ack_segment: NetTaskSegment) -> None:
+        # ACKs are cumulative, so only the last one in the batch needs to be sent. Duplicate
+        # cumulative ACKs are the exception: the other side counts them to detect losses.
+        if ack_segments and not (isinstance(ack_segment.body, NetTaskAckSegmentBody) and
+                                 ack_segments[-1].body == ack_segment.body):
+            ack_segments.clear()
+
+        ack_segments.append(ack_segment)
 
-                with self.__condition:
-                    self.__host_addr_port[segment.host] = addr_port
-                    if segment.host not in self.__connections and self.__accepting_connections:
-                        self.__connections[segment.host] = \
-                            NetTaskConnection(self.__own_host_name, False)
+    def __handle_received_datagrams(self,
+                                    datagrams: list[tuple[memoryview, tuple[str, int]]]) -> None:
+        reply_segments: dict[str, list[NetTaskSegment]] = {}
+        ack_segments: dict[str, list[NetTaskSegment]] = {}
 
-                return segment, segment.host
+        for segment_bytes, addr_port in datagrams:
+            try:
+                segment = NetTaskSegment.deserialize(segment_bytes)
             except SerializationException:
                 print('NetTask ignored deserialization exception', file=stderr)
+                continue
+
+            host, host_reply_segments = \
+                self.__connections.handle_received_segment(segment, addr_port, len(segment_bytes))
+            if host is None:
+                continue
+
+            reply_segments.setdefault(host, [])
+            for reply_segment in host_reply_segments:
+                if isinstance(reply_segment.body,
+                              (NetTaskAckSegmentBody, NetTaskSackSegmentBody)):
+                    NetTask.__add_ack_segment(ack_segments.setdefault(host, []), reply_segment)
+                else:
+                    reply_segments[host].append(reply_segment)
 
-    def __handle_received_segment(self, segment: NetTaskSegment, host: str) -> None:
-        connection = self.__connections[host]
+        for host, host_reply_segments in reply_segments.items():
+            for reply_segment in host_reply_segments:
+                self.__connections.sendto(reply_segment, host)
 
-        reply_segments = connection.handle_received_segment(segment)
-        for reply_segment in reply_segments:
-            self.__sendto(reply_segment, host)
+            for ack_segment in ack_segments.get(host, []):
+                self.__connections.sendto(ack_segment, host)
 
-        self.__condition.notify_all()
+            self.__notify_connection(host)
 
-    def __handle_timeout(self) -> None:
-        for host, connection in list(self.__connections.items()):
-            try:
-                wakeup_segment = connection.act_on_timeout()
-
-                if wakeup_segment is not None:
-                    self.__sendto(wakeup_segment, host)
-            except NetTaskConnectionException:
-                if self.__is_server:
-                    print(f'NetTask connection to {host} closed unexpectedly', file=stderr)
-                    del self.__connections[host]
-                else:
-                    while True:
-                        try:
-                            print(f'NetTask connection to {host} dropped: Attempting reconnection',
-                                  file=stderr)
-
-                            self.__connections[host] = NetTaskConnection(self.__own_host_name, True)
-                            connect_segment = self.__connections[host].prepare_connect_segment()
-                            self.__sendto(connect_segment, host)
-                            break
-                        except NetTaskConnectionException:
-                            print(f'NetTask reconnection to {host} failed', file=stderr)
-
-    def __time_until_next_timeout(self) -> Optional[float]:
+    def __time_until_next_timeout(self) -> float:
+        with self.__lock:
+            next_deadline = self.__connections.next_deadline()
+            current_time = time.time()
+
+            timeout: float = MINIMAL_SOCKET_TIMEOUT
+            if next_deadline is not None:
+                timeout = min(timeout, max(next_deadline - current_time, MINIMUM_TIMEOUT))
+
+            self.__sleep_deadline = current_time + timeout
+            return timeout
+
+    def __drain_wakeups(self) -> None:
         try:
-            min_connections = min(c.time_until_next_timeout() for c in self.__connections.values())
-            return min(MINIMAL_SOCKET_TIMEOUT, min_connections)
-        except ValueError:
-            return MINIMAL_SOCKET_TIMEOUT
+            while self.__wakeup_receiver.recv(4096):
+                pass
+        except BlockingIOError:
+            pass
 
     def __bg_loop(self) -> None:
-        while True:
-            self.__socket.settimeout(self.__time_until_next_timeout())
+        selector = selectors.DefaultSelector()
+        selector.register(self.__socket, selectors.EVENT_READ)
+        selector.register(self.__wakeup_receiver, selectors.EVENT_READ)
+        buffers = NetTaskReceiveBufferPool(MAXIMUM_DATAGRAM_SIZE)
 
-            try:
-                segment, host = self.__receive_next_segment()
-                with self.__condition:
-                    try:
-                        self.__handle_received_segment(segment, host)
-                    except BaseException as e:
-                        self.__condition.notify_all()
-                        raise e
-
-            except TimeoutError:
-                with self.__condition:
-                    try:
-                        self.__handle_timeout()
-                    except BaseException as e:
-                        self.__condition.notify_all()
-                        raise e
+        while True:
+            readable = [key.fileobj for key, _ in selector.select(self.__time_until_next_timeout())]
+            if self.__wakeup_receiver in readable:
+                self.__drain_wakeups()
+            datagrams = self.__drain_socket(buffers) if self.__socket in readable else []
+
+            with self.__lock:
+                self.__sleep_deadline = None
+                try:
+                    self.__handle_received_datagrams(datagrams)
+
+                    # Timers aren't starved when datagrams keep arriving
+                    self.__connections.handle_timeouts()
+                except BaseException as e:
+                    self.__notify_all()
+                    raise e
 
     def __assert_thread_alive(self) -> None:
         if not self.__bg_thread.is_alive():
@@ -134,90 +243,103 @@ class NetTask:
 
     @__synchronized
     def connect(self, host: str, addr_port: tuple[str, int]) -> None:
-        self.__host_addr_port[host] = addr_port
-        if host not in self.__connections:
-            self.__connections[host] = NetTaskConnection(self.__own_host_name, True)
-            connect_segment = self.__connections[host].prepare_connect_segment()
-            self.__sendto(connect_segment, host)
-
-            while True:
-                self.__assert_thread_alive()
-                if host not in self.__connections:
-                    raise NetTaskRuntimeException('Connection died unexpectedly')
-
-                if self.__connections[host].is_connected():
-                    return
-                self.__condition.wait()
-        else:
-            raise NetTaskRuntimeException(f'Already connected to {host}')
+        self.__connections.connect(host, addr_port)
+
+        while True:
+            self.__assert_thread_alive()
+            if self.__connections.is_connected(host):
+                return
+            self.__wait_for_connection(host)
 
     @__synchronized
     def receive(self) -> tuple[list[bytes], str]:
         while True:
             self.__assert_thread_alive()
 
-            for connection_host, connection in list(self.__connections.items()):
-                messages, window_segment = connection.get_received_messages()
-                if window_segment is not None:
-                    self.__sendto(window_segment, connection_host)
+            received = self.__connections.receive()
+            if received is not None:
+                return received
+
+            self.__receive_condition.wait()
+
+    # on_acked is called from the management thread once the message is acknowledged, or once its
+    # connection is lost. It must be quick and must not call the NetTask.
+    @__synchronized
+    def send(self,
+             message: bytes,
+             host: str,
+             on_acked: Optional[NetTaskAckCallback] = None) -> None:
 
-                if connection.is_closed():
-                    del self.__connections[connection_host]
-                    if not self.__is_server:
-                        return messages, '' # Sinalize end of connection with no host
+        while True:
+            self.__assert_thread_alive()
+            queued_count = self.__connections.send([message], host, on_acked)
+            self.__wake_up_if_needed() # Paced segments may be due before the current deadline
+            if queued_count == 1:
+                return
 
-                if messages != []:
-                    return messages, connection_host
+            self.__wait_for_connection(host)
 
-            self.__condition.wait()
+    @__synchronized
+    def try_send(self,
+                 message: bytes,
+                 host: str,
+                 on_acked: Optional[NetTaskAckCallback] = None) -> bool:
+
+        queued_count = self.__connections.send([message], host, on_acked)
+        self.__wake_up_if_needed()
+        return queued_count == 1
 
     @__synchronized
-    def send(self, message: bytes, host: str) -> None:
+    def send_many(self,
+                  messages: list[bytes],
+                  host: str,
+                  on_acked: Optional[NetTaskAckCallback] = None) -> None:
+
+        # Messages are queued and transmitted together while they fit in the send queue. Otherwise,
+        # the lock is only released to wait for room.
         while True:
             self.__assert_thread_alive()
-            if host not in self.__connections:
-                raise NetTaskRuntimeException('Connection died unexpectedly')
+            queued_count = self.__connections.send(messages, host, on_acked)
+            self.__wake_up_if_needed()
+            if queued_count == len(messages):
+                return
 
-            # Try to at least enqueue the segment for transmission
-            connection = self.__connections[host]
-            if connection.is_closed():
-                del self.__connections[host]
-                raise NetTaskRuntimeException('Trying to send data to a closed connection')
+            messages = messages[queued_count:]
 
-            try:
-                segments = connection.encapsulate_for_sending(message)
-
-                for segment in segments:
-                    # Receiver's window is not full and segment can be transmitted now
-                    self.__sendto(segment, host)
-                    return
-            except NetTaskConnectionException:
-                # Full send queue
-                pass
+            self.__wait_for_connection(host)
 
-            self.__condition.wait()
+    @__synchronized
+    def congestion_window(self, host: str) -> int:
+        return self.__connections.congestion_window(host)
 
     @__synchronized
-    def close(self, host: Optional[str] = None) -> None:
-        if host is None:
-            self.__accepting_connections = False
-            hosts = list(self.__connections)
-        else:
-            hosts = [host]
+    def connection_stats(self, host: str) -> dict[str, float]:
+        return self.__connections.connection_stats(host)
+
+    # Statistics of a connection, or counters added across every connection if no host is given
+    @__synchronized
+    def stats(self, host: Optional[str] = None) -> dict[str, float]:
+        return self.__connections.stats(host)
 
+    # The callback is called periodically from the management thread, with the aggregate and the
+    # per-host statistics. It must be quick and must not call the NetTask. None stops exporting.
+    @__synchronized
+    def export_stats(self,
+                     callback: Optional[NetTaskStatsCallback],
+                     interval: float = STATS_EXPORT_INTERVAL) -> None:
+
+        self.__connections.export_stats(callback, interval)
+        self.__wake_up_if_needed()
+
+    @__synchronized
+    def close(self, host: Optional[str] = None) -> None:
+        hosts = self.__connections.start_closing(host)
         while True:
             self.__assert_thread_alive()
 
-            for h in list(hosts):
-                connection = self.__connections.get(h)
-                if connection is None or connection.is_closed():
-                    hosts.remove(h)
-                else:
-                    close_segment = connection.close()
-                    if close_segment is not None:
-                        self.__sendto(close_segment, h)
-
+            hosts = self.__connections.close(hosts)
             if len(hosts) == 0:
                 return
 
-            self.__condition.wait()
+            # Every iteration retries all hosts, whichever of them made progress
+            self.__close_condition.wait()
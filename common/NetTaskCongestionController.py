@@ -0,0 +1,67 @@
+import math
+import time
+from abc import ABC, abstractmethod
+from typing import Optional
+
+INITIAL_CONGESTION_WINDOW = 4 # segments
+MINIMUM_CONGESTION_WINDOW = 2 # segments
+
+class NetTaskCongestionController(ABC):
+    @abstractmethod
+    def window(self) -> int:
+        pass
+
+    @abstractmethod
+    def on_ack(self, acked_segments: int) -> None:
+        pass
+
+    @abstractmethod
+    def on_loss(self, rtt_estimate: Optional[float]) -> None:
+        pass
+
+    @abstractmethod
+    def on_timeout(self) -> None:
+        pass
+
+class NetTaskNoCongestionController(NetTaskCongestionController):
+    def window(self) -> int:
+        return 1 << 32 # Only limited by the receiver's window
+
+    def on_ack(self, acked_segments: int) -> None:
+        pass
+
+    def on_loss(self, rtt_estimate: Optional[float]) -> None:
+        pass
+
+    def on_timeout(self) -> None:
+        pass
+
+class NetTaskAIMDCongestionController(NetTaskCongestionController):
+    def __init__(self) -> None:
+        self.__window = float(INITIAL_CONGESTION_WINDOW)
+        self.__slow_start_threshold = math.inf
+        self.__last_reduction_time = 0.0
+
+    def window(self) -> int:
+        return int(self.__window)
+
+    def on_ack(self, acked_segments: int) -> None:
+        if self.__window < self.__slow_start_threshold:
+            self.__window += acked_segments # Slow start
+        else:
+            self.__window += acked_segments / self.__window # Additive increase
+
+    def on_loss(self, rtt_estimate: Optional[float]) -> None:
+        # Losses in the same window are part of the same congestion event
+        current_time = time.time()
+        if rtt_estimate is not None and current_time - self.__last_reduction_time < rtt_estimate:
+            return
+
+        self.__slow_start_threshold = max(self.__window / 2, MINIMUM_CONGESTION_WINDOW)
+        self.__window = self.__slow_start_threshold
+        self.__last_reduction_time = current_time
+
+    def on_timeout(self) -> None:
+        self.__slow_start_threshold = max(self.__window / 2, MINIMUM_CONGESTION_WINDOW)
+        self.__window = 1.0
+        self.__last_reduction_time = time.time()
@@ -1,73 +1,220 @@
+import math
 import time
-from typing import Optional
+from collections import deque
+from typing import Callable, Optional
 
+from .NetTaskCongestionController import \
+    NetTaskCongestionController, NetTaskAIMDCongestionController
+from .NetTaskSegmentWindow import NetTaskSegmentWindow
+from .NetTaskTimerHeap import NetTaskTimerHeap
 from .structs.NetTaskSegment import NetTaskSegment
 from .structs.NetTaskSegmentBody import NetTaskSegmentBody
 from .structs.NetTaskAckSegmentBody import NetTaskAckSegmentBody
+from .structs.NetTaskBatchDataSegmentBody import NetTaskBatchDataSegmentBody
 from .structs.NetTaskCloseSegmentBody import NetTaskCloseSegmentBody
 from .structs.NetTaskDataSegmentBody import NetTaskDataSegmentBody
+from .structs.NetTaskFragmentSegmentBody import NetTaskFragmentSegmentBody
 from .structs.NetTaskKeepAliveSegmentBody import NetTaskKeepAliveSegmentBody
+from .structs.NetTaskSackSegmentBody import NetTaskSackSegmentBody
 from .structs.NetTaskWindowSegmentBody import NetTaskWindowSegmentBody
 
 INITIAL_TIMEOUT = 5 # seconds
 MINIMUM_TIMEOUT = 0.005 # seconds (needed to avoid busy waiting on localhost)
-RETRANSMISSION_PENALIZATION = 1.25 # times original RTT estimation
+RETRANSMISSION_BACKOFF = 2 # times the previous timeout, on consecutive timeouts
+MAXIMUM_RETRANSMISSION_BACKOFF = 8 # times the timeout given by the RTT estimate
+DUPLICATE_ACK_THRESHOLD = 3 # duplicate ACKs before a segment is considered lost
 
 KEEP_ALIVE_INTERVAL = 10 # seconds
 KEEP_ALIVE_TIMEOUT = 30 # seconds
 
-WINDOW_SIZE = 32 # messages
-INFORM_NEW_MAX_SEQUENCE_THRESHOLD = 24 # messages
-SEND_QUEUE_MAX_SIZE = 64 # messages
+INITIAL_WINDOW_SIZE = 32 # segments
+MINIMUM_WINDOW_SIZE = 4 # segments
+MAXIMUM_WINDOW_SIZE = 1024 # segments (default limit)
+WINDOW_GROWTH = 2 # times the segments drained per RTT
+WINDOW_UPDATE_THRESHOLD = 0.5 # fraction of the window freed before announcing it
+SEND_QUEUE_MAX_SIZE = 64 # messages (default limit)
+
+MAX_SACK_RANGES = 16 # ranges per ACK
+
+PACING_GAIN = 1.25 # times the window sent per RTT, so that pacing doesn't limit throughput
+
+DELAYED_ACK_SEGMENTS = 2 # in-order data segments acknowledged together
+DELAYED_ACK_TIMEOUT = 0.01 # seconds
+
+MAX_PAYLOAD_SIZE = 1200 # bytes of segment body, larger messages get fragmented
+BATCHED_MESSAGE_MAX_SIZE = 0xFFFF # bytes (length must fit in two bytes)
+
+DATA_BODIES = (NetTaskDataSegmentBody, NetTaskBatchDataSegmentBody, NetTaskFragmentSegmentBody)
+
+# Statistics that only grow, and can be added across connections
+CUMULATIVE_STATS = (
+    'segments_sent', 'segments_received', 'bytes_sent', 'bytes_received',
+    'retransmitted_segments', 'retransmission_timeouts', 'duplicate_segments', 'window_stalls'
+)
 
 class NetTaskConnectionException(Exception):
     pass
 
+# Told whether a message was acknowledged (True) or its connection was lost first (False)
+NetTaskAckCallback = Callable[[bool], None]
+
 # pylint: disable-next=too-many-instance-attributes
 class NetTaskConnection:
-    def __init__(self, own_host_name: str, is_starter: bool):
+    # Idle connections are kept by the thousand, so they don't get an attribute dictionary
+    __slots__ = (
+        '__connection_id', '__own_host_name', '__is_starter', '__selective_ack',
+        '__max_payload_size', '__timers',
+        '__next_sequence_to_receive', '__receive_queue', '__own_max_ack',
+        '__last_known_other_alive',
+        '__delayed_ack_segments', '__delayed_ack_segment_time', '__delayed_ack_received_time',
+        '__next_sequence_to_send', '__unacked_segments', '__other_max_ack',
+        '__last_sent_data_segment_time', '__last_acked_data_time', '__last_made_aware_alive',
+        '__rtt_avg_estimate', '__rtt_stdev_estimate', '__retransmission_backoff',
+        '__tail_loss_probe_sent',
+        '__duplicate_acks', '__duplicate_acks_since_transmission', '__recovery_sequence',
+        '__send_queue', '__max_send_queue_size', '__max_window_size', '__window_size',
+        '__own_max_sequence', '__announced_max_sequence', '__other_max_sequence',
+        '__send_queue_offset', '__received_fragments', '__congestion_controller',
+        '__dequeued_messages', '__message_callbacks', '__segment_callbacks', '__acked_callbacks',
+        '__window_measurement_start', '__drained_segments', '__window_exhausted',
+        '__pacing', '__next_paced_send_time', '__paced_segments_waiting',
+        '__segments_sent', '__segments_received', '__bytes_sent', '__bytes_received',
+        '__retransmitted_segments', '__retransmission_timeouts', '__duplicate_segments',
+        '__window_stalls',
+        '__other_has_closed', '__own_close_segment_sequence'
+    )
+
+    # pylint: disable-next=too-many-arguments,too-many-positional-arguments,too-many-statements
+    def __init__(self,
+                 connection_id: int,
+                 own_host_name: str,
+                 is_starter: bool,
+                 selective_ack: bool = True,
+                 congestion_controller: Optional[NetTaskCongestionController] = None,
+                 max_payload_size: int = MAX_PAYLOAD_SIZE,
+                 timers: Optional[NetTaskTimerHeap] = None,
+                 max_window_size: int = MAXIMUM_WINDOW_SIZE,
+                 max_send_queue_size: int = SEND_QUEUE_MAX_SIZE,
+                 pacing: bool = False):
+
         current_time = time.time()
 
         # Basic information
-        self.__own_host_name = own_host_name
+        self.__connection_id = connection_id
+        self.__own_host_name = own_host_name # Only sent during the handshake
         self.__is_starter = is_starter
+        self.__selective_ack = selective_ack
+        self.__max_payload_size = max_payload_size
+        self.__timers = timers
 
-        # Incoming data
-        self.__receive_queue: dict[int, NetTaskSegment] = {}
+        # Incoming data (segments are kept by sequence, in ring buffers that only grow as far as
+        # the window is used, so that idle connections stay small)
         self.__next_sequence_to_receive = 1
+        self.__receive_queue = NetTaskSegmentWindow(self.__next_sequence_to_receive,
+                                                    MINIMUM_WINDOW_SIZE)
         self.__own_max_ack = 0
         self.__last_known_other_alive = current_time
 
+        # Delayed ACKs (the last segment that wasn't acknowledged yet, and when it arrived)
+        self.__delayed_ack_segments = 0
+        self.__delayed_ack_segment_time = 0.0
+        self.__delayed_ack_received_time: Optional[float] = None
+
         # Outgoing data
-        self.__unacked_segments: dict[int, NetTaskSegment] = {}
         self.__next_sequence_to_send = 1
+        self.__unacked_segments = NetTaskSegmentWindow(self.__next_sequence_to_send,
+                                                       MINIMUM_WINDOW_SIZE)
         self.__other_max_ack = 0
         self.__last_sent_data_segment_time = current_time
+        self.__last_acked_data_time = current_time
         self.__last_made_aware_alive = current_time
 
         # RTT estimation
         self.__rtt_avg_estimate: Optional[float] = None
         self.__rtt_stdev_estimate: Optional[float] = None
-
-        # Flow control information
-        self.__send_queue: list[bytes] = []
-        self.__own_max_sequence = self.__next_sequence_to_receive + WINDOW_SIZE
+        self.__retransmission_backoff = 1
+        self.__tail_loss_probe_sent = False
+
+        # Fast retransmission. Duplicate ACKs are counted since the last one that acknowledged new
+        # data, and since the missing segment was last transmitted. While recovering, the last
+        # sequence sent when the loss was detected is kept.
+        self.__duplicate_acks = 0
+        self.__duplicate_acks_since_transmission = 0
+        self.__recovery_sequence: Optional[int] = None
+
+        # Flow and congestion control information
+        self.__send_queue: deque[bytes] = deque()
+        self.__max_send_queue_size = max_send_queue_size
+        self.__max_window_size = max_window_size
+        self.__window_size = min(INITIAL_WINDOW_SIZE, max_window_size)
+        self.__own_max_sequence = self.__next_sequence_to_receive + self.__window_size
+        self.__announced_max_sequence = self.__own_max_sequence
         self.__other_max_sequence = 0
-        self.__messages_removed_from_receive_queue = 0
+        self.__send_queue_offset = 0 # Bytes of the first queued message already fragmented
+        self.__received_fragments: list[bytes | memoryview] = []
+        self.__congestion_controller = \
+            congestion_controller or NetTaskAIMDCongestionController()
+
+        # Acknowledgement callbacks. Messages are numbered in the order they are queued, and their
+        # callbacks move to the segment that carries their end once they leave the send queue.
+        self.__dequeued_messages = 0
+        self.__message_callbacks: dict[int, NetTaskAckCallback] = {}
+        self.__segment_callbacks: dict[int, list[NetTaskAckCallback]] = {}
+        self.__acked_callbacks: list[NetTaskAckCallback] = []
+
+        # Window tuning (when the first segment of the current measurement arrived, the segments
+        # drained by the application since then, and whether the other side used the whole window)
+        self.__window_measurement_start: Optional[float] = None
+        self.__drained_segments = 0
+        self.__window_exhausted = False
+
+        # Pacing (when the next new data segment may be sent, and whether any is waiting for it)
+        self.__pacing = pacing
+        self.__next_paced_send_time = current_time
+        self.__paced_segments_waiting = False
+
+        # Statistics (plain counters, only gathered when someone asks for them)
+        self.__segments_sent = 0
+        self.__segments_received = 0
+        self.__bytes_sent = 0
+        self.__bytes_received = 0
+        self.__retransmitted_segments = 0
+        self.__retransmission_timeouts = 0
+        self.__duplicate_segments = 0
+        self.__window_stalls = 0
 
         # Connection closing
         self.__other_has_closed = False
         self.__own_close_segment_sequence: Optional[int] = None
 
+        self.__schedule_timeout()
+
+    def accepts_segment(self, segment: NetTaskSegment) -> bool:
+        # Whether the segment would be newly registered, before handling it. ACKs never are.
+        max_sequence = self.__own_max_sequence
+        if not isinstance(segment.body, DATA_BODIES):
+            max_sequence += 1
+
+        return self.__next_sequence_to_receive <= segment.sequence <= max_sequence and \
+            segment.sequence not in self.__receive_queue
+
     def __register_segment(self, segment: NetTaskSegment) -> None:
         if segment.sequence < self.__next_sequence_to_receive:
+            self.__duplicate_segments += 1
             return
 
-        if not isinstance(segment.body, NetTaskDataSegmentBody):
+        if not isinstance(segment.body, DATA_BODIES):
             self.__own_max_sequence += 1
 
         if segment.sequence <= self.__own_max_sequence:
-            self.__receive_queue[segment.sequence] = segment
+            if segment.sequence in self.__receive_queue:
+                self.__duplicate_segments += 1
+            self.__receive_queue.put(segment.sequence, segment)
+
+            if segment.sequence == self.__own_max_sequence:
+                self.__window_exhausted = True
+            if self.__window_measurement_start is None:
+                self.__window_measurement_start = time.time()
 
     def __handle_received_ackable_segment(self, segment: NetTaskSegment) -> list[NetTaskSegment]:
         segments: list[NetTaskSegment] = []
@@ -81,18 +228,33 @@ class NetTaskConnection:
         # Register segment in receive queue if possible
         self.__register_segment(segment)
 
-        # Calculate and send next ACK
+        # Calculate next ACK
+        previous_max_ack = self.__own_max_ack
         while True:
             self.__own_max_ack += 1
             if self.__own_max_ack not in self.__receive_queue:
                 self.__own_max_ack -= 1
                 break
 
-        self.__last_made_aware_alive = time.time()
-        segments.append(NetTaskSegment(0,
-                                       segment.time,
-                                       self.__own_host_name,
-                                       NetTaskAckSegmentBody(self.__own_max_ack)))
+        # In-order data can be acknowledged later, together with the following segments. Anything
+        # else (losses, duplicates, control segments) is acknowledged right away.
+        current_time = time.time()
+        if isinstance(segment.body, DATA_BODIES) and \
+            segment.sequence == previous_max_ack + 1 == self.__own_max_ack and \
+            not self.__has_out_of_order_segments():
+
+            self.__delayed_ack_segments += 1
+            self.__delayed_ack_segment_time = segment.time
+            self.__delayed_ack_received_time = current_time
+
+            if self.__delayed_ack_segments >= DELAYED_ACK_SEGMENTS:
+                segments.append(self.__delayed_ack_segment(current_time))
+            else:
+                self.__schedule_timeout()
+        else:
+            self.__delayed_ack_segment_time = segment.time
+            self.__delayed_ack_received_time = current_time
+            segments.append(self.__delayed_ack_segment(current_time))
 
         # Reply to connection beginning
         if isinstance(segment.body, NetTaskWindowSegmentBody):
@@ -100,7 +262,10 @@ class NetTaskConnection:
 
             if self.__next_sequence_to_send == 1:
                 segments.append(self.__update_connection_on_send(
-                    NetTaskWindowSegmentBody(self.__own_max_sequence)))
+                    NetTaskWindowSegmentBody(self.__own_max_sequence, self.__own_host_name)))
+            else:
+                # Transmit queued messages that now fit in the receiver's window
+                segments += self.__sendable_segments()
 
         # Reply to connection end
         if isinstance(segment.body, NetTaskCloseSegmentBody):
@@ -115,13 +280,130 @@ class NetTaskConnection:
 
         return segments
 
-    def __handle_received_ack_segment(self, ack: int, seg_time: float) -> list[NetTaskSegment]:
+    def __sack_ranges(self) -> list[tuple[int, int]]:
+        ranges: list[tuple[int, int]] = []
+
+        for sequence in self.__receive_queue.sequences(self.__own_max_ack + 1):
+            if ranges and ranges[-1][1] + 1 == sequence:
+                ranges[-1] = (ranges[-1][0], sequence)
+            elif len(ranges) < MAX_SACK_RANGES:
+                ranges.append((sequence, sequence))
+            else:
+                break
+
+        return ranges
+
+    def __ack_body(self) -> NetTaskSegmentBody:
+        if self.__selective_ack:
+            ranges = self.__sack_ranges()
+            if ranges:
+                return NetTaskSackSegmentBody(self.__own_max_ack, ranges)
+
+        return NetTaskAckSegmentBody(self.__own_max_ack)
+
+    def __has_out_of_order_segments(self) -> bool:
+        in_order_segments = self.__own_max_ack - self.__next_sequence_to_receive + 1
+        return len(self.__receive_queue) > in_order_segments
+
+    def __delayed_ack_segment(self, current_time: float) -> NetTaskSegment:
+        # The time the ACK was held is added to the echoed time, so that it doesn't count as RTT
+        assert self.__delayed_ack_received_time is not None
+        echoed_time = \
+            self.__delayed_ack_segment_time + current_time - self.__delayed_ack_received_time
+
+        self.__delayed_ack_segments = 0
+        self.__delayed_ack_received_time = None
+        self.__last_made_aware_alive = current_time
+        return NetTaskSegment(0, echoed_time, self.__connection_id, self.__ack_body())
+
+    def __retransmit_holes(self, ack: int, sack_ranges: list[tuple[int, int]], seg_time: float) \
+        -> list[NetTaskSegment]:
+
+        # A segment sent before one that has already been received is considered lost. This way,
+        # holes that have already been retransmitted aren't retransmitted again on every SACK.
+        current_time = time.time()
+        holes = []
+
+        for sequence in range(ack + 1, min(sack_ranges[-1][1], self.__next_sequence_to_send)):
+            segment = self.__unacked_segments.get(sequence)
+            if segment is not None and segment.time < seg_time:
+                segment.time = current_time
+                holes.append(segment)
+
+        if holes:
+            self.__retransmitted_segments += len(holes)
+            self.__last_sent_data_segment_time = current_time
+            self.__last_made_aware_alive = current_time
+            self.__congestion_controller.on_loss(self.__rtt_avg_estimate)
+
+        return holes
+
+    def __retransmit(self, sequence: int, current_time: float) -> NetTaskSegment:
+        segment = self.__unacked_segments.get(sequence)
+        assert segment is not None
+        segment.time = current_time
+        self.__retransmitted_segments += 1
+        self.__last_sent_data_segment_time = current_time
+        self.__last_made_aware_alive = current_time
+        return segment
+
+    def __fast_retransmit(self, ack: int, seg_time: float, current_time: float) \
+        -> list[NetTaskSegment]:
+
+        if ack > self.__other_max_ack:
+            self.__other_max_ack = ack
+            self.__duplicate_acks = 0
+            self.__duplicate_acks_since_transmission = 0
+
+            if self.__recovery_sequence is not None:
+                if ack >= self.__recovery_sequence:
+                    self.__recovery_sequence = None
+                elif ack + 1 in self.__unacked_segments:
+                    # Partial ACK: more than one segment from the same window got lost
+                    return [self.__retransmit(ack + 1, current_time)]
+
+        elif ack == self.__other_max_ack and ack + 1 in self.__unacked_segments:
+            self.__duplicate_acks += 1
+
+            # The other side keeps receiving segments sent after the missing one. When recovering,
+            # this means that the retransmission got lost too.
+            missing_segment = self.__unacked_segments.get(ack + 1)
+            if missing_segment is not None and seg_time > missing_segment.time:
+                self.__duplicate_acks_since_transmission += 1
+
+            if self.__duplicate_acks_since_transmission == DUPLICATE_ACK_THRESHOLD:
+                if self.__recovery_sequence is None:
+                    self.__recovery_sequence = self.__next_sequence_to_send - 1
+                    self.__congestion_controller.on_loss(self.__rtt_avg_estimate)
+
+                self.__duplicate_acks_since_transmission = 0
+                return [self.__retransmit(ack + 1, current_time)]
+
+        return []
+
+    def __handle_received_ack_segment(self,
+                                      ack: int,
+                                      seg_time: float,
+                                      sack_ranges: list[tuple[int, int]]) -> list[NetTaskSegment]:
+
         segments: list[NetTaskSegment] = []
 
         # Remove segments we know don't need to be retransmitted
-        for sequence in list(self.__unacked_segments):
-            if sequence <= ack:
-                del self.__unacked_segments[sequence]
+        acked_count = self.__unacked_segments.pop_before(ack + 1)
+        for start, end in sack_ranges:
+            for sequence in range(max(start, ack + 1), min(end + 1, self.__next_sequence_to_send)):
+                if self.__unacked_segments.pop(sequence) is not None:
+                    acked_count += 1
+
+        if self.__segment_callbacks:
+            self.__collect_acked_callbacks(ack)
+
+        if acked_count > 0:
+            self.__last_acked_data_time = time.time()
+            self.__retransmission_backoff = 1
+            self.__tail_loss_probe_sent = False
+            self.__congestion_controller.on_ack(acked_count)
+            self.__schedule_timeout() # Retransmission timeout may have gotten shorter
 
         # Update RTT estimate
         current_time = time.time()
@@ -135,27 +417,36 @@ class NetTaskConnection:
             self.__rtt_avg_estimate = 0.875 * self.__rtt_avg_estimate + 0.125 * delta
 
         # Retranmsit if needed
-        if ack < self.__next_sequence_to_send - 1 and \
-            ack <= self.__other_max_ack and \
-            ack + 1 in self.__unacked_segments:
-
-            self.__last_sent_data_segment_time = current_time
-            self.__unacked_segments[ack + 1].time = current_time
-            self.__last_made_aware_alive = current_time
-            segments.append(self.__unacked_segments[ack + 1])
+        if sack_ranges:
+            segments += self.__retransmit_holes(ack, sack_ranges, seg_time)
+            self.__other_max_ack = max(self.__other_max_ack, ack)
         else:
-            self.__other_max_ack = ack
+            segments += self.__fast_retransmit(ack, seg_time, current_time)
 
         # Transmit more segments if possible
         segments += self.__sendable_segments()
 
         return segments
 
+    def __collect_acked_callbacks(self, ack: int) -> None:
+        # Only cumulative ACKs count, so that a message is only acknowledged after every message
+        # before it, and every fragment of it, was received
+        while self.__segment_callbacks:
+            sequence = next(iter(self.__segment_callbacks))
+            if sequence > ack:
+                break
+
+            self.__acked_callbacks += self.__segment_callbacks.pop(sequence)
+
     def handle_received_segment(self, segment: NetTaskSegment) -> list[NetTaskSegment]:
         self.__last_known_other_alive = time.time()
 
         if isinstance(segment.body, NetTaskAckSegmentBody):
-            return self.__handle_received_ack_segment(segment.body.ack, segment.time)
+            return self.__handle_received_ack_segment(segment.body.ack, segment.time, [])
+        elif isinstance(segment.body, NetTaskSackSegmentBody):
+            return self.__handle_received_ack_segment(segment.body.ack,
+                                                      segment.time,
+                                                      segment.body.ranges)
         else:
             return self.__handle_received_ackable_segment(segment)
 
@@ -163,25 +454,80 @@ class NetTaskConnection:
         if self.__rtt_avg_estimate is None or self.__rtt_stdev_estimate is None:
             return INITIAL_TIMEOUT
         else:
-            return self.__rtt_avg_estimate + 4 * max(self.__rtt_stdev_estimate, MINIMUM_TIMEOUT)
+            # The other side may hold its ACK for a while
+            timeout = self.__rtt_avg_estimate + \
+                4 * max(self.__rtt_stdev_estimate, MINIMUM_TIMEOUT) + \
+                DELAYED_ACK_TIMEOUT
+            return timeout * self.__retransmission_backoff
+
+    def __tail_loss_probe_time_limit(self) -> Optional[float]:
+        # When the last segments or ACKs of a flight get lost, there are no duplicate ACKs to detect
+        # it. A single probe makes the other side ACK long before a retransmission timeout.
+        if self.__tail_loss_probe_sent or \
+            self.__recovery_sequence is not None or \
+            self.__rtt_avg_estimate is None:
 
-    def time_until_next_timeout(self) -> float:
-        current_time = time.time()
+            return None
+        else:
+            return 2 * max(self.__rtt_avg_estimate, MINIMUM_TIMEOUT) + DELAYED_ACK_TIMEOUT
+
+    def __retransmission_timer_start(self) -> float:
+        # Timed from the oldest unacknowledged segment, so that sending new data doesn't postpone
+        # it, and restarted whenever new data is acknowledged
+        oldest_segment = self.__unacked_segments.get(self.__other_max_ack + 1)
+        if oldest_segment is not None:
+            return max(oldest_segment.time, self.__last_acked_data_time)
+        else:
+            return self.__last_sent_data_segment_time
+
+    def next_timeout_time(self) -> float:
+        next_time = self.__last_known_other_alive + KEEP_ALIVE_TIMEOUT
+
+        # Only the connection starter sends keep-alives
+        if self.__is_starter:
+            next_time = min(next_time, self.__last_made_aware_alive + KEEP_ALIVE_INTERVAL)
+
+        # Only wait for ACKs if there's something to be acknowledged
+        if self.__unacked_segments:
+            timer_start = self.__retransmission_timer_start()
+            next_time = min(next_time, timer_start + self.__retransmission_time_limit())
+
+            tail_loss_probe_time_limit = self.__tail_loss_probe_time_limit()
+            if tail_loss_probe_time_limit is not None:
+                next_time = min(next_time, timer_start + tail_loss_probe_time_limit)
+
+        if self.__delayed_ack_received_time is not None:
+            next_time = min(next_time, self.__delayed_ack_received_time + DELAYED_ACK_TIMEOUT)
+
+        if self.__paced_segments_waiting:
+            next_time = min(next_time, self.__next_paced_send_time)
 
-        ack_timeout_time = \
-            self.__retransmission_time_limit() - \
-            (current_time - self.__last_sent_data_segment_time)
+        return next_time
 
-        keep_alive_interval_time = \
-            KEEP_ALIVE_INTERVAL - (current_time - self.__last_made_aware_alive)
+    def __schedule_timeout(self) -> None:
+        if self.__timers is not None:
+            self.__timers.schedule(self.__connection_id, self.next_timeout_time())
 
-        keep_alive_timeout_time = \
-            KEEP_ALIVE_TIMEOUT - (current_time - self.__last_known_other_alive)
+    def act_on_timeout(self) -> list[NetTaskSegment]:
+        segments = []
 
-        min_timeout = min(ack_timeout_time, keep_alive_interval_time, keep_alive_timeout_time)
-        return max(min_timeout, MINIMUM_TIMEOUT)
+        segment = self.__act_on_timeout()
+        if segment is not None:
+            segments.append(segment)
 
-    def act_on_timeout(self) -> Optional[NetTaskSegment]:
+        current_time = time.time()
+        if self.__delayed_ack_received_time is not None and \
+            current_time - self.__delayed_ack_received_time >= DELAYED_ACK_TIMEOUT:
+
+            segments.append(self.__delayed_ack_segment(current_time))
+
+        if self.__paced_segments_waiting:
+            segments += self.__sendable_segments()
+
+        self.__schedule_timeout()
+        return segments
+
+    def __act_on_timeout(self) -> Optional[NetTaskSegment]:
         current_time = time.time()
 
         # Fail if there is no reply from the other side in a long time
@@ -189,20 +535,36 @@ class NetTaskConnection:
             raise NetTaskConnectionException('Keep-alive timed out')
 
         # Retransmit segment if time to receive ACK passed
-        if current_time - self.__last_sent_data_segment_time >= self.__retransmission_time_limit():
+        if current_time - self.__retransmission_timer_start() >= \
+            self.__retransmission_time_limit():
+
             self.__last_sent_data_segment_time = current_time
 
             if len(self.__unacked_segments) > 0 and \
                 self.__other_max_ack + 1 in self.__unacked_segments:
 
-                if self.__rtt_avg_estimate is not None and self.__rtt_stdev_estimate is not None:
-                    self.__rtt_avg_estimate *= RETRANSMISSION_PENALIZATION
-                    self.__rtt_stdev_estimate *= RETRANSMISSION_PENALIZATION ** 0.5
-
-                retransmit_segment = self.__unacked_segments[self.__other_max_ack + 1]
-                retransmit_segment.time = current_time
-                self.__last_sent_data_segment_time = current_time
-                return retransmit_segment
+                # Back off the timer, but not the RTT estimate, which is still valid
+                self.__retransmission_backoff = min(
+                    self.__retransmission_backoff * RETRANSMISSION_BACKOFF,
+                    MAXIMUM_RETRANSMISSION_BACKOFF)
+
+                # Other losses in the same window are repaired by partial ACKs
+                self.__duplicate_acks = 0
+                self.__duplicate_acks_since_transmission = 0
+                self.__recovery_sequence = self.__next_sequence_to_send - 1
+                self.__congestion_controller.on_timeout()
+                self.__retransmission_timeouts += 1
+                return self.__retransmit(self.__other_max_ack + 1, current_time)
+
+        # The newest segment is probed, so that its ACK reports any earlier loss
+        tail_loss_probe_time_limit = self.__tail_loss_probe_time_limit()
+        last_unacked_sequence = self.__unacked_segments.last_sequence()
+        if last_unacked_sequence is not None and \
+            tail_loss_probe_time_limit is not None and \
+            current_time - self.__retransmission_timer_start() >= tail_loss_probe_time_limit:
+
+            self.__tail_loss_probe_sent = True
+            return self.__retransmit(last_unacked_sequence, current_time)
 
         # Periodically send keep-alives to avoid timing out the other side
         if self.__is_starter and \
@@ -215,7 +577,14 @@ class NetTaskConnection:
         return None
 
     def prepare_connect_segment(self) -> NetTaskSegment:
-        return self.__update_connection_on_send(NetTaskWindowSegmentBody(self.__own_max_sequence))
+        return self.__update_connection_on_send(
+            NetTaskWindowSegmentBody(self.__own_max_sequence, self.__own_host_name))
+
+    def connection_id(self) -> int:
+        return self.__connection_id
+
+    def is_starter(self) -> bool:
+        return self.__is_starter
 
     def is_connected(self) -> bool:
         return \
@@ -223,57 +592,249 @@ class NetTaskConnection:
             self.__own_max_ack >= 1 and \
             not self.is_closed()
 
+    def has_received_segments(self) -> bool:
+        return self.__next_sequence_to_receive in self.__receive_queue
+
     def get_received_messages(self) -> tuple[list[bytes], Optional[NetTaskSegment]]:
-        messages = []
+        messages: list[bytes] = []
         window_segment = None
 
-        while self.__next_sequence_to_receive in self.__receive_queue:
-            segment = self.__receive_queue.pop(self.__next_sequence_to_receive)
-            if isinstance(segment.body, NetTaskDataSegmentBody):
-                messages.append(segment.body.message)
-                self.__own_max_sequence += 1
-                self.__messages_removed_from_receive_queue += 1
+        while (segment := self.__receive_queue.pop(self.__next_sequence_to_receive)) is not None:
+
+            # Payloads are views of the received datagrams, only copied when delivered
+            if isinstance(segment.body, DATA_BODIES):
+                if isinstance(segment.body, NetTaskBatchDataSegmentBody):
+                    messages += map(bytes, segment.body.messages) # Usually already copied
+                elif isinstance(segment.body, NetTaskFragmentSegmentBody):
+                    self.__received_fragments.append(segment.body.data)
+                    if segment.body.is_last:
+                        messages.append(b''.join(self.__received_fragments))
+                        self.__received_fragments = []
+                else:
+                    messages.append(bytes(segment.body.message))
+
+                self.__drained_segments += 1
 
             self.__next_sequence_to_receive += 1
 
-        if self.__messages_removed_from_receive_queue >= INFORM_NEW_MAX_SEQUENCE_THRESHOLD and \
-            messages:
+        # Fragments of an incomplete message also free space in the window. A window that shrank
+        # only moves again once the application catches up.
+        self.__tune_window()
+        self.__own_max_sequence = \
+            max(self.__own_max_sequence, self.__next_sequence_to_receive + self.__window_size)
 
-            self.__messages_removed_from_receive_queue = 0
+        if self.__own_max_sequence - self.__announced_max_sequence >= \
+            max(self.__window_size * WINDOW_UPDATE_THRESHOLD, 1):
+
+            self.__announced_max_sequence = self.__own_max_sequence
             window_segment = self.__update_connection_on_send(
                 NetTaskWindowSegmentBody(self.__own_max_sequence))
 
         return messages, window_segment
 
+    def __tune_window(self) -> None:
+        # Measured once per RTT, while segments are arriving
+        current_time = time.time()
+        if self.__rtt_avg_estimate is None or \
+            self.__window_measurement_start is None or \
+            current_time - self.__window_measurement_start < \
+                max(self.__rtt_avg_estimate, MINIMUM_TIMEOUT):
+
+            return
+
+        # The window only changes when it limited the other side. It then leaves room for twice
+        # the segments the application drains per RTT, so that it grows while the application keeps
+        # up (the bandwidth-delay product), and shrinks when the application falls behind.
+        if self.__window_exhausted:
+            drained_per_rtt = self.__drained_segments * self.__rtt_avg_estimate / \
+                (current_time - self.__window_measurement_start)
+
+            self.__window_size = min(max(math.ceil(WINDOW_GROWTH * drained_per_rtt),
+                                         MINIMUM_WINDOW_SIZE),
+                                     self.__max_window_size)
+
+        self.__window_measurement_start = None
+        self.__drained_segments = 0
+        self.__window_exhausted = False
+
     def __update_connection_on_send(self, body: NetTaskSegmentBody) -> NetTaskSegment:
         current_time = time.time()
 
         segment = NetTaskSegment(self.__next_sequence_to_send,
                                  current_time,
-                                 self.__own_host_name,
+                                 self.__connection_id,
                                  body)
 
-        self.__unacked_segments[segment.sequence] = segment
+        self.__unacked_segments.put(segment.sequence, segment)
         self.__next_sequence_to_send += 1
         self.__last_sent_data_segment_time = current_time
         self.__last_made_aware_alive = current_time
+        self.__schedule_timeout()
 
         return segment
 
+    def congestion_window(self) -> int:
+        return self.__congestion_controller.window()
+
+    def count_sent(self, size: int) -> None:
+        self.__segments_sent += 1
+        self.__bytes_sent += size
+
+    def count_received(self, size: int) -> None:
+        self.__segments_received += 1
+        self.__bytes_received += size
+
+    def stats(self) -> dict[str, float]:
+        # RTT estimates are zero until the first ACK arrives
+        return {
+            'receive_window': self.__window_size,
+            'max_receive_window': self.__max_window_size,
+            'send_window': max(self.__other_max_sequence - self.__next_sequence_to_send + 1, 0),
+            'send_queue': len(self.__send_queue),
+            'max_send_queue': self.__max_send_queue_size,
+            'congestion_window': self.__congestion_controller.window(),
+            'unacked_segments': len(self.__unacked_segments),
+            'rtt': self.__rtt_avg_estimate or 0.0,
+            'rtt_stdev': self.__rtt_stdev_estimate or 0.0,
+            'rto': self.__retransmission_time_limit(),
+            'segments_sent': self.__segments_sent,
+            'segments_received': self.__segments_received,
+            'bytes_sent': self.__bytes_sent,
+            'bytes_received': self.__bytes_received,
+            'retransmitted_segments': self.__retransmitted_segments,
+            'retransmission_timeouts': self.__retransmission_timeouts,
+            'duplicate_segments': self.__duplicate_segments,
+            'window_stalls': self.__window_stalls
+        }
+
     def __sendable_segments(self) -> list[NetTaskSegment]:
-        can_send = \
-            self.__other_max_sequence - self.__next_sequence_to_send - len(self.__unacked_segments)
+        # Sequences up to the other side's maximum are accepted, including unacknowledged ones
+        receiver_can_send = self.__other_max_sequence - self.__next_sequence_to_send + 1
+
+        # Every duplicate ACK means that a segment left the network. Before a loss is detected, this
+        # lets small windows cause enough duplicate ACKs for a fast retransmission (limited
+        # transmit). While recovering, it keeps ACKs coming (fast recovery).
+        segments_in_flight = len(self.__unacked_segments)
+        if self.__recovery_sequence is None:
+            segments_in_flight -= min(self.__duplicate_acks, DUPLICATE_ACK_THRESHOLD - 1)
+        else:
+            segments_in_flight -= self.__duplicate_acks
+
+        network_can_send = self.__congestion_controller.window() - segments_in_flight
+        can_send = min(receiver_can_send, network_can_send)
+
+        pacing_interval = self.__pacing_interval()
+        current_time = time.time()
+        self.__paced_segments_waiting = False
+
+        segments = []
+        while can_send > 0 and self.__send_queue:
+            if pacing_interval is not None:
+                if self.__next_paced_send_time > current_time:
+                    self.__paced_segments_waiting = True
+                    self.__schedule_timeout()
+                    break
+
+                # Segments due within the timer's resolution are sent together
+                self.__next_paced_send_time = pacing_interval + \
+                    max(self.__next_paced_send_time, current_time - MINIMUM_TIMEOUT)
+
+            first_message = self.__dequeued_messages
+            segment = self.__update_connection_on_send(self.__next_data_body())
+            segments.append(segment)
+            can_send -= 1
+
+            if self.__message_callbacks:
+                for message_number in range(first_message, self.__dequeued_messages):
+                    on_acked = self.__message_callbacks.pop(message_number, None)
+                    if on_acked is not None:
+                        self.__segment_callbacks.setdefault(segment.sequence, []).append(on_acked)
+
+        # Counted on every attempt to send that the windows held back
+        if can_send <= 0 and self.__send_queue:
+            self.__window_stalls += 1
+
+        return segments
+
+    def __pacing_interval(self) -> Optional[float]:
+        # New data is spread over an RTT, instead of being sent in bursts whenever the window opens.
+        # Retransmissions and control segments aren't paced.
+        if not self.__pacing or self.__rtt_avg_estimate is None:
+            return None
+
+        window = min(self.__congestion_controller.window(),
+                     self.__other_max_sequence - self.__other_max_ack)
+        return self.__rtt_avg_estimate / (PACING_GAIN * max(window, 1))
+
+    def __next_data_body(self) -> NetTaskSegmentBody:
+        # Split messages that don't fit in a single segment
+        message = self.__send_queue[0]
+        if len(message) > self.__max_payload_size:
+            fragment_start = self.__send_queue_offset
+            fragment_end = fragment_start + self.__max_payload_size - 1 # Minus is_last flag
+            is_last = fragment_end >= len(message)
+
+            if is_last:
+                self.__send_queue.popleft()
+                self.__send_queue_offset = 0
+                self.__dequeued_messages += 1
+            else:
+                self.__send_queue_offset = fragment_end
+
+            return NetTaskFragmentSegmentBody(is_last, message[fragment_start:fragment_end])
+
+        # Pack as many queued messages as possible in a single segment
+        batch_size = 0
+        batch_length = 0
+        for message in self.__send_queue:
+            batch_size += 2 + len(message)
+            if batch_size > self.__max_payload_size or len(message) > BATCHED_MESSAGE_MAX_SIZE:
+                break
+
+            batch_length += 1
+
+        if batch_length <= 1:
+            self.__dequeued_messages += 1
+            return NetTaskDataSegmentBody(self.__send_queue.popleft())
+
+        batch = [self.__send_queue.popleft() for _ in range(batch_length)]
+        self.__dequeued_messages += batch_length
+        return NetTaskBatchDataSegmentBody(batch)
+
+    def encapsulate_for_sending(self,
+                                messages: list[bytes],
+                                on_acked: Optional[NetTaskAckCallback] = None) \
+        -> tuple[int, list[NetTaskSegment]]:
+
+        # Queues as many messages as fit in the send queue, and transmits them together
+        queued_count = min(len(messages), self.__max_send_queue_size - len(self.__send_queue))
+        if queued_count <= 0:
+            return 0, []
+
+        if on_acked is not None:
+            first_message = self.__dequeued_messages + len(self.__send_queue)
+            for message_number in range(first_message, first_message + queued_count):
+                self.__message_callbacks[message_number] = on_acked
+
+        self.__send_queue += messages if queued_count == len(messages) else messages[:queued_count]
+        return queued_count, self.__sendable_segments()
 
-        to_send = self.__send_queue[:can_send]
-        self.__send_queue = self.__send_queue[len(to_send) + 1:]
-        return [self.__update_connection_on_send(NetTaskDataSegmentBody(m)) for m in to_send]
+    def pop_acked_callbacks(self) -> list[NetTaskAckCallback]:
+        callbacks = self.__acked_callbacks
+        if callbacks:
+            self.__acked_callbacks = []
+        return callbacks
 
-    def encapsulate_for_sending(self, message: bytes) -> list[NetTaskSegment]:
-        if len(self.__send_queue) == SEND_QUEUE_MAX_SIZE:
-            raise NetTaskConnectionException('Full send queue')
+    def pop_pending_callbacks(self) -> list[NetTaskAckCallback]:
+        # Callbacks of messages that will never be acknowledged, once the connection is dropped
+        callbacks: list[NetTaskAckCallback] = []
+        for segment_callbacks in self.__segment_callbacks.values():
+            callbacks += segment_callbacks
+        callbacks += self.__message_callbacks.values()
 
-        self.__send_queue.append(message)
-        return self.__sendable_segments()
+        self.__segment_callbacks = {}
+        self.__message_callbacks = {}
+        return callbacks
 
     def is_closed(self) -> bool:
         return \
@@ -282,7 +843,7 @@ class NetTaskConnection:
             self.__own_close_segment_sequence not in self.__unacked_segments
 
     def close(self) -> Optional[NetTaskSegment]:
-        if len(self.__unacked_segments) > 0:
+        if len(self.__unacked_segments) > 0 or len(self.__send_queue) > 0:
             return None
 
         if self.__own_close_segment_sequence is not None:
@@ -0,0 +1,449 @@
+import random
+import socket
+import time
+
+from collections import deque
+from sys import stderr
+from typing import Callable, Optional, cast
+
+from .NetTaskCongestionController import NetTaskCongestionController
+from .NetTaskConnection import \
+    NetTaskAckCallback, NetTaskConnection, NetTaskConnectionException, \
+    CUMULATIVE_STATS, MINIMUM_WINDOW_SIZE
+from .NetTaskTimerHeap import NetTaskTimerHeap
+from .structs.NetTaskAckSegmentBody import NetTaskAckSegmentBody
+from .structs.NetTaskCloseSegmentBody import NetTaskCloseSegmentBody
+from .structs.NetTaskSegment import NetTaskSegment
+from .structs.NetTaskWindowSegmentBody import NetTaskWindowSegmentBody
+
+class NetTaskRuntimeException(Exception):
+    pass
+
+DEFAULT_MTU = 1500 # bytes (used when the path MTU can't be probed)
+MINIMUM_MTU = 576 # bytes
+MAXIMUM_MTU = 0xFFFF # bytes
+IP_UDP_HEADERS_SIZE = 28 # bytes
+IP_MTU = 14 # Linux socket option, not exported by the socket module
+
+STATS_EXPORT_INTERVAL = 10 # seconds (default)
+
+# Told the aggregate statistics of an endpoint, and the statistics of each of its connections
+NetTaskStatsCallback = Callable[[dict[str, float], dict[str, dict[str, float]]], None]
+
+# Connections of a NetTask endpoint, shared by the threaded and the asyncio implementations. It
+# doesn't do any I/O or synchronization: datagrams are sent through the sendto callback, and the
+# caller is told when connections become ready to be received from or are removed. Acknowledgement
+# callbacks are called from here too, so they must be quick and must not call the NetTask.
+# pylint: disable-next=too-many-instance-attributes
+class NetTaskConnectionTable:
+    # pylint: disable-next=too-many-arguments,too-many-positional-arguments
+    def __init__(self,
+                 own_host_name: str,
+                 is_server: bool,
+                 selective_ack: bool,
+                 congestion_controller: Callable[[], NetTaskCongestionController],
+                 mtu: Optional[int],
+                 sendto: Callable[[bytes, tuple[str, int]], None],
+                 on_ready: Callable[[], None],
+                 on_removed: Callable[[str], None],
+                 max_window_size: int,
+                 max_send_queue_size: int,
+                 pacing: bool):
+
+        if max_window_size < MINIMUM_WINDOW_SIZE:
+            raise NetTaskRuntimeException(
+                f'Maximum window size must be at least {MINIMUM_WINDOW_SIZE} segments')
+        if max_send_queue_size < 1:
+            raise NetTaskRuntimeException('Maximum send queue size must be positive')
+
+        self.__own_host_name = own_host_name
+        self.__is_server = is_server
+        self.__accepting_connections = is_server
+        self.__selective_ack = selective_ack
+        self.__congestion_controller = congestion_controller
+        self.__mtu = mtu # Probed for every connection if not provided
+        self.__max_window_size = max_window_size # Limits applied to every connection
+        self.__max_send_queue_size = max_send_queue_size
+        self.__pacing = pacing
+        self.__sendto = sendto
+        self.__on_ready = on_ready
+        self.__on_removed = on_removed
+
+        self.__host_addr_port: dict[str, tuple[str, int]] = {}
+        self.__connections: dict[str, NetTaskConnection] = {}
+        self.__connection_hosts: dict[int, str] = {}
+        self.__timers = NetTaskTimerHeap()
+
+        # Connections only join the ready queue when they have in-order data or were closed, so that
+        # receiving doesn't need to visit every connection
+        self.__ready_hosts: deque[str] = deque()
+        self.__ready_hosts_set: set[str] = set()
+
+        # Statistics of removed connections are kept, so that the aggregate doesn't go back
+        self.__removed_stats: dict[str, float] = {key: 0 for key in CUMULATIVE_STATS}
+        self.__stray_segments = 0
+        self.__stats_callback: Optional[NetTaskStatsCallback] = None
+        self.__stats_interval: float = STATS_EXPORT_INTERVAL
+        self.__next_stats_export: Optional[float] = None
+
+    @staticmethod
+    def __probe_mtu(addr_port: tuple[str, int]) -> int:
+        # The kernel knows the MTU of the route to a connected socket
+        probe_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            probe_socket.connect(addr_port)
+            return probe_socket.getsockopt(socket.IPPROTO_IP, IP_MTU)
+        except OSError:
+            return DEFAULT_MTU
+        finally:
+            probe_socket.close()
+
+    def __max_payload_size(self, addr_port: tuple[str, int]) -> int:
+        mtu = self.__mtu if self.__mtu is not None else \
+            NetTaskConnectionTable.__probe_mtu(addr_port)
+        mtu = min(max(mtu, MINIMUM_MTU), MAXIMUM_MTU)
+        return mtu - IP_UDP_HEADERS_SIZE - NetTaskSegment.header_size()
+
+    def __new_connection_id(self) -> int:
+        while True:
+            connection_id = random.getrandbits(32)
+            if connection_id != 0 and connection_id not in self.__connection_hosts:
+                return connection_id
+
+    def __add_connection(self,
+                         host: str,
+                         connection_id: int,
+                         is_starter: bool,
+                         addr_port: tuple[str, int]) -> NetTaskConnection:
+
+        max_payload_size = self.__max_payload_size(addr_port)
+        if host in self.__connections:
+            self.__remove_connection(host)
+
+        connection = NetTaskConnection(connection_id,
+                                       self.__own_host_name,
+                                       is_starter,
+                                       self.__selective_ack,
+                                       self.__congestion_controller(),
+                                       max_payload_size,
+                                       self.__timers,
+                                       self.__max_window_size,
+                                       self.__max_send_queue_size,
+                                       self.__pacing)
+
+        self.__connections[host] = connection
+        self.__connection_hosts[connection_id] = host
+        self.__host_addr_port[host] = addr_port
+        return connection
+
+    def __remove_connection(self, host: str) -> None:
+        connection = self.__connections.pop(host)
+        del self.__connection_hosts[connection.connection_id()]
+        self.__timers.cancel(connection.connection_id())
+        self.__on_removed(host)
+
+        connection_stats = connection.stats()
+        for key in CUMULATIVE_STATS:
+            self.__removed_stats[key] += connection_stats[key]
+
+        for on_acked in connection.pop_pending_callbacks():
+            on_acked(False)
+
+    def __mark_ready(self, host: str, connection: NetTaskConnection) -> None:
+        if host not in self.__ready_hosts_set and \
+            (connection.has_received_segments() or connection.is_closed()):
+
+            self.__ready_hosts_set.add(host)
+            self.__ready_hosts.append(host)
+            self.__on_ready()
+
+    def sendto(self, segment: NetTaskSegment, host: str) -> None:
+        segment_bytes = segment.serialize()
+        connection = self.__connections.get(host)
+        if connection is not None:
+            connection.count_sent(len(segment_bytes))
+
+        self.__sendto(segment_bytes, self.__host_addr_port[host])
+
+    def next_deadline(self) -> Optional[float]:
+        deadline = self.__timers.next_deadline()
+        if self.__next_stats_export is not None and \
+            (deadline is None or self.__next_stats_export < deadline):
+
+            return self.__next_stats_export
+        return deadline
+
+    def start_closing(self, host: Optional[str]) -> list[str]:
+        # Closing without a host closes every connection and stops accepting new ones
+        if host is None:
+            self.__accepting_connections = False
+            return list(self.__connections)
+        else:
+            return [host]
+
+    @staticmethod
+    def __is_handshake(segment: NetTaskSegment) -> bool:
+        # Only the first segment of a handshake carries the other side's name
+        return segment.sequence == 1 and \
+            isinstance(segment.body, NetTaskWindowSegmentBody) and \
+            segment.body.host != ''
+
+    def __accept_connection(self,
+                            segment: NetTaskSegment,
+                            addr_port: tuple[str, int]) -> Optional[str]:
+
+        if not self.__accepting_connections or not NetTaskConnectionTable.__is_handshake(segment):
+            return None
+
+        # A host reconnecting with a new connection ID replaces its old connection
+        host = cast(NetTaskWindowSegmentBody, segment.body).host
+        self.__add_connection(host, segment.connection_id, False, addr_port)
+        return host
+
+    def __is_colliding_handshake(self,
+                                 segment: NetTaskSegment,
+                                 host: str,
+                                 addr_port: tuple[str, int]) -> bool:
+
+        # Connection IDs are only unique among the connecting side's connections, so another host
+        # may pick one that is already in use here
+        return NetTaskConnectionTable.__is_handshake(segment) and \
+            not self.__connections[host].is_starter() and \
+            (cast(NetTaskWindowSegmentBody, segment.body).host != host or \
+             self.__host_addr_port[host] != addr_port)
+
+    def __reject_handshake(self, segment: NetTaskSegment, addr_port: tuple[str, int]) -> None:
+        # An unsequenced close tells the other side to pick another connection ID
+        reset_segment = \
+            NetTaskSegment(0, segment.time, segment.connection_id, NetTaskCloseSegmentBody())
+        self.__sendto(reset_segment.serialize(), addr_port)
+
+    @staticmethod
+    def __is_handshake_rejection(segment: NetTaskSegment) -> bool:
+        return segment.sequence == 0 and isinstance(segment.body, NetTaskCloseSegmentBody)
+
+    def __ack_stray_close(self, segment: NetTaskSegment, addr_port: tuple[str, int]) -> None:
+        # Connection already closed on this side, but the other side missed our ACK
+        ack_body = NetTaskAckSegmentBody(segment.sequence)
+        ack_segment = NetTaskSegment(0, segment.time, segment.connection_id, ack_body)
+        self.__sendto(ack_segment.serialize(), addr_port)
+
+    def handle_received_segment(self,
+                                segment: NetTaskSegment,
+                                addr_port: tuple[str, int],
+                                size: int) -> tuple[Optional[str], list[NetTaskSegment]]:
+
+        host = self.__connection_hosts.get(segment.connection_id)
+        if host is None:
+            host = self.__accept_connection(segment, addr_port)
+
+        if host is None:
+            self.__stray_segments += 1
+
+            # Rejections aren't acknowledged: the ACK would carry an ID that is in use here
+            if isinstance(segment.body, NetTaskCloseSegmentBody) and \
+                not NetTaskConnectionTable.__is_handshake_rejection(segment):
+
+                self.__ack_stray_close(segment, addr_port)
+            return None, []
+
+        # The connection using the ID is left alone, including its address
+        if self.__is_colliding_handshake(segment, host, addr_port):
+            self.__stray_segments += 1
+            self.__reject_handshake(segment, addr_port)
+            return None, []
+
+        connection = self.__connections[host]
+        if NetTaskConnectionTable.__is_handshake_rejection(segment):
+            if connection.is_starter() and \
+                not connection.is_connected() and \
+                self.__host_addr_port[host] == addr_port:
+
+                print(f'NetTask connection ID to {host} already in use: Reconnecting', file=stderr)
+                self.__reconnect(host)
+            return None, []
+
+        # Only new segments in the window can move a host to another address. Anything else may
+        # come from another host that picked the same connection ID.
+        is_accepted = connection.accepts_segment(segment)
+
+        connection.count_received(size)
+        try:
+            reply_segments = connection.handle_received_segment(segment)
+        except NetTaskConnectionException:
+            # Late segments from closed connections must not kill the management thread
+            self.__remove_connection(host)
+
+            if isinstance(segment.body, NetTaskCloseSegmentBody):
+                self.__ack_stray_close(segment, addr_port)
+            else:
+                print(f'NetTask ignored unexpected segment from {host}', file=stderr)
+            return None, []
+
+        if is_accepted and self.__host_addr_port[host] != addr_port:
+            self.__host_addr_port[host] = addr_port
+
+        for on_acked in connection.pop_acked_callbacks():
+            on_acked(True)
+
+        self.__mark_ready(host, connection)
+        return host, reply_segments
+
+    def handle_timeouts(self) -> None:
+        current_time = time.time()
+        if self.__next_stats_export is not None and self.__next_stats_export <= current_time:
+            self.__export_stats(current_time)
+
+        # Only connections whose timers expired are visited. They reschedule themselves.
+        for connection_id in self.__timers.pop_expired(current_time):
+            host = self.__connection_hosts.get(connection_id)
+            if host is None:
+                continue
+
+            connection = self.__connections[host]
+            try:
+                for wakeup_segment in connection.act_on_timeout():
+                    self.sendto(wakeup_segment, host)
+            except NetTaskConnectionException:
+                if self.__is_server:
+                    print(f'NetTask connection to {host} closed unexpectedly', file=stderr)
+                    self.__remove_connection(host)
+                else:
+                    print(f'NetTask connection to {host} dropped: Attempting reconnection',
+                          file=stderr)
+                    self.__reconnect(host)
+
+    def __reconnect(self, host: str) -> None:
+        while True:
+            try:
+                new_connection = self.__add_connection(host,
+                                                       self.__new_connection_id(),
+                                                       True,
+                                                       self.__host_addr_port[host])
+                self.sendto(new_connection.prepare_connect_segment(), host)
+                return
+            except NetTaskConnectionException:
+                print(f'NetTask reconnection to {host} failed', file=stderr)
+
+    def connect(self, host: str, addr_port: tuple[str, int]) -> None:
+        if host in self.__connections:
+            raise NetTaskRuntimeException(f'Already connected to {host}')
+
+        connection = self.__add_connection(host, self.__new_connection_id(), True, addr_port)
+        self.sendto(connection.prepare_connect_segment(), host)
+
+    def is_connected(self, host: str) -> bool:
+        connection = self.__connections.get(host)
+        if connection is None:
+            raise NetTaskRuntimeException('Connection died unexpectedly')
+
+        return connection.is_connected()
+
+    def receive(self) -> Optional[tuple[list[bytes], str]]:
+        while self.__ready_hosts:
+            host = self.__ready_hosts.popleft()
+            self.__ready_hosts_set.remove(host)
+
+            connection = self.__connections.get(host)
+            if connection is None:
+                continue
+
+            messages, window_segment = connection.get_received_messages()
+            if window_segment is not None:
+                self.sendto(window_segment, host)
+
+            if connection.is_closed():
+                self.__remove_connection(host)
+                if not self.__is_server:
+                    return messages, '' # Sinalize end of connection with no host
+
+            if messages != []:
+                return messages, host
+
+        return None
+
+    def send(self,
+             messages: list[bytes],
+             host: str,
+             on_acked: Optional[NetTaskAckCallback] = None) -> int:
+
+        # Returns how many messages fit in the send queue
+        connection = self.__connections.get(host)
+        if connection is None:
+            raise NetTaskRuntimeException('Connection died unexpectedly')
+
+        if connection.is_closed():
+            self.__remove_connection(host)
+            raise NetTaskRuntimeException('Trying to send data to a closed connection')
+
+        queued_count, segments = connection.encapsulate_for_sending(messages, on_acked)
+
+        # Segments that can't be transmitted now are sent when ACKs open the windows
+        for segment in segments:
+            self.sendto(segment, host)
+        return queued_count
+
+    def congestion_window(self, host: str) -> int:
+        connection = self.__connections.get(host)
+        if connection is None:
+            raise NetTaskRuntimeException(f'Not connected to {host}')
+
+        return connection.congestion_window()
+
+    def connection_stats(self, host: str) -> dict[str, float]:
+        connection = self.__connections.get(host)
+        if connection is None:
+            raise NetTaskRuntimeException(f'Not connected to {host}')
+
+        return connection.stats()
+
+    def stats(self, host: Optional[str] = None) -> dict[str, float]:
+        # Without a host, counters are added across every connection, past and present
+        if host is not None:
+            return self.connection_stats(host)
+
+        aggregate = self.__removed_stats.copy()
+        aggregate['connections'] = len(self.__connections)
+        aggregate['stray_segments'] = self.__stray_segments
+        aggregate['send_queue'] = 0
+        aggregate['unacked_segments'] = 0
+
+        for connection in self.__connections.values():
+            connection_stats = connection.stats()
+            for key in CUMULATIVE_STATS:
+                aggregate[key] += connection_stats[key]
+            aggregate['send_queue'] += connection_stats['send_queue']
+            aggregate['unacked_segments'] += connection_stats['unacked_segments']
+
+        return aggregate
+
+    def export_stats(self, callback: Optional[NetTaskStatsCallback], interval: float) -> None:
+        # The callback is replaced, or removed if None
+        if interval <= 0:
+            raise NetTaskRuntimeException('Statistics export interval must be positive')
+
+        self.__stats_callback = callback
+        self.__stats_interval = interval
+        self.__next_stats_export = time.time() + interval if callback is not None else None
+
+    def __export_stats(self, current_time: float) -> None:
+        assert self.__stats_callback is not None and self.__next_stats_export is not None
+
+        self.__next_stats_export = \
+            max(self.__next_stats_export + self.__stats_interval, current_time)
+        self.__stats_callback(self.stats(),
+                              {host: c.stats() for host, c in self.__connections.items()})
+
+    def close(self, hosts: list[str]) -> list[str]:
+        # Returns the hosts whose connections haven't finished closing yet
+        closing_hosts = []
+        for host in hosts:
+            connection = self.__connections.get(host)
+            if connection is not None and not connection.is_closed():
+                close_segment = connection.close()
+                if close_segment is not None:
+                    self.sendto(close_segment, host)
+
+                closing_hosts.append(host)
+
+        return closing_hosts
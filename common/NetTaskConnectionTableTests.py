@@ -0,0 +1,195 @@
+import time
+from collections import deque
+from typing import Callable, Optional
+from unittest import TestCase, main
+from unittest.mock import patch
+
+from .NetTaskCongestionController import NetTaskAIMDCongestionController
+from .NetTaskConnection import KEEP_ALIVE_TIMEOUT, MAXIMUM_WINDOW_SIZE, SEND_QUEUE_MAX_SIZE
+from .NetTaskConnectionTable import NetTaskConnectionTable, NetTaskRuntimeException
+from .structs.NetTaskAckSegmentBody import NetTaskAckSegmentBody
+from .structs.NetTaskCloseSegmentBody import NetTaskCloseSegmentBody
+from .structs.NetTaskSegment import NetTaskSegment
+
+SERVER_ADDR_PORT = ('10.0.0.1', 9999)
+AGENT_A_ADDR_PORT = ('10.0.1.1', 40000)
+AGENT_B_ADDR_PORT = ('10.0.2.1', 40000)
+
+# Connection tables that exchange datagrams in memory
+class Network:
+    def __init__(self) -> None:
+        self.tables: dict[tuple[str, int], NetTaskConnectionTable] = {}
+        self.datagrams: deque[tuple[bytes, tuple[str, int], tuple[str, int]]] = deque()
+        self.received: dict[tuple[str, int], list[bytes]] = {}
+
+    def add_table(self,
+                  own_host_name: str,
+                  addr_port: tuple[str, int],
+                  is_server: bool) -> NetTaskConnectionTable:
+
+        def sendto(data: bytes, destination: tuple[str, int]) -> None:
+            self.datagrams.append((data, addr_port, destination))
+
+        table = NetTaskConnectionTable(own_host_name, is_server, True,
+                                       NetTaskAIMDCongestionController, 1500, sendto,
+                                       lambda: None, lambda host: None,
+                                       MAXIMUM_WINDOW_SIZE, SEND_QUEUE_MAX_SIZE, False)
+        self.tables[addr_port] = table
+        self.received[addr_port] = []
+        return table
+
+    def deliver(self, duplicate: Optional[Callable[[NetTaskSegment], bool]] = None) -> None:
+        # Segments that duplicate() returns True for are delivered twice in a row
+        while self.datagrams:
+            data, source, destination = self.datagrams.popleft()
+            segment = NetTaskSegment.deserialize(data)
+            copies = 2 if duplicate is not None and duplicate(segment) else 1
+
+            table = self.tables[destination]
+            for _ in range(copies):
+                host, reply_segments = table.handle_received_segment(segment, source, len(data))
+                for reply_segment in reply_segments:
+                    table.sendto(reply_segment, host or '')
+
+            while (received := table.receive()) is not None:
+                self.received[destination] += received[0]
+
+class NetTaskConnectionTableTests(TestCase):
+    def test_handshake(self) -> None:
+        network = Network()
+        server = network.add_table('server', SERVER_ADDR_PORT, True)
+        agent = network.add_table('agent', AGENT_A_ADDR_PORT, False)
+
+        agent.connect('server', SERVER_ADDR_PORT)
+        network.deliver()
+
+        self.assertTrue(agent.is_connected('server'))
+        self.assertTrue(server.is_connected('agent'))
+
+    def test_connection_id_collision(self) -> None:
+        network = Network()
+        server = network.add_table('server', SERVER_ADDR_PORT, True)
+        agent_a = network.add_table('agentA', AGENT_A_ADDR_PORT, False)
+        agent_b = network.add_table('agentB', AGENT_B_ADDR_PORT, False)
+
+        # Both agents pick the same connection ID, and the second one picks another when rejected
+        with patch('common.NetTaskConnectionTable.random.getrandbits',
+                   side_effect=[1234, 1234, 5678]):
+
+            agent_a.connect('server', SERVER_ADDR_PORT)
+            network.deliver()
+            agent_b.connect('server', SERVER_ADDR_PORT)
+            network.deliver()
+
+        self.assertTrue(agent_a.is_connected('server'))
+        self.assertTrue(agent_b.is_connected('server'))
+        self.assertTrue(server.is_connected('agentA'))
+        self.assertTrue(server.is_connected('agentB'))
+
+        # Replies still go to the right agents
+        server.send([b'A'], 'agentA')
+        server.send([b'B'], 'agentB')
+        network.deliver()
+        self.assertEqual(network.received[AGENT_A_ADDR_PORT], [b'A'])
+        self.assertEqual(network.received[AGENT_B_ADDR_PORT], [b'B'])
+
+    def test_duplicated_handshake_rejection(self) -> None:
+        network = Network()
+        server = network.add_table('server', SERVER_ADDR_PORT, True)
+        agent_a = network.add_table('agentA', AGENT_A_ADDR_PORT, False)
+        agent_b = network.add_table('agentB', AGENT_B_ADDR_PORT, False)
+
+        # The rejection reaches the second agent again after it picked a new connection ID
+        with patch('common.NetTaskConnectionTable.random.getrandbits',
+                   side_effect=[1234, 1234, 5678]):
+
+            agent_a.connect('server', SERVER_ADDR_PORT)
+            network.deliver()
+            agent_b.connect('server', SERVER_ADDR_PORT)
+            network.deliver(lambda segment: segment.sequence == 0 and
+                            isinstance(segment.body, NetTaskCloseSegmentBody))
+
+        self.assertTrue(agent_b.is_connected('server'))
+        self.assertEqual(server.stats('agentA')['segments_received'], 2) # Only agentA's handshake
+
+        server.send([b'A'], 'agentA')
+        network.deliver()
+        self.assertEqual(network.received[AGENT_A_ADDR_PORT], [b'A'])
+        self.assertEqual(network.received[AGENT_B_ADDR_PORT], [])
+
+    def test_address_only_moves_with_accepted_segments(self) -> None:
+        network = Network()
+        server = network.add_table('server', SERVER_ADDR_PORT, True)
+        agent = network.add_table('agent', AGENT_A_ADDR_PORT, False)
+
+        with patch('common.NetTaskConnectionTable.random.getrandbits', return_value=1234):
+            agent.connect('server', SERVER_ADDR_PORT)
+            network.deliver()
+
+        # An ACK with the same connection ID from elsewhere doesn't move the agent
+        ack_segment = NetTaskSegment(0, time.time(), 1234, NetTaskAckSegmentBody(1))
+        network.datagrams.append((ack_segment.serialize(), AGENT_B_ADDR_PORT, SERVER_ADDR_PORT))
+        network.deliver()
+
+        server.send([b'A'], 'agent')
+        network.deliver()
+        self.assertEqual(network.received[AGENT_A_ADDR_PORT], [b'A'])
+
+        # New data does, when the agent's address changes
+        network.tables[AGENT_B_ADDR_PORT] = agent
+        network.received[AGENT_B_ADDR_PORT] = []
+        agent.send([b'moved'], 'server')
+        network.datagrams = deque((data, AGENT_B_ADDR_PORT, destination)
+                                  for data, _, destination in network.datagrams)
+        network.deliver()
+
+        server.send([b'B'], 'agent')
+        network.deliver()
+        self.assertEqual(network.received[SERVER_ADDR_PORT], [b'moved'])
+        self.assertEqual(network.received[AGENT_B_ADDR_PORT], [b'B'])
+
+    def test_full_send_queue(self) -> None:
+        network = Network()
+        network.add_table('server', SERVER_ADDR_PORT, True)
+        agent = network.add_table('agent', AGENT_A_ADDR_PORT, False)
+        agent.connect('server', SERVER_ADDR_PORT)
+        network.deliver()
+
+        # One message per segment. Past the windows, only as many messages as fit in the send
+        # queue are taken (send_many waits for the rest, and try_send gives up).
+        message = b'x' * 1000
+        self.assertEqual(agent.send([message] * 1000, 'server'), SEND_QUEUE_MAX_SIZE)
+        self.assertLess(agent.send([message] * 1000, 'server'), SEND_QUEUE_MAX_SIZE)
+        self.assertEqual(agent.send([message], 'server'), 0)
+
+        # ACKs make room again
+        network.deliver()
+        self.assertEqual(agent.send([message], 'server'), 1)
+        self.assertGreater(len(network.received[SERVER_ADDR_PORT]), 0)
+
+    def test_acked_callbacks(self) -> None:
+        network = Network()
+        server = network.add_table('server', SERVER_ADDR_PORT, True)
+        agent = network.add_table('agent', AGENT_A_ADDR_PORT, False)
+        agent.connect('server', SERVER_ADDR_PORT)
+        network.deliver()
+
+        # One message per segment, so that they are acknowledged right away
+        results: list[bool] = []
+        server.send([b'x' * 1000] * 2, 'agent', results.append)
+        network.deliver()
+        self.assertEqual(results, [True, True])
+
+        # The agent disappears before acknowledging these
+        server.send([b'x' * 1000] * 2, 'agent', results.append)
+        network.datagrams.clear()
+        with patch('common.NetTaskConnectionTable.time.time',
+                   return_value=time.time() + KEEP_ALIVE_TIMEOUT + 1):
+            server.handle_timeouts()
+
+        self.assertEqual(results, [True, True, False, False])
+        with self.assertRaises(NetTaskRuntimeException):
+            server.is_connected('agent')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,177 @@
+import time
+from typing import Optional
+from unittest import TestCase, main
+from unittest.mock import patch
+
+from .NetTaskCongestionController import NetTaskNoCongestionController
+from .NetTaskConnection import DELAYED_ACK_TIMEOUT, INITIAL_WINDOW_SIZE, NetTaskConnection
+from .structs.NetTaskAckSegmentBody import NetTaskAckSegmentBody
+from .structs.NetTaskSegment import NetTaskSegment
+
+CONNECTION_ID = 1234
+
+# Counts congestion events, which only start outside of loss recovery
+class RecordingCongestionController(NetTaskNoCongestionController):
+    def __init__(self) -> None:
+        self.losses = 0
+        self.timeouts = 0
+
+    def on_loss(self, rtt_estimate: Optional[float]) -> None:
+        self.losses += 1
+
+    def on_timeout(self) -> None:
+        self.timeouts += 1
+
+def ack(sequence: int) -> NetTaskSegment:
+    return NetTaskSegment(0, time.time(), CONNECTION_ID, NetTaskAckSegmentBody(sequence))
+
+def sequences(segments: list[NetTaskSegment]) -> list[int]:
+    return [segment.sequence for segment in segments]
+
+def acks(segments: list[NetTaskSegment]) -> list[int]:
+    return [segment.body.ack for segment in segments
+            if isinstance(segment.body, NetTaskAckSegmentBody)]
+
+def handshake(sender: NetTaskConnection, receiver: NetTaskConnection) -> None:
+    to_receiver = [sender.prepare_connect_segment()]
+    while to_receiver:
+        to_sender = [reply for segment in to_receiver
+                     for reply in receiver.handle_received_segment(segment)]
+        to_receiver = [reply for segment in to_sender
+                       for reply in sender.handle_received_segment(segment)]
+
+class NetTaskConnectionTests(TestCase):
+    def setUp(self) -> None:
+        # Without SACKs, so that losses are only reported through duplicate ACKs
+        self.controller = RecordingCongestionController()
+        self.sender = NetTaskConnection(CONNECTION_ID, 'agent', True, False, self.controller, 100)
+        self.receiver = NetTaskConnection(CONNECTION_ID, 'server', False, False)
+        handshake(self.sender, self.receiver)
+        self.assertTrue(self.sender.is_connected())
+
+    def segments(self, count: int) -> list[NetTaskSegment]:
+        # One message per segment
+        _, segments = self.sender.encapsulate_for_sending([b'x' * 80] * count)
+        return segments
+
+    def send(self, count: int) -> list[int]:
+        return sequences(self.segments(count))
+
+    def test_three_duplicate_acks_resend_one_segment(self) -> None:
+        self.assertEqual(self.send(8), list(range(2, 10)))
+
+        # Segment 2 is lost
+        self.assertEqual(self.sender.handle_received_segment(ack(1)), [])
+        self.assertEqual(self.sender.handle_received_segment(ack(1)), [])
+        self.assertEqual(sequences(self.sender.handle_received_segment(ack(1))), [2])
+        self.assertEqual(self.sender.handle_received_segment(ack(1)), [])
+
+        self.assertEqual(self.controller.losses, 1)
+        self.assertEqual(self.sender.stats()['retransmitted_segments'], 1)
+
+    def test_partial_ack_resends_next_hole(self) -> None:
+        self.send(8)
+
+        # Segments 2 and 4 are lost
+        for _ in range(3):
+            retransmitted = self.sender.handle_received_segment(ack(1))
+        self.assertEqual(sequences(retransmitted), [2])
+        self.assertEqual(sequences(self.sender.handle_received_segment(ack(3))), [4])
+
+        # Both losses are part of the same congestion event
+        self.assertEqual(self.sender.handle_received_segment(ack(9)), [])
+        self.assertEqual(self.controller.losses, 1)
+        self.assertEqual(self.sender.stats()['retransmitted_segments'], 2)
+
+    def test_recovery_ends_when_ack_reaches_it(self) -> None:
+        self.send(8)
+        for _ in range(3):
+            self.sender.handle_received_segment(ack(1))
+        self.assertEqual(self.sender.handle_received_segment(ack(9)), [])
+
+        # Segment 12 is lost, but holes after new ACKs are no longer retransmitted right away
+        self.assertEqual(self.send(4), [10, 11, 12, 13])
+        self.assertEqual(self.sender.handle_received_segment(ack(11)), [])
+
+        # Another loss is a new congestion event
+        for _ in range(3):
+            retransmitted = self.sender.handle_received_segment(ack(11))
+        self.assertEqual(sequences(retransmitted), [12])
+        self.assertEqual(self.controller.losses, 2)
+
+    def test_timeout_recovers_whole_window(self) -> None:
+        self.send(8)
+
+        # Segments 2 and 5 are lost, along with every ACK
+        with patch('common.NetTaskConnection.time.time', return_value=time.time() + 2):
+            self.assertEqual(sequences(self.sender.act_on_timeout()), [2])
+            self.assertEqual(self.controller.timeouts, 1)
+
+            self.assertEqual(sequences(self.sender.handle_received_segment(ack(4))), [5])
+            self.assertEqual(self.sender.handle_received_segment(ack(9)), [])
+
+        self.assertEqual(self.controller.losses, 0)
+        self.assertEqual(self.sender.stats()['retransmission_timeouts'], 1)
+
+    def test_lone_segment_ack_is_delayed(self) -> None:
+        segment = self.segments(1)[0]
+        self.assertEqual(self.receiver.handle_received_segment(segment), [])
+        self.assertEqual(self.receiver.act_on_timeout(), [])
+
+        with patch('common.NetTaskConnection.time.time',
+                   return_value=time.time() + DELAYED_ACK_TIMEOUT):
+            self.assertEqual(acks(self.receiver.act_on_timeout()), [2])
+
+    def test_second_segment_is_acked_right_away(self) -> None:
+        first_segment, second_segment = self.segments(2)
+        self.assertEqual(self.receiver.handle_received_segment(first_segment), [])
+        self.assertEqual(acks(self.receiver.handle_received_segment(second_segment)), [3])
+
+        # Nothing is left to acknowledge later
+        with patch('common.NetTaskConnection.time.time',
+                   return_value=time.time() + DELAYED_ACK_TIMEOUT):
+            self.assertEqual(self.receiver.act_on_timeout(), [])
+
+    def test_out_of_order_segment_is_acked_right_away(self) -> None:
+        # Segment 2 is lost
+        segments = self.segments(2)
+        self.assertEqual(acks(self.receiver.handle_received_segment(segments[1])), [1])
+        self.assertEqual(acks(self.receiver.handle_received_segment(segments[0])), [3])
+
+    def test_window_grows_up_to_maximum(self) -> None:
+        # A simulated 100 ms RTT, over which the application drains everything it receives
+        clock = time.time()
+        with patch('common.NetTaskConnection.time.time', side_effect=lambda: clock):
+            sender = NetTaskConnection(CONNECTION_ID, 'agent', True, False,
+                                       NetTaskNoCongestionController(), 100,
+                                       max_send_queue_size=1024)
+            receiver = NetTaskConnection(CONNECTION_ID, 'server', False, False,
+                                         max_window_size=256)
+            handshake(sender, receiver)
+
+            windows = []
+            to_receiver: list[NetTaskSegment] = []
+            for _ in range(20):
+                to_receiver += sender.encapsulate_for_sending([b'x' * 80] * 1024)[1]
+
+                clock += 0.05
+                to_sender = [reply for segment in to_receiver
+                             for reply in receiver.handle_received_segment(segment)]
+                _, window_segment = receiver.get_received_messages()
+                if window_segment is not None:
+                    to_sender.append(window_segment)
+
+                clock += DELAYED_ACK_TIMEOUT
+                to_sender += receiver.act_on_timeout()
+
+                clock += 0.05 - DELAYED_ACK_TIMEOUT
+                to_receiver = [reply for segment in to_sender
+                               for reply in sender.handle_received_segment(segment)]
+                windows.append(receiver.stats()['receive_window'])
+
+        self.assertGreater(max(windows[:10]), INITIAL_WINDOW_SIZE)
+        self.assertEqual(max(windows), 256)
+        self.assertEqual(windows[-5:], [256] * 5)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+import socket
+from collections import deque
+
+BUFFER_SIZE = 1 << 20 # bytes
+POOL_SIZE = 4 # buffers
+
+# Datagrams are received back to back into large buffers, and parsed in place. Received payloads
+# are views that keep their buffer alive until the application takes them, so a buffer is only
+# reused once no views of it are left.
+class NetTaskReceiveBufferPool:
+    def __init__(self, max_datagram_size: int) -> None:
+        self.__max_datagram_size = max_datagram_size
+        self.__free_buffers: deque[bytearray] = deque()
+        self.__buffer = bytearray(max(BUFFER_SIZE, max_datagram_size))
+        self.__view = memoryview(self.__buffer)
+        self.__offset = 0
+
+    @staticmethod
+    def __is_in_use(buffer: bytearray) -> bool:
+        # Bytearrays can't be resized while views of them exist
+        try:
+            buffer.append(0)
+        except BufferError:
+            return True
+
+        buffer.pop()
+        return False
+
+    def __next_buffer(self) -> None:
+        if len(self.__free_buffers) == POOL_SIZE:
+            self.__free_buffers.popleft()
+        self.__free_buffers.append(self.__buffer)
+        del self.__view # Otherwise, the buffer would always be in use
+
+        for buffer in self.__free_buffers:
+            if not NetTaskReceiveBufferPool.__is_in_use(buffer):
+                self.__free_buffers.remove(buffer)
+                self.__buffer = buffer
+                break
+        else:
+            self.__buffer = bytearray(len(self.__buffer))
+
+        self.__view = memoryview(self.__buffer)
+        self.__offset = 0
+
+    def receive_from(self, receive_socket: socket.socket) -> tuple[memoryview, tuple[str, int]]:
+        # Raises BlockingIOError when there are no datagrams to be received
+        if len(self.__buffer) - self.__offset < self.__max_datagram_size:
+            self.__next_buffer()
+
+        size, addr_port = receive_socket.recvfrom_into(self.__view[self.__offset:],
+                                                       self.__max_datagram_size,
+                                                       socket.MSG_DONTWAIT)
+
+        datagram = self.__view[self.__offset:self.__offset + size]
+        self.__offset += size
+        return datagram, addr_port
@@ -0,0 +1,51 @@
+import socket
+from unittest import TestCase, main
+
+from .NetTaskReceiveBufferPool import NetTaskReceiveBufferPool, BUFFER_SIZE
+
+DATAGRAM_SIZE = 1 << 15 # bytes
+DATAGRAMS_PER_BUFFER = BUFFER_SIZE // DATAGRAM_SIZE
+
+class NetTaskReceiveBufferPoolTests(TestCase):
+    def setUp(self) -> None:
+        self.receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.receiver.bind(('127.0.0.1', 0))
+        self.sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.buffers = NetTaskReceiveBufferPool(DATAGRAM_SIZE)
+
+    def tearDown(self) -> None:
+        self.receiver.close()
+        self.sender.close()
+
+    def receive(self, count: int) -> list[memoryview]:
+        datagrams = []
+        for i in range(count):
+            self.sender.sendto(bytes([i % 256]) * DATAGRAM_SIZE, self.receiver.getsockname())
+            datagram, _ = self.buffers.receive_from(self.receiver)
+            datagrams.append(datagram)
+
+        return datagrams
+
+    def test_contents(self) -> None:
+        datagrams = self.receive(2 * DATAGRAMS_PER_BUFFER)
+        for i, datagram in enumerate(datagrams):
+            self.assertEqual(datagram, bytes([i % 256]) * DATAGRAM_SIZE)
+
+    def test_empty_socket(self) -> None:
+        with self.assertRaises(BlockingIOError):
+            self.buffers.receive_from(self.receiver)
+
+    def test_buffer_in_use(self) -> None:
+        datagrams = self.receive(DATAGRAMS_PER_BUFFER + 1)
+        self.assertTrue(datagrams[-1].obj is not datagrams[0].obj)
+
+    def test_buffer_reuse(self) -> None:
+        # The first buffer is free again once no datagrams from it are kept
+        first_buffer = self.receive(1)[0].obj
+        for _ in range(DATAGRAMS_PER_BUFFER - 1):
+            self.receive(1)
+
+        self.assertTrue(self.receive(1)[0].obj is first_buffer)
+
+if __name__ == '__main__':
+    main()
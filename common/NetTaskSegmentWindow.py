@@ -0,0 +1,96 @@
+from typing import Iterator, Optional
+
+from .structs.NetTaskSegment import NetTaskSegment
+
+class NetTaskSegmentWindow:
+    __slots__ = ('__buffer', '__start', '__end', '__length')
+
+    def __init__(self, start: int, capacity: int) -> None:
+        # Segments are stored by sequence modulo the capacity, which is a power of two
+        self.__buffer: list[Optional[NetTaskSegment]] = [None] * self.__round_capacity(capacity)
+        self.__start = start # Lowest sequence that can still be stored
+        self.__end = start # One past the highest stored sequence
+        self.__length = 0
+
+    @staticmethod
+    def __round_capacity(capacity: int) -> int:
+        return 1 << max(capacity - 1, 0).bit_length()
+
+    def get(self, sequence: int) -> Optional[NetTaskSegment]:
+        if self.__start <= sequence < self.__end:
+            return self.__buffer[sequence & (len(self.__buffer) - 1)]
+
+        return None
+
+    def put(self, sequence: int, segment: NetTaskSegment) -> None:
+        if sequence < self.__start:
+            return
+
+        # Only grows when the window does, so that its size stays predictable
+        if sequence - self.__start >= len(self.__buffer):
+            self.__grow(sequence - self.__start + 1)
+
+        index = sequence & (len(self.__buffer) - 1)
+        if self.__buffer[index] is None:
+            self.__length += 1
+
+        self.__buffer[index] = segment
+        self.__end = max(self.__end, sequence + 1)
+
+    def pop(self, sequence: int) -> Optional[NetTaskSegment]:
+        segment = self.get(sequence)
+        if segment is not None:
+            self.__buffer[sequence & (len(self.__buffer) - 1)] = None
+            self.__length -= 1
+
+            # Popping the first segment slides the window, but holes are never skipped
+            if sequence == self.__start:
+                self.__start += 1
+
+        return segment
+
+    def pop_before(self, sequence: int) -> int:
+        # Only looks at the sequences the window slides over
+        popped = 0
+        mask = len(self.__buffer) - 1
+        for i in range(self.__start, min(sequence, self.__end)):
+            if self.__buffer[i & mask] is not None:
+                self.__buffer[i & mask] = None
+                popped += 1
+
+        self.__length -= popped
+        self.__start = max(self.__start, sequence)
+        self.__end = max(self.__end, self.__start)
+        return popped
+
+    def sequences(self, start: int = 0) -> Iterator[int]:
+        mask = len(self.__buffer) - 1
+        for sequence in range(max(start, self.__start), self.__end):
+            if self.__buffer[sequence & mask] is not None:
+                yield sequence
+
+    def last_sequence(self) -> Optional[int]:
+        mask = len(self.__buffer) - 1
+        for sequence in range(self.__end - 1, self.__start - 1, -1):
+            if self.__buffer[sequence & mask] is not None:
+                return sequence
+
+        return None
+
+    def capacity(self) -> int:
+        return len(self.__buffer)
+
+    def __grow(self, capacity: int) -> None:
+        old_buffer = self.__buffer
+        old_mask = len(old_buffer) - 1
+
+        self.__buffer = [None] * self.__round_capacity(capacity)
+        new_mask = len(self.__buffer) - 1
+        for sequence in range(self.__start, self.__end):
+            self.__buffer[sequence & new_mask] = old_buffer[sequence & old_mask]
+
+    def __contains__(self, sequence: object) -> bool:
+        return isinstance(sequence, int) and self.get(sequence) is not None
+
+    def __len__(self) -> int:
+        return self.__length
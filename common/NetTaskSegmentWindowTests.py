@@ -0,0 +1,66 @@
+from unittest import TestCase, main
+
+from .NetTaskSegmentWindow import NetTaskSegmentWindow
+from .structs.NetTaskSegment import NetTaskSegment
+from .structs.NetTaskKeepAliveSegmentBody import NetTaskKeepAliveSegmentBody
+
+def segment(sequence: int) -> NetTaskSegment:
+    return NetTaskSegment(sequence, 0.0, 1, NetTaskKeepAliveSegmentBody())
+
+class NetTaskSegmentWindowTests(TestCase):
+    def test_put_and_pop(self) -> None:
+        window = NetTaskSegmentWindow(1, 4)
+        for sequence in [1, 2, 4]:
+            window.put(sequence, segment(sequence))
+
+        self.assertEqual(len(window), 3)
+        self.assertNotIn(3, window)
+        self.assertEqual(list(window.sequences()), [1, 2, 4])
+        self.assertEqual(window.pop(1), segment(1))
+        self.assertEqual(window.pop(2), segment(2))
+
+        # Sequences before the start are ignored
+        window.put(2, segment(2))
+        self.assertEqual(list(window.sequences()), [4])
+
+    def test_holes_are_not_skipped(self) -> None:
+        window = NetTaskSegmentWindow(1, 4)
+        window.put(3, segment(3))
+
+        self.assertEqual(window.pop(1), None)
+        window.put(1, segment(1))
+        self.assertEqual(window.pop(1), segment(1))
+        self.assertEqual(window.pop(2), None)
+        window.put(2, segment(2))
+        self.assertEqual(list(window.sequences()), [2, 3])
+
+    def test_pop_before(self) -> None:
+        window = NetTaskSegmentWindow(1, 8)
+        for sequence in [1, 2, 3, 5, 6]:
+            window.put(sequence, segment(sequence))
+
+        self.assertEqual(window.pop_before(4), 3)
+        self.assertEqual(window.pop_before(4), 0)
+        self.assertEqual(list(window.sequences()), [5, 6])
+        self.assertEqual(window.last_sequence(), 6)
+
+    def test_wrap_around(self) -> None:
+        window = NetTaskSegmentWindow(1, 4)
+        for sequence in range(1, 20):
+            window.put(sequence, segment(sequence))
+            window.pop_before(sequence - 2)
+
+        self.assertEqual(window.capacity(), 4)
+        self.assertEqual(list(window.sequences()), [17, 18, 19])
+
+    def test_grow(self) -> None:
+        window = NetTaskSegmentWindow(1, 4)
+        for sequence in range(1, 11):
+            window.put(sequence, segment(sequence))
+
+        self.assertEqual(window.capacity(), 16)
+        self.assertEqual(list(window.sequences(5)), list(range(5, 11)))
+        self.assertEqual(window.get(7), segment(7))
+
+if __name__ == '__main__':
+    main()
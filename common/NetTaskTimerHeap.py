@@ -0,0 +1,47 @@
+import heapq
+from typing import Optional
+
+class NetTaskTimerHeap:
+    def __init__(self) -> None:
+        self.__heap: list[tuple[float, int]] = []
+        self.__deadlines: dict[int, float] = {}
+
+    def schedule(self, key: int, deadline: float) -> None:
+        # Deadlines that move later are not updated. The timer fires early, and whoever handles it
+        # reschedules with the right deadline. This keeps most updates O(1).
+        current_deadline = self.__deadlines.get(key)
+        if current_deadline is None or deadline < current_deadline:
+            self.__deadlines[key] = deadline
+            heapq.heappush(self.__heap, (deadline, key))
+
+            if len(self.__heap) > 2 * len(self.__deadlines) + 64:
+                self.__compact()
+
+    def cancel(self, key: int) -> None:
+        self.__deadlines.pop(key, None)
+
+    def next_deadline(self) -> Optional[float]:
+        while self.__heap and not self.__is_valid(self.__heap[0]):
+            heapq.heappop(self.__heap)
+
+        return self.__heap[0][0] if self.__heap else None
+
+    def pop_expired(self, current_time: float) -> list[int]:
+        expired = []
+        while self.__heap and self.__heap[0][0] <= current_time:
+            entry = heapq.heappop(self.__heap)
+            if self.__is_valid(entry):
+                del self.__deadlines[entry[1]]
+                expired.append(entry[1])
+
+        return expired
+
+    def __is_valid(self, entry: tuple[float, int]) -> bool:
+        return self.__deadlines.get(entry[1]) == entry[0]
+
+    def __compact(self) -> None:
+        self.__heap = [(deadline, key) for key, deadline in self.__deadlines.items()]
+        heapq.heapify(self.__heap)
+
+    def __len__(self) -> int:
+        return len(self.__deadlines)
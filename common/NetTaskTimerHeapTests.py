@@ -0,0 +1,43 @@
+from unittest import TestCase, main
+
+from .NetTaskTimerHeap import NetTaskTimerHeap
+
+class NetTaskTimerHeapTests(TestCase):
+    def test_expiration_order(self) -> None:
+        timers = NetTaskTimerHeap()
+        timers.schedule(1, 3.0)
+        timers.schedule(2, 1.0)
+        timers.schedule(3, 2.0)
+
+        self.assertEqual(timers.next_deadline(), 1.0)
+        self.assertEqual(timers.pop_expired(2.5), [2, 3])
+        self.assertEqual(timers.next_deadline(), 3.0)
+
+    def test_earlier_reschedule(self) -> None:
+        timers = NetTaskTimerHeap()
+        timers.schedule(1, 3.0)
+        timers.schedule(1, 1.0)
+
+        self.assertEqual(timers.pop_expired(5.0), [1])
+        self.assertEqual(timers.next_deadline(), None)
+
+    def test_later_reschedule(self) -> None:
+        timers = NetTaskTimerHeap()
+        timers.schedule(1, 1.0)
+        timers.schedule(1, 3.0)
+
+        # Fires early, so that the owner can reschedule it
+        self.assertEqual(timers.pop_expired(1.0), [1])
+
+    def test_cancel(self) -> None:
+        timers = NetTaskTimerHeap()
+        timers.schedule(1, 1.0)
+        timers.schedule(2, 2.0)
+        timers.cancel(1)
+
+        self.assertEqual(timers.next_deadline(), 2.0)
+        self.assertEqual(timers.pop_expired(5.0), [2])
+        self.assertEqual(len(timers), 0)
+
+if __name__ == '__main__':
+    main()
@@ -18,10 +18,18 @@ from .structs.NetTaskCloseSegmentBody import NetTaskCloseSegmentBody
 from .structs.NetTaskDataSegmentBody import NetTaskDataSegmentBody
 from .structs.NetTaskKeepAliveSegmentBody import NetTaskKeepAliveSegmentBody
 from .structs.NetTaskWindowSegmentBody import NetTaskWindowSegmentBody
+from .structs.NetTaskSackSegmentBody import NetTaskSackSegmentBody
+from .structs.NetTaskBatchDataSegmentBody import NetTaskBatchDataSegmentBody
+from .structs.NetTaskFragmentSegmentBody import NetTaskFragmentSegmentBody
 from .structs.NetTaskSegment import NetTaskSegment
-from .NetTask import NetTask, NetTaskConnectionException
+from .NetTaskCongestionController import (
+    NetTaskCongestionController, NetTaskAIMDCongestionController, NetTaskNoCongestionController
+)
+from .NetTaskConnection import NetTaskConnectionException
+from .NetTask import NetTask
+from .AsyncNetTask import AsyncNetTask
 
-from .AlertFlow import AlertFlow
+from .AlertFlow import AlertFlow, AlertFlowException, AlertFlowOverflowPolicy
 
 NETTASK_DEFAULT_PORT = 9999
 ALERTFLOW_DEFAULT_PORT = 9999
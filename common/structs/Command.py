@@ -1,12 +1,19 @@
 from abc import ABC, abstractmethod
 from typing import Any, Self, cast
 
-from .Message import SerializationException
+from .Message import SerializationException, TypeRegistry
 
 class CommandException(Exception):
     pass
 
 class Command(ABC):
+    __registry: TypeRegistry['Command'] = TypeRegistry('command')
+    _type_id_bytes: bytes
+
+    def __init_subclass__(cls, type_id: int, **kwargs: Any) -> None:
+        super().__init_subclass__(**kwargs)
+        cls._type_id_bytes = Command.__registry.register(cls, type_id)
+
     @abstractmethod
     def run(self) -> Any:
         pass
@@ -20,14 +27,7 @@ class Command(ABC):
         pass
 
     def serialize(self) -> bytes:
-        for i, command_class in enumerate(Command.__subclasses__()):
-            if isinstance(self, command_class):
-                command_type_bytes = i.to_bytes(1, 'big')
-                command_contents_bytes = self._command_serialize()
-
-                return command_type_bytes + command_contents_bytes
-
-        raise SerializationException('Unknown command type')
+        return self._type_id_bytes + self._command_serialize()
 
     @classmethod
     @abstractmethod
@@ -35,9 +35,5 @@ class Command(ABC):
         if len(data) <= 1:
             raise SerializationException('Incomplete command')
 
-        try:
-            command_type = int.from_bytes(data[:1], 'big')
-            command_class = cast(Self, Command.__subclasses__()[command_type])
-            return command_class.deserialize(data[1:])
-        except IndexError as e:
-            raise SerializationException('Unknown command type') from e
+        command_class = cast(type[Self], Command.__registry.get(data[0]))
+        return command_class.deserialize(data[1:])
@@ -39,5 +39,13 @@ class CommandTests(TestCase):
 
         self.assertEqual(initial_command, final_command)
 
+    def test_type_ids(self) -> None:
+        # Part of the protocol, so they must not change
+        iperf_command = IPerfCommand(['1.1.1.1'], TransportProtocol.TCP, 1.0, 1.0, 1.0, 1.0)
+        self.assertEqual(IPCommand(['lo'], True).serialize()[0], 0)
+        self.assertEqual(iperf_command.serialize()[0], 1)
+        self.assertEqual(PingCommand(['1.1.1.1'], 1, 1.0).serialize()[0], 2)
+        self.assertEqual(SystemMonitorCommand(1.0, 1.0).serialize()[0], 3)
+
 if __name__ == '__main__':
     main()
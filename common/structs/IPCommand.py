@@ -1,4 +1,5 @@
 import re
+import struct
 import subprocess
 from typing import Any, Self
 
@@ -6,7 +7,9 @@ from .Command import Command, CommandException
 from .IPOutput import IPOutput
 from .Message import SerializationException
 
-class IPCommand(Command):
+ALERT_DOWN_STRUCT = struct.Struct('>?')
+
+class IPCommand(Command, type_id=0):
     def __init__(self, targets: list[str], alert_down: bool):
         self.targets = targets
         self.alert_down = alert_down
@@ -48,19 +51,20 @@ class IPCommand(Command):
         return self.alert_down and not command_output.connectivity
 
     def _command_serialize(self) -> bytes:
-        alert_down_bytes = int(self.alert_down).to_bytes(1, 'big')
+        alert_down_bytes = ALERT_DOWN_STRUCT.pack(self.alert_down)
         targets_bytes = b'\0'.join([target.encode('utf-8') for target in self.targets])
 
-        return b''.join([alert_down_bytes, targets_bytes])
+        return alert_down_bytes + targets_bytes
 
     @classmethod
     def deserialize(cls, data: bytes) -> Self:
-        if len(data) <= 1:
+        if len(data) <= ALERT_DOWN_STRUCT.size:
             raise SerializationException('Incomplete IPCommand')
 
         try:
-            alert_down = bool(int.from_bytes(data[:1], 'big'))
-            targets = [target.decode('utf-8') for target in data[1:].split(b'\0')]
+            alert_down, = ALERT_DOWN_STRUCT.unpack_from(data)
+            targets = [target.decode('utf-8')
+                       for target in data[ALERT_DOWN_STRUCT.size:].split(b'\0')]
         except UnicodeDecodeError as e:
             raise SerializationException() from e
 
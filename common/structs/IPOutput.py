@@ -1,8 +1,12 @@
+import struct
 from typing import Any, Self
 
 from .Message import Message, SerializationException
 
-class IPOutput(Message):
+# Transmitted bytes and packets, received bytes and packets, and connectivity
+COUNTERS_STRUCT = struct.Struct('>QQQQ?')
+
+class IPOutput(Message, type_id=0):
     # pylint: disable-next=too-many-arguments disable-next=too-many-positional-arguments
     def __init__(self, interface_name: str, connectivity: bool, tx_bytes: int,
                  tx_packets: int, rx_bytes: int, rx_packets: int):
@@ -15,27 +19,21 @@ class IPOutput(Message):
 
     def _message_serialize(self) -> bytes:
         interface_name_bytes = self.interface_name.encode('utf-8')
-        connectivity_bytes = int(self.connectivity).to_bytes(1, 'big')
-        tx_bytes_bytes = self.tx_bytes.to_bytes(8, 'big')
-        tx_packets_bytes = self.tx_packets.to_bytes(8, 'big')
-        rx_bytes_bytes = self.rx_bytes.to_bytes(8, 'big')
-        rx_packets_bytes = self.rx_packets.to_bytes(8, 'big')
+        counters_bytes = COUNTERS_STRUCT.pack(self.tx_bytes, self.tx_packets,
+                                              self.rx_bytes, self.rx_packets,
+                                              self.connectivity)
 
-        return b''.join([tx_bytes_bytes, tx_packets_bytes, rx_bytes_bytes, rx_packets_bytes,
-                        connectivity_bytes, interface_name_bytes])
+        return counters_bytes + interface_name_bytes
 
     @classmethod
     def deserialize(cls, data: bytes) -> Self:
-        if len(data) <= 33:
+        if len(data) <= COUNTERS_STRUCT.size:
             raise SerializationException('Incomplete IPOutput message')
 
         try:
-            tx_bytes = int.from_bytes(data[:8], 'big')
-            tx_packets = int.from_bytes(data[8:16], 'big')
-            rx_bytes = int.from_bytes(data[16:24], 'big')
-            rx_packets = int.from_bytes(data[24:32], 'big')
-            connectivity = bool(int.from_bytes(data[32:33], 'big'))
-            interface_name = data[33:].decode('utf-8')
+            tx_bytes, tx_packets, rx_bytes, rx_packets, connectivity = \
+                COUNTERS_STRUCT.unpack_from(data)
+            interface_name = data[COUNTERS_STRUCT.size:].decode('utf-8')
         except UnicodeDecodeError as e:
             raise SerializationException() from e
 
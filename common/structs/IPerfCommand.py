@@ -9,11 +9,14 @@ from .Command import Command, CommandException
 from .IPerfOutput import IPerfOutput
 from .Message import SerializationException
 
+# Transport protocol, time, and jitter, loss and bandwidth alert thresholds
+PARAMETERS_STRUCT = struct.Struct('>Bffff')
+
 class TransportProtocol(Enum):
     TCP = 0
     UDP = 1
 
-class IPerfCommand(Command):
+class IPerfCommand(Command, type_id=1):
     # pylint: disable-next=too-many-arguments disable-next=too-many-positional-arguments
     def __init__(self, targets: list[str], transport: TransportProtocol, time: float,
                  jitter_alert: float, loss_alert: float, bandwidth_alert: float):
@@ -74,27 +77,23 @@ class IPerfCommand(Command):
 
     def _command_serialize(self) -> bytes:
         targets_bytes = b'\0'.join([target.encode('utf-8') for target in self.targets])
-        transport_bytes = self.transport.value.to_bytes(1, byteorder='big')
-        time_bytes = struct.pack('>f', self.time)
-        jitter_alert_bytes = struct.pack('>f', self.jitter_alert)
-        loss_alert_bytes = struct.pack('>f', self.loss_alert)
-        bandwidth_alert_bytes = struct.pack('>f', self.bandwidth_alert)
+        parameters_bytes = PARAMETERS_STRUCT.pack(self.transport.value, self.time,
+                                                  self.jitter_alert, self.loss_alert,
+                                                  self.bandwidth_alert)
 
-        return b''.join([transport_bytes, time_bytes, jitter_alert_bytes, loss_alert_bytes,
-                        bandwidth_alert_bytes, targets_bytes])
+        return parameters_bytes + targets_bytes
 
     @classmethod
     def deserialize(cls, data: bytes) -> Self:
-        if len(data) <= 17:
+        if len(data) <= PARAMETERS_STRUCT.size:
             raise SerializationException('Incomplete IPerfCommand command')
 
         try:
-            transport = TransportProtocol(int.from_bytes(data[:1], 'big'))
-            time = struct.unpack('>f', data[1:5])[0]
-            jitter_alert = struct.unpack('>f', data[5:9])[0]
-            loss_alert = struct.unpack('>f', data[9:13])[0]
-            bandwidth_alert = struct.unpack('>f', data[13:17])[0]
-            targets = [target.decode('utf-8') for target in data[17:].split(b'\0')]
+            transport_value, time, jitter_alert, loss_alert, bandwidth_alert = \
+                PARAMETERS_STRUCT.unpack_from(data)
+            transport = TransportProtocol(transport_value)
+            targets = [target.decode('utf-8')
+                       for target in data[PARAMETERS_STRUCT.size:].split(b'\0')]
         except (ValueError, struct.error, UnicodeDecodeError) as e:
             raise SerializationException() from e
 
@@ -3,7 +3,10 @@ from typing import Any, Self
 
 from .Message import Message, SerializationException
 
-class IPerfOutput(Message):
+# Jitter, bandwidth and loss
+MEASUREMENTS_STRUCT = struct.Struct('>fff')
+
+class IPerfOutput(Message, type_id=1):
     def __init__(self, target: str, jitter: float, bandwidth: float, loss: float):
         self.target = target
         self.jitter = jitter
@@ -12,22 +15,18 @@ class IPerfOutput(Message):
 
     def _message_serialize(self) -> bytes:
         target_bytes = self.target.encode('utf-8')
-        jitter_bytes = struct.pack('>f', self.jitter)
-        bandwidth_bytes = struct.pack('>f', self.bandwidth)
-        loss_bytes = struct.pack('>f', self.loss)
+        measurements_bytes = MEASUREMENTS_STRUCT.pack(self.jitter, self.bandwidth, self.loss)
 
-        return b''.join([jitter_bytes, bandwidth_bytes, loss_bytes, target_bytes])
+        return measurements_bytes + target_bytes
 
     @classmethod
     def deserialize(cls, data: bytes) -> Self:
-        if len(data) <= 12:
+        if len(data) <= MEASUREMENTS_STRUCT.size:
             raise SerializationException('Incomplete IPerfOutput message')
 
         try:
-            jitter = struct.unpack('>f', data[:4])[0]
-            bandwidth = struct.unpack('>f', data[4:8])[0]
-            loss = struct.unpack('>f', data[8:12])[0]
-            target = data[12:].decode('utf-8')
+            jitter, bandwidth, loss = MEASUREMENTS_STRUCT.unpack_from(data)
+            target = data[MEASUREMENTS_STRUCT.size:].decode('utf-8')
         except (struct.error, UnicodeDecodeError) as e:
             raise SerializationException() from e
 
@@ -1,23 +1,46 @@
 from abc import ABC, abstractmethod
-from typing import Self, cast
+from typing import Any, Generic, Self, TypeVar, cast
+
+T = TypeVar('T')
 
 class SerializationException(Exception):
     pass
 
+# Classes serialized with a one byte type ID. IDs are declared by each class, as they are part of
+# the protocol, and must never change.
+class TypeRegistry(Generic[T]):
+    def __init__(self, name: str) -> None:
+        self.__name = name
+        self.__types: dict[int, type[T]] = {}
+
+    def register(self, cls: type[T], type_id: int) -> bytes:
+        if type_id in self.__types or not 0 <= type_id <= 0xFF:
+            raise SerializationException(
+                f'Invalid {self.__name} type ID for {cls.__name__}: {type_id}')
+
+        self.__types[type_id] = cls
+        return type_id.to_bytes(1, 'big')
+
+    def get(self, type_id: int) -> type[T]:
+        cls = self.__types.get(type_id)
+        if cls is None:
+            raise SerializationException(f'Unknown {self.__name} type')
+        return cls
+
 class Message(ABC):
+    __registry: TypeRegistry['Message'] = TypeRegistry('message')
+    _type_id_bytes: bytes
+
+    def __init_subclass__(cls, type_id: int, **kwargs: Any) -> None:
+        super().__init_subclass__(**kwargs)
+        cls._type_id_bytes = Message.__registry.register(cls, type_id)
+
     @abstractmethod
     def _message_serialize(self) -> bytes:
         pass
 
     def serialize(self) -> bytes:
-        for i, message_class in enumerate(Message.__subclasses__()):
-            if isinstance(self, message_class):
-                command_type_bytes = i.to_bytes(1, 'big')
-                command_contents_bytes = self._message_serialize()
-
-                return command_type_bytes + command_contents_bytes
-
-        raise SerializationException('Unknown message type')
+        return self._type_id_bytes + self._message_serialize()
 
     @classmethod
     @abstractmethod
@@ -25,9 +48,5 @@ class Message(ABC):
         if len(data) == 0:
             raise SerializationException('Incomplete message')
 
-        try:
-            message_type = int.from_bytes(data[:1], 'big')
-            message_class = cast(type[Self], Message.__subclasses__()[message_type])
-            return message_class.deserialize(data[1:])
-        except IndexError as e:
-            raise SerializationException('Unknown message type') from e
+        message_class = cast(type[Self], Message.__registry.get(data[0]))
+        return message_class.deserialize(data[1:])
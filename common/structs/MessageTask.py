@@ -4,14 +4,16 @@ from typing import Any, Self
 from .Message import Message, SerializationException
 from .Command import Command
 
-class MessageTask(Message):
+FREQUENCY_STRUCT = struct.Struct('>f')
+
+class MessageTask(Message, type_id=4):
     def __init__(self, task_id: str, frequency: float, command: Command):
         self.task_id = task_id
         self.frequency = frequency
         self.command = command
 
     def _message_serialize(self) -> bytes:
-        frequency_bytes = struct.pack('>f', self.frequency)
+        frequency_bytes = FREQUENCY_STRUCT.pack(self.frequency)
         task_id_bytes = self.task_id.encode('utf-8')
         command_bytes = self.command.serialize()
 
@@ -19,13 +21,13 @@ class MessageTask(Message):
 
     @classmethod
     def deserialize(cls, data: bytes) -> Self:
-        if len(data) <= 5:
+        if len(data) <= FREQUENCY_STRUCT.size + 1:
             raise SerializationException('Incomplete MessageTask')
 
         try:
-            frequency = struct.unpack('>f', data[:4])[0]
-            limit = data.index(b'\0', 4)
-            task_id = data[4:limit].decode('utf-8')
+            frequency, = FREQUENCY_STRUCT.unpack_from(data)
+            limit = data.index(b'\0', FREQUENCY_STRUCT.size)
+            task_id = data[FREQUENCY_STRUCT.size:limit].decode('utf-8')
             command = Command.deserialize(data[limit + 1:])
         except (struct.error, ValueError, UnicodeDecodeError) as e:
             raise SerializationException() from e
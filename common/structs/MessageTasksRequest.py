@@ -2,7 +2,7 @@ from typing import Any, Self
 
 from .Message import Message, SerializationException
 
-class MessageTasksRequest(Message):
+class MessageTasksRequest(Message, type_id=5):
     def __init__(self) -> None:
         pass
 
@@ -3,7 +3,7 @@ from unittest import TestCase, main
 from .. import (
     Message, MessageTask, MessageTasksRequest,
     IPOutput, IPerfOutput, PingOutput, SystemMonitorOutput,
-    PingCommand
+    PingCommand, SerializationException
 )
 
 class MessageTests(TestCase):
@@ -53,5 +53,25 @@ class MessageTests(TestCase):
 
         self.assertEqual(initial_message, final_message)
 
+    def test_type_ids(self) -> None:
+        # Part of the protocol, so they must not change
+        self.assertEqual(IPOutput('lo', True, 0, 0, 0, 0).serialize()[0], 0)
+        self.assertEqual(IPerfOutput('1.1.1.1', 0.0, 0.0, 0.0).serialize()[0], 1)
+        self.assertEqual(PingOutput('1.1.1.1', 0.0, 0.0).serialize()[0], 2)
+        self.assertEqual(SystemMonitorOutput(0.0, 0.0).serialize()[0], 3)
+        task = MessageTask('task', 1.0, PingCommand(['1.1.1.1'], 1, 1.0))
+        self.assertEqual(task.serialize()[0], 4)
+        self.assertEqual(MessageTasksRequest().serialize()[0], 5)
+
+    def test_unknown_type(self) -> None:
+        with self.assertRaises(SerializationException):
+            Message.deserialize(b'\xFF')
+
+    def test_duplicate_type_id(self) -> None:
+        with self.assertRaises(SerializationException):
+            # pylint: disable-next=unused-variable
+            class DuplicateMessage(MessageTasksRequest, type_id=5):
+                pass
+
 if __name__ == '__main__':
     main()
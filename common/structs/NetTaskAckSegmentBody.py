@@ -1,21 +1,26 @@
+import struct
 from typing import Any, Self
 
 from .Message import SerializationException
 from .NetTaskSegmentBody import NetTaskSegmentBody
 
-class NetTaskAckSegmentBody(NetTaskSegmentBody):
+ACK_STRUCT = struct.Struct('>I')
+
+class NetTaskAckSegmentBody(NetTaskSegmentBody, type_id=0):
+    __slots__ = ('ack',)
+
     def __init__(self, ack: int):
         self.ack = ack
 
     def _body_serialize(self) -> bytes:
-        return self.ack.to_bytes(4, 'big')
+        return ACK_STRUCT.pack(self.ack)
 
     @classmethod
-    def deserialize(cls, data: bytes) -> Self:
-        if len(data) != 4:
+    def deserialize(cls, data: bytes | memoryview) -> Self:
+        if len(data) != ACK_STRUCT.size:
             raise SerializationException('Invalid NetTaskAckSegmentBody')
 
-        ack = int.from_bytes(data)
+        ack, = ACK_STRUCT.unpack(data)
         return cls(ack)
 
     def __eq__(self, other: Any) -> bool:
@@ -0,0 +1,47 @@
+import struct
+from typing import Any, Self, Sequence
+
+from .Message import SerializationException
+from .NetTaskSegmentBody import NetTaskSegmentBody
+
+LENGTH_STRUCT = struct.Struct('>H')
+
+class NetTaskBatchDataSegmentBody(NetTaskSegmentBody, type_id=6):
+    __slots__ = ('messages',)
+
+    def __init__(self, messages: Sequence[bytes | memoryview]):
+        self.messages = messages
+
+    def _body_serialize(self) -> bytes:
+        return b''.join(LENGTH_STRUCT.pack(len(m)) + m for m in self.messages)
+
+    @classmethod
+    def deserialize(cls, data: bytes | memoryview) -> Self:
+        # Unlike other payloads, batched messages are copied. They are small, and a view of each
+        # one would take more memory than the message itself.
+        messages: list[bytes | memoryview] = []
+        batch = bytes(data)
+
+        i = 0
+        while i < len(batch):
+            if i + LENGTH_STRUCT.size > len(batch):
+                raise SerializationException('Invalid NetTaskBatchDataSegmentBody')
+
+            message_start = i + LENGTH_STRUCT.size
+            message_end = message_start + LENGTH_STRUCT.unpack_from(batch, i)[0]
+            if message_end > len(batch):
+                raise SerializationException('Invalid NetTaskBatchDataSegmentBody')
+
+            messages.append(batch[message_start:message_end])
+            i = message_end
+
+        return cls(messages)
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, NetTaskBatchDataSegmentBody):
+            return self.messages == other.messages
+
+        return False
+
+    def __repr__(self) -> str:
+        return f'NetTaskBatchDataSegmentBody(messages={self.messages!r})'
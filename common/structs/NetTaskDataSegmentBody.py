@@ -2,15 +2,17 @@ from typing import Any, Self
 
 from .NetTaskSegmentBody import NetTaskSegmentBody
 
-class NetTaskDataSegmentBody(NetTaskSegmentBody):
-    def __init__(self, message: bytes):
-        self.message = message
+class NetTaskDataSegmentBody(NetTaskSegmentBody, type_id=2):
+    __slots__ = ('message',)
+
+    def __init__(self, message: bytes | memoryview):
+        self.message = message # A view of the received datagram, until delivered
 
     def _body_serialize(self) -> bytes:
-        return self.message
+        return bytes(self.message)
 
     @classmethod
-    def deserialize(cls, data: bytes) -> Self:
+    def deserialize(cls, data: bytes | memoryview) -> Self:
         return cls(data)
 
     def __eq__(self, other: Any) -> bool:
@@ -0,0 +1,30 @@
+from typing import Any, Self
+
+from .Message import SerializationException
+from .NetTaskSegmentBody import NetTaskSegmentBody
+
+class NetTaskFragmentSegmentBody(NetTaskSegmentBody, type_id=7):
+    __slots__ = ('is_last', 'data')
+
+    def __init__(self, is_last: bool, data: bytes | memoryview):
+        self.is_last = is_last
+        self.data = data # A view of the received datagram, until delivered
+
+    def _body_serialize(self) -> bytes:
+        return self.is_last.to_bytes(1, 'big') + self.data
+
+    @classmethod
+    def deserialize(cls, data: bytes | memoryview) -> Self:
+        if len(data) == 0 or data[0] > 1:
+            raise SerializationException('Invalid NetTaskFragmentSegmentBody')
+
+        return cls(data[0] == 1, data[1:])
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, NetTaskFragmentSegmentBody):
+            return self.is_last == other.is_last and self.data == other.data
+
+        return False
+
+    def __repr__(self) -> str:
+        return f'NetTaskFragmentSegmentBody(is_last={self.is_last}, data={self.data!r})'
@@ -3,7 +3,9 @@ from typing import Any, Self
 from .Message import SerializationException
 from .NetTaskSegmentBody import NetTaskSegmentBody
 
-class NetTaskKeepAliveSegmentBody(NetTaskSegmentBody):
+class NetTaskKeepAliveSegmentBody(NetTaskSegmentBody, type_id=3):
+    __slots__ = ()
+
     def __init__(self) -> None:
         pass
 
@@ -11,7 +13,7 @@ class NetTaskKeepAliveSegmentBody(NetTaskSegmentBody):
         return b''
 
     @classmethod
-    def deserialize(cls, data: bytes) -> Self:
+    def deserialize(cls, data: bytes | memoryview) -> Self:
         if len(data) != 0:
             raise SerializationException('Invalid NetTaskKeepAliveSegmentBody')
         return cls()
@@ -0,0 +1,41 @@
+import struct
+from typing import Any, Self
+
+from .Message import SerializationException
+from .NetTaskSegmentBody import NetTaskSegmentBody
+
+ACK_STRUCT = struct.Struct('>I')
+RANGE_STRUCT = struct.Struct('>II')
+
+class NetTaskSackSegmentBody(NetTaskSegmentBody, type_id=5):
+    __slots__ = ('ack', 'ranges')
+
+    def __init__(self, ack: int, ranges: list[tuple[int, int]]):
+        self.ack = ack
+        self.ranges = ranges # Inclusive ranges of received segments after ack
+
+    def _body_serialize(self) -> bytes:
+        ack_bytes = ACK_STRUCT.pack(self.ack)
+        range_bytes = [RANGE_STRUCT.pack(start, end) for start, end in self.ranges]
+
+        return b''.join([ack_bytes, *range_bytes])
+
+    @classmethod
+    def deserialize(cls, data: bytes | memoryview) -> Self:
+        if len(data) < ACK_STRUCT.size or (len(data) - ACK_STRUCT.size) % RANGE_STRUCT.size != 0:
+            raise SerializationException('Invalid NetTaskSackSegmentBody')
+
+        ack, = ACK_STRUCT.unpack_from(data)
+        ranges: list[tuple[int, int]] = \
+            list(RANGE_STRUCT.iter_unpack(data[ACK_STRUCT.size:]))
+
+        return cls(ack, ranges)
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, NetTaskSackSegmentBody):
+            return self.ack == other.ack and self.ranges == other.ranges
+
+        return False
+
+    def __repr__(self) -> str:
+        return f'NetTaskSackSegmentBody(ack={self.ack}, ranges={self.ranges})'
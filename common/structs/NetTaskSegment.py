@@ -4,44 +4,43 @@ from typing import Any, Self
 from .Message import SerializationException
 from .NetTaskSegmentBody import NetTaskSegmentBody
 
+# Sequence, time and connection ID
+HEADER_STRUCT = struct.Struct('>IdI')
+
 class NetTaskSegment:
-    def __init__(self, sequence: int, time: float, host: str, body: NetTaskSegmentBody):
+    __slots__ = ('sequence', 'time', 'connection_id', 'body')
+
+    def __init__(self, sequence: int, time: float, connection_id: int, body: NetTaskSegmentBody):
         self.sequence = sequence
         self.time = time
-        self.host = host
+        self.connection_id = connection_id
         self.body = body
 
+    @staticmethod
+    def header_size() -> int:
+        return HEADER_STRUCT.size + 1 # Plus body type
+
     def serialize(self) -> bytes:
-        sequence_bytes = self.sequence.to_bytes(4, 'big')
-        time_bytes = struct.pack('>d', self.time)
-        host_bytes = self.host.encode('utf-8') + b'\0'
+        header_bytes = HEADER_STRUCT.pack(self.sequence, self.time, self.connection_id)
         body_bytes = self.body.serialize()
 
-        return b''.join([sequence_bytes, time_bytes, host_bytes, body_bytes])
+        return header_bytes + body_bytes
 
     @classmethod
-    def deserialize(cls, data: bytes) -> Self:
-        if len(data) <= 13:
+    def deserialize(cls, data: bytes | memoryview) -> Self:
+        if len(data) <= HEADER_STRUCT.size:
             raise SerializationException('Incomplete NetTaskSegment')
 
-        try:
-            sequence = int.from_bytes(data[:4], 'big')
-            time = struct.unpack('>d', data[4:12])[0]
-
-            host_end = data.index(b'\0', 12)
-            host = data[12:host_end].decode('utf-8')
-
-            body = NetTaskSegmentBody.deserialize(data[host_end + 1:])
-        except (UnicodeError, ValueError) as e:
-            raise SerializationException() from e
-
-        return cls(sequence, time, host, body)
+        # Bodies are parsed from a view, so that payloads aren't copied
+        sequence, time, connection_id = HEADER_STRUCT.unpack_from(data)
+        body = NetTaskSegmentBody.deserialize(memoryview(data)[HEADER_STRUCT.size:])
+        return cls(sequence, time, connection_id, body)
 
     def __eq__(self, other: Any) -> bool:
         if isinstance(other, NetTaskSegment):
             return \
                 self.sequence == other.sequence and \
-                self.host == other.host and \
+                self.connection_id == other.connection_id and \
                 self.time == other.time and \
                 self.body == other.body
 
@@ -50,6 +49,6 @@ class NetTaskSegment:
     def __repr__(self) -> str:
         return 'NetTaskSegment(' \
             f'sequence={self.sequence}, ' \
-            f'host={self.host}, ' \
+            f'connection_id={self.connection_id}, ' \
             f'time={self.time}, ' \
             f'body={self.body})'
@@ -1,32 +1,30 @@
 from abc import ABC, abstractmethod
-from typing import Self, cast
+from typing import Any, Self, cast
 
-from .Message import SerializationException
+from .Message import SerializationException, TypeRegistry
 
 class NetTaskSegmentBody(ABC):
+    __slots__ = ()
+
+    __registry: TypeRegistry['NetTaskSegmentBody'] = TypeRegistry('segment')
+    _type_id_bytes: bytes
+
+    def __init_subclass__(cls, type_id: int, **kwargs: Any) -> None:
+        super().__init_subclass__(**kwargs)
+        cls._type_id_bytes = NetTaskSegmentBody.__registry.register(cls, type_id)
+
     @abstractmethod
     def _body_serialize(self) -> bytes:
         pass
 
     def serialize(self) -> bytes:
-        for i, command_class in enumerate(NetTaskSegmentBody.__subclasses__()):
-            if isinstance(self, command_class):
-                command_type_bytes = i.to_bytes(1, 'big')
-                command_contents_bytes = self._body_serialize()
-
-                return command_type_bytes + command_contents_bytes
-
-        raise SerializationException('Unknown segment type')
+        return self._type_id_bytes + self._body_serialize()
 
     @classmethod
     @abstractmethod
-    def deserialize(cls, data: bytes) -> Self:
+    def deserialize(cls, data: bytes | memoryview) -> Self:
         if len(data) == 0:
             raise SerializationException('Incomplete segment')
 
-        try:
-            command_type = int.from_bytes(data[:1], 'big')
-            command_class = cast(Self, NetTaskSegmentBody.__subclasses__()[command_type])
-            return command_class.deserialize(data[1:])
-        except IndexError as e:
-            raise SerializationException('Unknown segment type') from e
+        body_class = cast(type[Self], NetTaskSegmentBody.__registry.get(data[0]))
+        return body_class.deserialize(data[1:])
@@ -1,6 +1,9 @@
 from unittest import TestCase, main
 
-from .. import NetTaskSegment, NetTaskDataSegmentBody, NetTaskAckSegmentBody
+from .. import \
+    NetTaskSegment, NetTaskDataSegmentBody, NetTaskAckSegmentBody, NetTaskSackSegmentBody, \
+    NetTaskBatchDataSegmentBody, NetTaskFragmentSegmentBody, NetTaskWindowSegmentBody, \
+    NetTaskCloseSegmentBody, NetTaskKeepAliveSegmentBody
 
 class NetTaskSegmentTests(TestCase):
     # NOTE:
@@ -8,18 +11,61 @@ class NetTaskSegmentTests(TestCase):
     # comparisons don't fail due to lack of precision in encoding.
 
     def test_data(self) -> None:
-        initial_segment = NetTaskSegment(1, 1.0, 'host', NetTaskDataSegmentBody(b'1234'))
+        initial_segment = NetTaskSegment(1, 1.0, 0xDEADBEEF, NetTaskDataSegmentBody(b'1234'))
         segment_bytes = initial_segment.serialize()
         final_segment = NetTaskSegment.deserialize(segment_bytes)
 
         self.assertEqual(initial_segment, final_segment)
 
     def test_ack(self) -> None:
-        initial_segment = NetTaskSegment(100, 1.5, 'localhost', NetTaskAckSegmentBody(420))
+        initial_segment = NetTaskSegment(100, 1.5, 1, NetTaskAckSegmentBody(420))
         segment_bytes = initial_segment.serialize()
         final_segment = NetTaskSegment.deserialize(segment_bytes)
 
         self.assertEqual(initial_segment, final_segment)
 
+    def test_sack(self) -> None:
+        body = NetTaskSackSegmentBody(7, [(9, 10), (12, 12)])
+        initial_segment = NetTaskSegment(0, 2.5, 2, body)
+        segment_bytes = initial_segment.serialize()
+        final_segment = NetTaskSegment.deserialize(segment_bytes)
+
+        self.assertEqual(initial_segment, final_segment)
+
+    def test_batch_data(self) -> None:
+        body = NetTaskBatchDataSegmentBody([b'1234', b'', b'56'])
+        initial_segment = NetTaskSegment(3, 3.5, 3, body)
+        segment_bytes = initial_segment.serialize()
+        final_segment = NetTaskSegment.deserialize(segment_bytes)
+
+        self.assertEqual(initial_segment, final_segment)
+
+    def test_fragment(self) -> None:
+        body = NetTaskFragmentSegmentBody(True, b'7890')
+        initial_segment = NetTaskSegment(4, 4.5, 4, body)
+        segment_bytes = initial_segment.serialize()
+        final_segment = NetTaskSegment.deserialize(segment_bytes)
+
+        self.assertEqual(initial_segment, final_segment)
+
+    def test_window(self) -> None:
+        body = NetTaskWindowSegmentBody(33, 'agent')
+        initial_segment = NetTaskSegment(1, 5.5, 5, body)
+        segment_bytes = initial_segment.serialize()
+        final_segment = NetTaskSegment.deserialize(segment_bytes)
+
+        self.assertEqual(initial_segment, final_segment)
+
+    def test_type_ids(self) -> None:
+        # Part of the protocol, so they must not change
+        self.assertEqual(NetTaskAckSegmentBody(1).serialize()[0], 0)
+        self.assertEqual(NetTaskCloseSegmentBody().serialize()[0], 1)
+        self.assertEqual(NetTaskDataSegmentBody(b'1').serialize()[0], 2)
+        self.assertEqual(NetTaskKeepAliveSegmentBody().serialize()[0], 3)
+        self.assertEqual(NetTaskWindowSegmentBody(1).serialize()[0], 4)
+        self.assertEqual(NetTaskSackSegmentBody(1, []).serialize()[0], 5)
+        self.assertEqual(NetTaskBatchDataSegmentBody([b'1']).serialize()[0], 6)
+        self.assertEqual(NetTaskFragmentSegmentBody(True, b'1').serialize()[0], 7)
+
 if __name__ == '__main__':
     main()
@@ -1,28 +1,39 @@
+import struct
 from typing import Any, Self
 
 from .Message import SerializationException
 from .NetTaskSegmentBody import NetTaskSegmentBody
 
-class NetTaskWindowSegmentBody(NetTaskSegmentBody):
-    def __init__(self, max_sequence: int):
+MAX_SEQUENCE_STRUCT = struct.Struct('>I')
+
+class NetTaskWindowSegmentBody(NetTaskSegmentBody, type_id=4):
+    __slots__ = ('max_sequence', 'host')
+
+    def __init__(self, max_sequence: int, host: str = ''):
         self.max_sequence = max_sequence
+        self.host = host # Only sent during the connection handshake
 
     def _body_serialize(self) -> bytes:
-        return self.max_sequence.to_bytes(4, 'big')
+        return MAX_SEQUENCE_STRUCT.pack(self.max_sequence) + self.host.encode('utf-8')
 
     @classmethod
-    def deserialize(cls, data: bytes) -> Self:
-        if len(data) != 4:
+    def deserialize(cls, data: bytes | memoryview) -> Self:
+        if len(data) < MAX_SEQUENCE_STRUCT.size:
             raise SerializationException('Invalid NetTaskWindowSegmentBody')
 
-        max_sequence = int.from_bytes(data)
-        return cls(max_sequence)
+        try:
+            max_sequence, = MAX_SEQUENCE_STRUCT.unpack_from(data)
+            host = str(data[MAX_SEQUENCE_STRUCT.size:], 'utf-8')
+        except UnicodeError as e:
+            raise SerializationException() from e
+
+        return cls(max_sequence, host)
 
     def __eq__(self, other: Any) -> bool:
         if isinstance(other, NetTaskWindowSegmentBody):
-            return self.max_sequence == other.max_sequence
+            return self.max_sequence == other.max_sequence and self.host == other.host
 
         return False
 
     def __repr__(self) -> str:
-        return f'NetTaskWindowSegmentBody(max_sequence={self.max_sequence})'
+        return f'NetTaskWindowSegmentBody(max_sequence={self.max_sequence}, host={self.host})'
@@ -10,7 +10,10 @@ from .PingOutput import PingOutput
 
 PING_MAXIMUM_TIME = 5 # seconds per ping
 
-class PingCommand(Command):
+# Count and RTT alert threshold
+PARAMETERS_STRUCT = struct.Struct('>Hf')
+
+class PingCommand(Command, type_id=2):
     def __init__(self, targets: list[str], count: int, rtt_alert: float):
         self.targets = targets
         self.count = count
@@ -50,21 +53,20 @@ class PingCommand(Command):
         return command_output.avg_latency >= self.rtt_alert
 
     def _command_serialize(self) -> bytes:
-        count_bytes = self.count.to_bytes(2, 'big')
-        rtt_alert_bytes = struct.pack('>f', self.rtt_alert)
+        parameters_bytes = PARAMETERS_STRUCT.pack(self.count, self.rtt_alert)
         targets_bytes = b'\0'.join([target.encode('utf-8') for target in self.targets])
 
-        return b''.join([count_bytes, rtt_alert_bytes, targets_bytes])
+        return parameters_bytes + targets_bytes
 
     @classmethod
     def deserialize(cls, data: bytes) -> Self:
-        if len(data) <= 6:
+        if len(data) <= PARAMETERS_STRUCT.size:
             raise SerializationException('Incomplete PingCommand')
 
         try:
-            count = int.from_bytes(data[:2], 'big')
-            rtt_alert = struct.unpack('>f', data[2:6])[0]
-            targets = [target.decode('utf-8') for target in data[6:].split(b'\0')]
+            count, rtt_alert = PARAMETERS_STRUCT.unpack_from(data)
+            targets = [target.decode('utf-8')
+                       for target in data[PARAMETERS_STRUCT.size:].split(b'\0')]
         except (struct.error, UnicodeDecodeError) as e:
             raise SerializationException() from e
 
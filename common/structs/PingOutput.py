@@ -3,28 +3,29 @@ from typing import Any, Self
 
 from .Message import Message, SerializationException
 
-class PingOutput(Message):
+# Average and standard deviation of the latency
+LATENCY_STRUCT = struct.Struct('>ff')
+
+class PingOutput(Message, type_id=2):
     def __init__(self, target: str, avg_latency: float, stdev_latency: float):
         self.target = target
         self.avg_latency = avg_latency
         self.stdev_latency = stdev_latency
 
     def _message_serialize(self) -> bytes:
-        avg_latency_bytes = struct.pack('>f', self.avg_latency)
-        stdev_latency_bytes = struct.pack('>f', self.stdev_latency)
+        latency_bytes = LATENCY_STRUCT.pack(self.avg_latency, self.stdev_latency)
         target_bytes = self.target.encode('utf-8')
 
-        return b''.join([avg_latency_bytes, stdev_latency_bytes, target_bytes])
+        return latency_bytes + target_bytes
 
     @classmethod
     def deserialize(cls, data: bytes) -> Self:
-        if len(data) <= 8:
+        if len(data) <= LATENCY_STRUCT.size:
             raise SerializationException('Incomplete PingOutput message')
 
         try:
-            avg_latency = struct.unpack('>f', data[:4])[0]
-            stdev_latency = struct.unpack('>f', data[4:8])[0]
-            target = data[8:].decode('utf-8')
+            avg_latency, stdev_latency = LATENCY_STRUCT.unpack_from(data)
+            target = data[LATENCY_STRUCT.size:].decode('utf-8')
         except (struct.error, UnicodeDecodeError) as e:
             raise SerializationException() from e
 
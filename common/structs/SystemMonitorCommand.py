@@ -10,7 +10,10 @@ from .SystemMonitorOutput import SystemMonitorOutput
 
 CPU_MEASUREMENT_TIME = 1 # seconds
 
-class SystemMonitorCommand(Command):
+# CPU and memory usage alert thresholds
+ALERTS_STRUCT = struct.Struct('>ff')
+
+class SystemMonitorCommand(Command, type_id=3):
     def __init__(self, cpu_alert: float, memory_alert: float):
         self.cpu_alert = cpu_alert
         self.memory_alert = memory_alert
@@ -80,19 +83,15 @@ class SystemMonitorCommand(Command):
         return command_output.cpu >= self.cpu_alert or command_output.memory >= self.memory_alert
 
     def _command_serialize(self) -> bytes:
-        cpu_alert_bytes = struct.pack('>f', self.cpu_alert)
-        memory_alert_bytes = struct.pack('>f', self.memory_alert)
-
-        return b''.join([cpu_alert_bytes, memory_alert_bytes])
+        return ALERTS_STRUCT.pack(self.cpu_alert, self.memory_alert)
 
     @classmethod
     def deserialize(cls, data: bytes) -> Self:
-        if len(data) != 8:
+        if len(data) != ALERTS_STRUCT.size:
             raise SerializationException('Incorrect SystemMonitorCommand length')
 
         try:
-            cpu_alert = struct.unpack('>f', data[:4])[0]
-            memory_alert = struct.unpack('>f', data[4:8])[0]
+            cpu_alert, memory_alert = ALERTS_STRUCT.unpack(data)
         except struct.error as e:
             raise SerializationException() from e
 
@@ -3,25 +3,24 @@ from typing import Any, Self
 
 from .Message import Message, SerializationException
 
-class SystemMonitorOutput(Message):
+# CPU and memory usage
+USAGE_STRUCT = struct.Struct('>ff')
+
+class SystemMonitorOutput(Message, type_id=3):
     def __init__(self, cpu: float, memory: float):
         self.cpu = cpu
         self.memory = memory
 
     def _message_serialize(self) -> bytes:
-        cpu_bytes = struct.pack('>f', self.cpu)
-        memory_bytes = struct.pack('>f', self.memory)
-
-        return b''.join([cpu_bytes, memory_bytes])
+        return USAGE_STRUCT.pack(self.cpu, self.memory)
 
     @classmethod
     def deserialize(cls, data: bytes) -> Self:
-        if len(data) != 8:
+        if len(data) != USAGE_STRUCT.size:
             raise SerializationException('Incorrect SystemMonitorOutput message length')
 
         try:
-            cpu = struct.unpack('>f', data[:4])[0]
-            memory = struct.unpack('>f', data[4:8])[0]
+            cpu, memory = USAGE_STRUCT.unpack(data)
         except struct.error as e:
             raise SerializationException() from e
 
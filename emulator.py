@@ -0,0 +1,240 @@
+import heapq
+import random
+import socket
+import time
+from collections import deque
+from itertools import count
+from threading import Condition, Thread
+from typing import Callable, Optional
+
+# Local proxies that emulate the links of the CORE topologies, for benchmarking purposes. They're
+# plain sockets and threads, so they run on a single machine with no special privileges.
+
+TCP_LOSS_PENALTY = 0.2 # seconds (Linux's minimum retransmission timeout)
+TCP_SEGMENT_SIZE = 1448 # bytes (the MSS on Ethernet), so that losses hit single segments
+
+class LinkConditions:
+    # pylint: disable-next=too-many-arguments,too-many-positional-arguments
+    def __init__(self,
+                 loss: float = 0.0, # probability
+                 delay: float = 0.0, # seconds, one way
+                 jitter: float = 0.0, # seconds, added to or subtracted from the delay
+                 reorder: float = 0.0, # probability of skipping the delay
+                 duplicate: float = 0.0, # probability
+                 rate: Optional[float] = None, # bytes per second
+                 queue_size: int = 16): # datagrams (or chunks) waiting for the link
+
+        # Changes apply to datagrams sent afterwards
+        self.loss = loss
+        self.delay = delay
+        self.jitter = jitter
+        self.reorder = reorder
+        self.duplicate = duplicate
+        self.rate = rate
+        self.queue_size = queue_size
+
+# One direction of a link. Unordered links (UDP) lose, reorder and duplicate datagrams, and drop
+# them when the queue is full. Ordered links (TCP) keep the byte stream intact: a loss stalls it
+# for a retransmission timeout, and a full queue blocks the sender.
+# pylint: disable-next=too-many-instance-attributes
+class EmulatedLink:
+    def __init__(self,
+                 conditions: LinkConditions,
+                 deliver: Callable[[bytes], None],
+                 ordered: bool = False):
+
+        self.lost = 0
+        self.dropped = 0 # Due to a full queue
+        self.duplicated = 0
+
+        self.__conditions = conditions
+        self.__deliver = deliver
+        self.__ordered = ordered
+
+        self.__condition = Condition()
+        self.__arrivals: list[tuple[float, int, bytes]] = [] # Heap, ties kept in sending order
+        self.__sequence = count()
+        self.__transmissions: deque[float] = deque() # When each queued datagram leaves the queue
+        self.__last_arrival = 0.0
+
+        thread = Thread(target=self.__deliver_loop)
+        thread.daemon = True
+        thread.start()
+
+    def __departure_time(self, length: int, current_time: float) -> Optional[float]:
+        rate = self.__conditions.rate
+        if rate is None:
+            return current_time
+
+        while True:
+            while self.__transmissions and self.__transmissions[0] <= current_time:
+                self.__transmissions.popleft()
+
+            # One datagram is on the wire, the others are waiting behind it
+            if len(self.__transmissions) <= self.__conditions.queue_size:
+                break
+            if not self.__ordered:
+                self.dropped += 1
+                return None
+
+            self.__condition.wait(self.__transmissions[0] - current_time)
+            current_time = time.time()
+
+        start = self.__transmissions[-1] if self.__transmissions else current_time
+        self.__transmissions.append(max(start, current_time) + length / rate)
+        return self.__transmissions[-1]
+
+    def __arrival_time(self, departure: float) -> float:
+        conditions = self.__conditions
+        if not self.__ordered and random.random() < conditions.reorder:
+            return departure # Overtakes whatever is being delayed
+
+        jitter = random.uniform(-conditions.jitter, conditions.jitter)
+        return departure + max(conditions.delay + jitter, 0.0)
+
+    def __push(self, arrival: float, data: bytes) -> None:
+        heapq.heappush(self.__arrivals, (arrival, next(self.__sequence), data))
+
+    def send(self, data: bytes) -> None:
+        # An empty chunk closes an ordered link, after everything before it is delivered
+        with self.__condition:
+            is_lost = random.random() < self.__conditions.loss
+            if is_lost and not self.__ordered:
+                self.lost += 1
+                return
+
+            departure = self.__departure_time(len(data), time.time())
+            if departure is None:
+                return
+
+            arrival = self.__arrival_time(departure)
+            if self.__ordered:
+                if is_lost:
+                    self.lost += 1
+                    arrival += TCP_LOSS_PENALTY
+
+                arrival = max(arrival, self.__last_arrival)
+                self.__last_arrival = arrival
+            elif random.random() < self.__conditions.duplicate:
+                self.duplicated += 1
+                self.__push(self.__arrival_time(departure), data)
+
+            self.__push(arrival, data)
+            self.__condition.notify_all()
+
+    def __deliver_loop(self) -> None:
+        while True:
+            with self.__condition:
+                while not self.__arrivals or self.__arrivals[0][0] > time.time():
+                    timeout = self.__arrivals[0][0] - time.time() if self.__arrivals else None
+                    self.__condition.wait(timeout)
+
+                data = heapq.heappop(self.__arrivals)[2]
+
+            self.__deliver(data)
+
+# UDP proxy between a single client and a server
+class UDPEmulator:
+    def __init__(self,
+                 listen_port: int,
+                 target_addr_port: tuple[str, int],
+                 conditions: Optional[LinkConditions] = None):
+
+        self.conditions = conditions or LinkConditions() # Shared by both directions
+
+        self.__client_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.__client_socket.bind(('127.0.0.1', listen_port))
+        self.__server_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.__server_socket.bind(('0.0.0.0', 0))
+        self.__target_addr_port = target_addr_port
+        self.__client_addr_port: Optional[tuple[str, int]] = None
+
+        self.__upstream = EmulatedLink(self.conditions, self.__send_to_server)
+        self.__downstream = EmulatedLink(self.conditions, self.__send_to_client)
+
+        for target in [self.__client_to_server_loop, self.__server_to_client_loop]:
+            thread = Thread(target=target)
+            thread.daemon = True
+            thread.start()
+
+    def links(self) -> tuple[EmulatedLink, EmulatedLink]:
+        return self.__upstream, self.__downstream
+
+    def __send_to_server(self, datagram: bytes) -> None:
+        self.__server_socket.sendto(datagram, self.__target_addr_port)
+
+    def __send_to_client(self, datagram: bytes) -> None:
+        if self.__client_addr_port is not None:
+            self.__client_socket.sendto(datagram, self.__client_addr_port)
+
+    def __client_to_server_loop(self) -> None:
+        while True:
+            datagram, self.__client_addr_port = self.__client_socket.recvfrom(1 << 16)
+            self.__upstream.send(datagram)
+
+    def __server_to_client_loop(self) -> None:
+        while True:
+            self.__downstream.send(self.__server_socket.recv(1 << 16))
+
+# TCP proxy, with a pair of ordered links for every accepted connection
+class TCPEmulator:
+    def __init__(self,
+                 listen_port: int,
+                 target_addr_port: tuple[str, int],
+                 conditions: Optional[LinkConditions] = None):
+
+        self.conditions = conditions or LinkConditions()
+
+        self.__listen_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.__listen_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.__listen_socket.bind(('127.0.0.1', listen_port))
+        self.__listen_socket.listen()
+        self.__target_addr_port = target_addr_port
+        self.__links: list[EmulatedLink] = []
+
+        thread = Thread(target=self.__accept_loop)
+        thread.daemon = True
+        thread.start()
+
+    def links(self) -> list[EmulatedLink]:
+        return self.__links
+
+    @staticmethod
+    def __forward(source: socket.socket, link: EmulatedLink) -> None:
+        try:
+            while data := source.recv(1 << 16):
+                for i in range(0, len(data), TCP_SEGMENT_SIZE):
+                    link.send(data[i:i + TCP_SEGMENT_SIZE])
+        except OSError:
+            pass
+
+        link.send(b'')
+
+    @staticmethod
+    def __deliver(destination: socket.socket) -> Callable[[bytes], None]:
+        def deliver(data: bytes) -> None:
+            try:
+                if data:
+                    destination.sendall(data)
+                else:
+                    destination.shutdown(socket.SHUT_WR)
+            except OSError:
+                pass
+
+        return deliver
+
+    def __accept_loop(self) -> None:
+        while True:
+            client_socket, _ = self.__listen_socket.accept()
+            server_socket = socket.create_connection(self.__target_addr_port)
+            for sock in [client_socket, server_socket]:
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+            upstream = EmulatedLink(self.conditions, self.__deliver(server_socket), True)
+            downstream = EmulatedLink(self.conditions, self.__deliver(client_socket), True)
+            self.__links += [upstream, downstream]
+
+            for source, link in [(client_socket, upstream), (server_socket, downstream)]:
+                thread = Thread(target=self.__forward, args=(source, link))
+                thread.daemon = True
+                thread.start()
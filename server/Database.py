@@ -55,7 +55,11 @@ class Database:
         finally:
             self.__connection.commit()
 
-    def register_task(self, agent: str, is_alert: bool, task_output: Message) -> None:
+    def __register_task_sql(self,
+                            agent: str,
+                            is_alert: bool,
+                            task_output: Message) -> tuple[str, tuple[Any, ...]]:
+
         if type(task_output) not in [IPOutput, IPerfOutput, PingOutput, SystemMonitorOutput]:
             raise DatabaseException('Invalid message to register')
 
@@ -76,7 +80,29 @@ class Database:
         interrogations = ', '.join(['?'] * len(columns))
         values = list(columns.values())
         sql = f'INSERT INTO command_output ({names}) VALUES ({interrogations});'
-        self.__execute_sql(sql, tuple(values))
+        return sql, tuple(values)
+
+    def register_task(self, agent: str, is_alert: bool, task_output: Message) -> None:
+        self.__execute_sql(*self.__register_task_sql(agent, is_alert, task_output))
+
+    def register_tasks(self, tasks: list[tuple[str, bool, Message]]) -> None:
+        # Committing once for many tasks is much faster than committing each one. Tasks that fail
+        # don't stop the others from being registered.
+        failures = 0
+        cursor = self.__connection.cursor()
+        for agent, is_alert, task_output in tasks:
+            try:
+                cursor.execute(*self.__register_task_sql(agent, is_alert, task_output))
+            except (sqlite3.Error, DatabaseException):
+                failures += 1
+
+        try:
+            self.__connection.commit()
+        except sqlite3.Error as e:
+            raise DatabaseException() from e
+
+        if failures > 0:
+            raise DatabaseException(f'Failed to register {failures} of {len(tasks)} tasks')
 
     def get_agent_names(self) -> list[str]:
         return [row[0] for row in self.__execute_sql(
@@ -1,8 +1,8 @@
 from typing import Any
 from unittest import TestCase, main
 
-from common import IPOutput, IPerfOutput, PingOutput, SystemMonitorOutput
-from .Database import Database
+from common import IPOutput, IPerfOutput, PingOutput, SystemMonitorOutput, MessageTasksRequest
+from .Database import Database, DatabaseException
 
 class DatabaseTests(TestCase):
     # NOTE:
@@ -82,5 +82,16 @@ class DatabaseTests(TestCase):
         tasks = self.database.get_tasks(True, ('agent1', 'agent1'), (100, 0))
         self.assertTrue('connectivity' in tasks[0])
 
+    def test_register_tasks(self) -> None:
+        database = Database(':memory:')
+        with self.assertRaises(DatabaseException):
+            database.register_tasks([
+                ('agent1', False, PingOutput('1.1.1.1', 15.0, 1.0)),
+                ('agent1', False, MessageTasksRequest()),
+                ('agent2', False, SystemMonitorOutput(1.0, 0.5))
+            ])
+
+        self.assertEqual(database.get_agent_names(), ['agent1', 'agent2'])
+
 if __name__ == '__main__':
     main()
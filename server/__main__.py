@@ -1,7 +1,10 @@
 import sys
 
+from multiprocessing import Process, Queue
+from multiprocessing.connection import wait
+from queue import Empty
 from threading import Thread
-from typing import Any
+from typing import Any, Callable, Optional
 
 from common import (
     AlertFlow, NetTask,
@@ -27,39 +30,106 @@ class ServerAlertFlowHandler(AlertFlow):
         except DatabaseException as e:
             print(f'Ignoring DatabaseException: {e}', file=sys.stderr)
 
+# Results are sent from the NetTask workers to the process that writes to the database in batches
+Results = list[tuple[str, bool, Message]]
+INGESTION_BATCH_SIZE = 1024 # results
+
 def handle_nettask_message(tasks: dict[str, list[MessageTask]],
-                           database: Database,
                            nettask: NetTask,
                            message_bytes: bytes,
-                           agent: str) -> None:
+                           agent: str) -> Optional[Message]:
     try:
         message = Message.deserialize(message_bytes)
 
         if isinstance(message, MessageTasksRequest):
             if agent in tasks:
-                for task in tasks[agent]:
-                    nettask.send(task.serialize(), agent)
+                nettask.send_many([task.serialize() for task in tasks[agent]], agent)
                 print(f'Sent tasks to {agent}')
             else:
                 print(f'Ignoring MessageTasksRequest from unknown agent {agent}',
                       file=sys.stderr)
                 nettask.close(agent)
         else:
-            database.register_task(agent, False, message)
+            return message
     except SerializationException as e:
         print(f'Ignoring SerializationException: {e}', file=sys.stderr)
+
+    return None
+
+def nettask_loop(tasks: dict[str, list[MessageTask]],
+                 nettask: NetTask,
+                 on_results: Callable[[Results], None]) -> None:
+
+    while True:
+        messages, agent = nettask.receive()
+
+        results: Results = []
+        for message_bytes in messages:
+            message = handle_nettask_message(tasks, nettask, message_bytes, agent)
+            if message is not None:
+                results.append((agent, False, message))
+
+        if results:
+            on_results(results)
+
+def nettask_worker(tasks: dict[str, list[MessageTask]], results_queue: 'Queue[Results]') -> None:
+    # The kernel always delivers datagrams from the same agent to the same worker
+    nettask = NetTask('server', NETTASK_DEFAULT_PORT, reuse_port=True)
+    nettask_loop(tasks, nettask, results_queue.put)
+
+def register_results(database: Database, results: Results) -> None:
+    try:
+        database.register_tasks(results)
     except DatabaseException as e:
         print(f'Ignoring DatabaseException: {e}', file=sys.stderr)
 
+def ingestion_loop(database: Database, results_queue: 'Queue[Results]') -> None:
+    while True:
+        results = results_queue.get()
+        try:
+            while len(results) < INGESTION_BATCH_SIZE:
+                results += results_queue.get_nowait()
+        except Empty:
+            pass
+
+        register_results(database, results)
+
+def monitor_workers(workers: list[Process]) -> None:
+    # Returns once any worker dies, as the agents it served would be left without a server
+    dead_sentinels = wait([worker.sentinel for worker in workers])
+    for worker in workers:
+        if worker.sentinel in dead_sentinels:
+            worker.join() # The sentinel may be ready slightly before the exit code
+            print(f'NetTask worker {worker.pid} died with exit code {worker.exitcode}',
+                  file=sys.stderr)
+
+def stop_workers(workers: list[Process]) -> None:
+    for worker in workers:
+        worker.terminate()
+    for worker in workers:
+        worker.join()
+
 def main(argv: list[str]) -> None:
-    if len(argv) != 3:
-        print('Usage: python -m server <tasks_file> <database_file>')
+    if len(argv) not in [3, 4]:
+        print('Usage: python -m server <tasks_file> <database_file> [nettask_workers]')
         sys.exit(1)
 
     tasks_file = argv[1]
     database_file = argv[2]
+    workers = int(argv[3]) if len(argv) == 4 else 1
 
     tasks = TasksParser.parse_json(tasks_file)
+
+    # Workers are forked before any other threads are started
+    results_queue: 'Queue[Results]' = Queue()
+    worker_processes = []
+    if workers > 1:
+        for _ in range(workers):
+            worker = Process(target=nettask_worker, args=(tasks, results_queue))
+            worker.daemon = True
+            worker.start()
+            worker_processes.append(worker)
+
     database = Database(database_file)
 
     http_backend = HTTPBackend(database)
@@ -67,17 +137,27 @@ def main(argv: list[str]) -> None:
     http_thread.daemon = True
     http_thread.start()
 
-    nettask = NetTask('server', NETTASK_DEFAULT_PORT)
     alertflow = ServerAlertFlowHandler('server', ALERTFLOW_DEFAULT_PORT, database=database)
     alertflow_thread = Thread(target = alertflow.connection_acceptance_loop)
     alertflow_thread.daemon = True
     alertflow_thread.start()
 
     print('Waiting for agent requests')
-    while True:
-        messages, agent = nettask.receive()
-        for message in messages:
-            handle_nettask_message(tasks, database, nettask, message, agent)
+    if workers > 1:
+        ingestion_thread = Thread(target=ingestion_loop, args=(database, results_queue))
+        ingestion_thread.daemon = True
+        ingestion_thread.start()
+
+        try:
+            monitor_workers(worker_processes)
+        finally:
+            stop_workers(worker_processes)
+
+        print('Stopping the server after losing a NetTask worker', file=sys.stderr)
+        sys.exit(1)
+    else:
+        nettask = NetTask('server', NETTASK_DEFAULT_PORT)
+        nettask_loop(tasks, nettask, lambda results: register_results(database, results))
 
 if __name__ == '__main__':
     main(sys.argv)
@@ -1,27 +1,232 @@
 #!/usr/bin/env python3
 
+import asyncio
+import random
+import resource
+import struct
 import time
+import timeit
 import sys
+import tracemalloc
+from multiprocessing import Process, Queue
+from threading import Event, Thread, active_count
+from typing import Callable, Optional
 
-from common import AlertFlow, NetTask, ALERTFLOW_DEFAULT_PORT, NETTASK_DEFAULT_PORT
+from common import (
+    AlertFlow, AlertFlowOverflowPolicy, AsyncNetTask, NetTask,
+    ALERTFLOW_DEFAULT_PORT, NETTASK_DEFAULT_PORT,
+    Command, Message, MessageTask, IPOutput, PingOutput, PingCommand, SystemMonitorCommand,
+    NetTaskCongestionController, NetTaskAIMDCongestionController, NetTaskNoCongestionController,
+    NetTaskSegment, NetTaskKeepAliveSegmentBody, NetTaskWindowSegmentBody,
+    NetTaskSegmentBody, NetTaskDataSegmentBody, NetTaskBatchDataSegmentBody,
+    NetTaskFragmentSegmentBody, NetTaskAckSegmentBody, NetTaskSackSegmentBody
+)
+from common.NetTaskConnection import NetTaskConnection
+from common.NetTaskTimerHeap import NetTaskTimerHeap
+from emulator import LinkConditions, TCPEmulator, UDPEmulator
 
 MESSAGE_COUNT=10000 # 10 MiB
 
+ALERT_MESSAGE_SIZE = 1000 # bytes
+ALERT_PACED_COUNT = 1000
+ALERT_PACED_INTERVAL = 0.001 # seconds
+
+LOSSY_MESSAGE_COUNT = 1000 # 1 MiB
+LOSS_RATES = [0.05, 0.1, 0.2]
+LOSSY_BASE_PORT = 20000
+
+TIMER_CONNECTION_COUNT = 10000
+TIMER_PACKET_COUNT = 10000
+
+AGENT_COUNT = 200
+AGENT_MESSAGE_COUNT = 50
+AGENTS_PORT = 21000
+
+SHARDED_WORKER_COUNTS = [1, 2, 4]
+SHARDED_AGENT_COUNT = 16
+SHARDED_MESSAGE_COUNT = 2000
+SHARDED_BASE_PORT = 22000
+
+LATENCY_MESSAGE_COUNT = 5000
+LATENCY_MESSAGE_INTERVAL = 0.002 # seconds
+LATENCY_LOSS = 0.05
+LATENCY_BASE_PORT = 23000
+
+ALLOCATION_SEGMENT_COUNT = 10000
+
+IDLE_CONNECTION_COUNT = 10000
+
+PACING_MESSAGE_COUNT = 1000 # 1 MiB
+PACING_LINK_RATE = 2 ** 20 # bytes per second
+PACING_QUEUE_SIZE = 8 # datagrams
+PACING_BASE_PORT = 24000
+
+EMULATED_MESSAGE_COUNT = 500
+EMULATED_MESSAGE_SIZE = 1000 # bytes
+EMULATED_MTU = 1500 # bytes, like in the CORE topologies
+EMULATED_BASE_PORT = 26000
+EMULATED_LINKS = {
+    'clean': LinkConditions(),
+    'lossy': LinkConditions(loss=0.05, delay=0.005),
+    'WAN': LinkConditions(loss=0.01, delay=0.025, jitter=0.005, reorder=0.01, duplicate=0.01,
+                          rate=2 ** 20, queue_size=32)
+}
+
+ALERT_CONNECTION_COUNT = 5000
+ALERT_CONNECTION_MESSAGES = 10 # alerts per connection
+ALERT_CONNECTIONS_PORT = 27000
+
+RECONNECTION_PORT = 28000
+RECONNECTION_ALERT_INTERVAL = 0.001 # seconds
+RECONNECTION_PHASE_TIME = 1.0 # seconds, before, during and after the outage
+RECONNECTION_OUTBOX_SIZE = 500 # alerts
+
+CODEC_OPERATION_COUNT = 100000
+CODEC_REPEAT_COUNT = 5
+
 def alertflow_client() -> None:
+    # A burst, for throughput, followed by spaced out alerts, for latency without queueing
     start = time.time()
 
-    alertflow = AlertFlow('client')
+    # Large enough for the whole burst, so that no alert is dropped
+    alertflow = AlertFlow('client', outbox_size=MESSAGE_COUNT + ALERT_PACED_COUNT)
     alertflow.connect('localhost', ALERTFLOW_DEFAULT_PORT)
     for _ in range(MESSAGE_COUNT):
-        alertflow.send(b':)' * 500)
+        alertflow.send(timestamped_message(ALERT_MESSAGE_SIZE))
+    for _ in range(ALERT_PACED_COUNT):
+        alertflow.send(timestamped_message(ALERT_MESSAGE_SIZE))
+        time.sleep(ALERT_PACED_INTERVAL)
     alertflow.close()
 
     end = time.time()
     print(end - start)
 
 def alertflow_server() -> None:
-    alertflow = AlertFlow('server', ALERTFLOW_DEFAULT_PORT)
-    alertflow.connection_acceptance_loop()
+    server = AlertFlowLatencyServer(ALERTFLOW_DEFAULT_PORT, MESSAGE_COUNT + ALERT_PACED_COUNT)
+    server_thread = Thread(target=server.connection_acceptance_loop)
+    server_thread.daemon = True
+    server_thread.start()
+
+    while True:
+        server.all_received.wait()
+
+        burst_start = server.arrival_times[0] - server.latencies[0]
+        burst_rate = MESSAGE_COUNT / (server.arrival_times[MESSAGE_COUNT - 1] - burst_start)
+        print(f'Burst: {burst_rate:.0f} alerts/s')
+
+        for name, latencies in [('Burst', server.latencies[:MESSAGE_COUNT]),
+                                ('Paced', server.latencies[MESSAGE_COUNT:])]:
+            latencies.sort()
+            print(f'{name} latency: '
+                  f'p50 {1000 * latencies[len(latencies) // 2]:.3f} ms, '
+                  f'p99 {1000 * latencies[int(len(latencies) * 0.99)]:.3f} ms')
+
+        server.reset()
+
+def raise_file_limit() -> None:
+    # Every connection needs a file descriptor
+    _, hard_limit = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard_limit, hard_limit))
+
+class AlertFlowCountingServer(AlertFlow):
+    def __init__(self, port: int, done_queue: 'Queue[tuple[int, int]]'):
+        super().__init__('server', port)
+        self.__done_queue = done_queue
+        self.__received = 0
+
+    def handle_message(self, message: bytes, host: str) -> None:
+        # Once everything arrives, reports the server's threads and peak memory
+        self.__received += 1
+        if self.__received == ALERT_CONNECTION_COUNT * ALERT_CONNECTION_MESSAGES:
+            self.__done_queue.put((active_count(),
+                                   resource.getrusage(resource.RUSAGE_SELF).ru_maxrss))
+
+def alertflow_connections_server(done_queue: 'Queue[tuple[int, int]]') -> None:
+    raise_file_limit()
+    AlertFlowCountingServer(ALERT_CONNECTIONS_PORT, done_queue).connection_acceptance_loop()
+
+def alertflow_connections_benchmark() -> None:
+    raise_file_limit()
+    done_queue: 'Queue[tuple[int, int]]' = Queue()
+    server = Process(target=alertflow_connections_server, args=(done_queue,))
+    server.start()
+    time.sleep(0.5) # Let the server bind
+
+    start = time.time()
+    clients = []
+    for i in range(ALERT_CONNECTION_COUNT):
+        client = AlertFlow(f'agent{i}')
+        client.connect('127.0.0.1', ALERT_CONNECTIONS_PORT)
+        clients.append(client)
+    connect_time = time.time() - start
+
+    start = time.time()
+    for _ in range(ALERT_CONNECTION_MESSAGES):
+        for client in clients:
+            client.send(b':)' * 50)
+    threads, max_rss = done_queue.get()
+    alerts_time = time.time() - start
+
+    server.kill()
+    for client in clients:
+        client.close()
+
+    print(f'{ALERT_CONNECTION_COUNT} connections, {ALERT_CONNECTION_MESSAGES} alerts each')
+    print(f'Connecting: {connect_time:.3f} s')
+    alerts_rate = ALERT_CONNECTION_COUNT * ALERT_CONNECTION_MESSAGES / alerts_time
+    print(f'Alerts: {alerts_rate:.0f} alerts/s')
+    print(f'Server threads: {threads}')
+    print(f'Server peak memory: {max_rss / 1024:.1f} MiB')
+
+def alertflow_reconnection_server() -> None:
+    AlertFlow('server', RECONNECTION_PORT).connection_acceptance_loop()
+
+def alertflow_reconnection_benchmark() -> None:
+    # The server goes down and comes back while an agent keeps sending alerts
+    server = Process(target=alertflow_reconnection_server)
+    server.start()
+    time.sleep(0.5) # Let the server bind
+
+    client = AlertFlow('client', outbox_size=RECONNECTION_OUTBOX_SIZE,
+                       overflow_policy=AlertFlowOverflowPolicy.DROP_OLDEST)
+    client.connect('127.0.0.1', RECONNECTION_PORT)
+
+    sent = 0
+    max_send_time = 0.0
+    def send_for(duration: float) -> None:
+        nonlocal sent, max_send_time
+        end_time = time.time() + duration
+        while time.time() < end_time:
+            start = time.time()
+            client.send(timestamped_message(ALERT_MESSAGE_SIZE))
+            max_send_time = max(max_send_time, time.time() - start)
+            sent += 1
+            time.sleep(RECONNECTION_ALERT_INTERVAL)
+
+    send_for(RECONNECTION_PHASE_TIME)
+    server.kill()
+    server.join()
+    outage_start = sent
+
+    send_for(RECONNECTION_PHASE_TIME)
+    restarted_server = AlertFlowLatencyServer(RECONNECTION_PORT, 0)
+    server_thread = Thread(target=restarted_server.connection_acceptance_loop)
+    server_thread.daemon = True
+    server_thread.start()
+
+    send_for(RECONNECTION_PHASE_TIME)
+    client.close()
+    time.sleep(0.5) # Let the server handle the last alerts
+
+    stats = client.stats()
+    latencies = sorted(restarted_server.latencies)
+    print(f'{sent} alerts sent, {sent - outage_start} after the server went down')
+    print(f'Longest send call: {1000 * max_send_time:.3f} ms')
+    print(f'Delivered after restarting: {len(latencies)}')
+    print(f'Dropped from the outbox: {stats["dropped_alerts"]:.0f}')
+    print(f'Reconnections: {stats["reconnections"]:.0f}')
+    print(f'Latency after restarting: p50 {1000 * latencies[len(latencies) // 2]:.1f} ms, '
+          f'max {1000 * latencies[-1]:.1f} ms')
 
 def nettask_client() -> None:
     start = time.time()
@@ -40,12 +245,472 @@ def nettask_server() -> None:
     while True:
         _, _ = nettask.receive()
 
+def nettask_lossy_transfer_time(port: int,
+                                loss: float,
+                                selective_ack: bool,
+                                congestion_controller: Callable[[], NetTaskCongestionController]) \
+    -> float:
+
+    server = NetTask('server', port, selective_ack=selective_ack)
+    emulator = UDPEmulator(port + 1, ('127.0.0.1', port))
+
+    client = NetTask('client',
+                     selective_ack=selective_ack,
+                     congestion_controller=congestion_controller)
+    client.connect('server', ('127.0.0.1', port + 1))
+    # Only after connecting, to avoid measuring the initial timeout
+    emulator.conditions.loss = loss
+
+    def send_all() -> None:
+        for _ in range(LOSSY_MESSAGE_COUNT):
+            client.send(b':)' * 500, 'server')
+
+    start = time.time()
+    sender_thread = Thread(target=send_all)
+    sender_thread.daemon = True
+    sender_thread.start()
+
+    received = 0
+    while received < LOSSY_MESSAGE_COUNT:
+        messages, _ = server.receive()
+        received += len(messages)
+
+    return time.time() - start
+
+def nettask_loss_benchmark() -> None:
+    controllers: dict[str, Callable[[], NetTaskCongestionController]] = {
+        'none': NetTaskNoCongestionController,
+        'AIMD': NetTaskAIMDCongestionController
+    }
+
+    port = LOSSY_BASE_PORT
+    print('loss', 'congestion control', 'cumulative ACK (s)', 'SACK (s)', sep='\t')
+
+    for loss in LOSS_RATES:
+        for name, controller in controllers.items():
+            times = []
+            for selective_ack in [False, True]:
+                times.append(nettask_lossy_transfer_time(port, loss, selective_ack, controller))
+                port += 2
+
+            print(f'{loss:.0%}', name, *(f'{t:.3f}' for t in times), sep='\t')
+
+def nettask_timer_benchmark() -> None:
+    # Accept many connections without any networking
+    timers = NetTaskTimerHeap()
+    connections = []
+    for connection_id in range(1, TIMER_CONNECTION_COUNT + 1):
+        connection = NetTaskConnection(connection_id, 'server', False, timers=timers)
+        connection.handle_received_segment(
+            NetTaskSegment(1, time.time(), connection_id, NetTaskWindowSegmentBody(33, 'agent')))
+        connections.append(connection)
+
+    # Simulate received segments, looking for the next deadline after each one, like __bg_loop
+    next_sequences = [2] * TIMER_CONNECTION_COUNT
+    def receive_packets(next_deadline: Callable[[], Optional[float]]) -> float:
+        start = time.perf_counter()
+        for _ in range(TIMER_PACKET_COUNT):
+            i = random.randrange(TIMER_CONNECTION_COUNT)
+            segment = NetTaskSegment(next_sequences[i], time.time(), i + 1,
+                                     NetTaskKeepAliveSegmentBody())
+            connections[i].handle_received_segment(segment)
+            next_sequences[i] += 1
+            next_deadline()
+
+        return TIMER_PACKET_COUNT / (time.perf_counter() - start)
+
+    scan_rate = receive_packets(lambda: min(c.next_timeout_time() for c in connections))
+    heap_rate = receive_packets(timers.next_deadline)
+
+    print(f'{TIMER_CONNECTION_COUNT} connections')
+    print(f'Scan all connections: {scan_rate:.0f} segments/s')
+    print(f'Timer heap: {heap_rate:.0f} segments/s')
+
+def nettask_threaded_agents_time() -> float:
+    server = NetTask('server', AGENTS_PORT)
+    agents = []
+    for i in range(AGENT_COUNT):
+        agent = NetTask(f'agent{i}')
+        agent.connect('server', ('127.0.0.1', AGENTS_PORT))
+        agents.append(agent)
+
+    def send_all(agent: NetTask) -> None:
+        for _ in range(AGENT_MESSAGE_COUNT):
+            agent.send(b':)' * 50, 'server')
+
+    start = time.time()
+    for agent in agents:
+        sender_thread = Thread(target=send_all, args=(agent,))
+        sender_thread.daemon = True
+        sender_thread.start()
+
+    received = 0
+    while received < AGENT_COUNT * AGENT_MESSAGE_COUNT:
+        messages, _ = server.receive()
+        received += len(messages)
+
+    return time.time() - start
+
+async def nettask_async_agents_time() -> float:
+    server = await AsyncNetTask.create('server', AGENTS_PORT + 1)
+    agents = []
+    for i in range(AGENT_COUNT):
+        agent = await AsyncNetTask.create(f'agent{i}')
+        await agent.connect('server', ('127.0.0.1', AGENTS_PORT + 1))
+        agents.append(agent)
+
+    async def send_all(agent: AsyncNetTask) -> None:
+        for _ in range(AGENT_MESSAGE_COUNT):
+            await agent.send(b':)' * 50, 'server')
+
+    start = time.time()
+    senders = [asyncio.create_task(send_all(agent)) for agent in agents]
+
+    received = 0
+    while received < AGENT_COUNT * AGENT_MESSAGE_COUNT:
+        messages, _ = await server.receive()
+        received += len(messages)
+
+    await asyncio.gather(*senders)
+    return time.time() - start
+
+def nettask_async_benchmark() -> None:
+    print(f'{AGENT_COUNT} agents, {AGENT_MESSAGE_COUNT} messages each')
+    print(f'Threads: {nettask_threaded_agents_time():.3f} s')
+    print(f'asyncio: {asyncio.run(nettask_async_agents_time()):.3f} s')
+
+def nettask_sharded_worker(port: int, received_queue: 'Queue[int]') -> None:
+    nettask = NetTask('server', port, reuse_port=True)
+    while True:
+        messages, _ = nettask.receive()
+        received_queue.put(len([Message.deserialize(message) for message in messages]))
+
+def nettask_sharded_agent(name: str, port: int) -> None:
+    nettask = NetTask(name)
+    nettask.connect('server', ('127.0.0.1', port))
+    message = PingOutput('127.0.0.1', 1.0, 0.5).serialize()
+    for _ in range(SHARDED_MESSAGE_COUNT):
+        nettask.send(message, 'server')
+    nettask.close()
+
+def nettask_sharded_ingestion_rate(workers: int, port: int) -> float:
+    received_queue: 'Queue[int]' = Queue()
+    processes = [Process(target=nettask_sharded_worker, args=(port, received_queue))
+                 for _ in range(workers)]
+    for process in processes:
+        process.start()
+    time.sleep(0.5) # Let workers bind
+
+    start = time.time()
+    agents = [Process(target=nettask_sharded_agent, args=(f'agent{i}', port))
+              for i in range(SHARDED_AGENT_COUNT)]
+    for agent in agents:
+        agent.start()
+
+    received = 0
+    while received < SHARDED_AGENT_COUNT * SHARDED_MESSAGE_COUNT:
+        received += received_queue.get()
+    end = time.time()
+
+    for process in agents + processes:
+        process.kill()
+    return received / (end - start)
+
+def nettask_sharded_benchmark() -> None:
+    print(f'{SHARDED_AGENT_COUNT} agents, {SHARDED_MESSAGE_COUNT} messages each')
+    for i, workers in enumerate(SHARDED_WORKER_COUNTS):
+        rate = nettask_sharded_ingestion_rate(workers, SHARDED_BASE_PORT + i)
+        print(f'{workers} workers: {rate:.0f} messages/s')
+
+def nettask_delivery_latencies(port: int, selective_ack: bool) -> list[float]:
+    server = NetTask('server', port, selective_ack=selective_ack)
+    emulator = UDPEmulator(port + 1, ('127.0.0.1', port))
+
+    client = NetTask('client', selective_ack=selective_ack)
+    client.connect('server', ('127.0.0.1', port + 1))
+    emulator.conditions.loss = LATENCY_LOSS
+
+    # Messages are paced, so that latency comes from losses and not from queueing
+    def send_all() -> None:
+        for _ in range(LATENCY_MESSAGE_COUNT):
+            client.send(struct.pack('>d', time.time()), 'server')
+            time.sleep(LATENCY_MESSAGE_INTERVAL)
+
+    sender_thread = Thread(target=send_all)
+    sender_thread.daemon = True
+    sender_thread.start()
+
+    latencies: list[float] = []
+    while len(latencies) < LATENCY_MESSAGE_COUNT:
+        messages, _ = server.receive()
+        current_time = time.time()
+        latencies += [current_time - struct.unpack('>d', message)[0] for message in messages]
+
+    return sorted(latencies)
+
+def nettask_latency_benchmark() -> None:
+    print(f'{LATENCY_MESSAGE_COUNT} messages, {LATENCY_LOSS:.0%} loss')
+    print('ACK', 'p50 (ms)', 'p99 (ms)', 'max (ms)', sep='\t')
+
+    for i, selective_ack in enumerate([False, True]):
+        latencies = nettask_delivery_latencies(LATENCY_BASE_PORT + 2 * i, selective_ack)
+        percentiles = [latencies[len(latencies) // 2],
+                       latencies[int(len(latencies) * 0.99)],
+                       latencies[-1]]
+
+        print('SACK' if selective_ack else 'cumulative',
+              *(f'{1000 * p:.1f}' for p in percentiles),
+              sep='\t')
+
+def nettask_segment_allocations(body: NetTaskSegmentBody) -> tuple[float, float, float]:
+    # Parsed segments are kept, like in a receive queue, so that what they retain is measured
+    datagrams = [NetTaskSegment(1, time.time(), 1, body).serialize()
+                 for _ in range(ALLOCATION_SEGMENT_COUNT)]
+    parsed: list[Optional[NetTaskSegment]] = [None] * ALLOCATION_SEGMENT_COUNT
+    peak_size = 0
+
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    for i, datagram in enumerate(datagrams):
+        tracemalloc.reset_peak()
+        start_size = tracemalloc.get_traced_memory()[0]
+        parsed[i] = NetTaskSegment.deserialize(datagram)
+        peak_size += tracemalloc.get_traced_memory()[1] - start_size
+
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+
+    ignore_tracemalloc = [tracemalloc.Filter(False, tracemalloc.__file__)]
+    statistics = after.filter_traces(ignore_tracemalloc).compare_to(
+        before.filter_traces(ignore_tracemalloc), 'filename')
+
+    return peak_size / ALLOCATION_SEGMENT_COUNT, \
+        sum(s.size_diff for s in statistics) / ALLOCATION_SEGMENT_COUNT, \
+        sum(s.count_diff for s in statistics) / ALLOCATION_SEGMENT_COUNT
+
+def nettask_allocation_benchmark() -> None:
+    bodies: dict[str, NetTaskSegmentBody] = {
+        'data (1000 B)': NetTaskDataSegmentBody(b':)' * 500),
+        'batch (20 x 50 B)': NetTaskBatchDataSegmentBody([b':)' * 25] * 20),
+        'fragment (1000 B)': NetTaskFragmentSegmentBody(False, b':)' * 500),
+        'ACK': NetTaskAckSegmentBody(1),
+        'SACK (4 ranges)': NetTaskSackSegmentBody(1, [(3, 4), (6, 7), (9, 10), (12, 13)])
+    }
+
+    print('Segment', 'Peak (B)', 'Retained (B)', 'Retained blocks', sep='\t')
+    for name, body in bodies.items():
+        peak_size, retained_size, retained_blocks = nettask_segment_allocations(body)
+        print(name, f'{peak_size:.0f}', f'{retained_size:.0f}', f'{retained_blocks:.1f}',
+              sep='\t')
+
+def nettask_idle_connections_memory() -> None:
+    # Connections are accepted and kept idle, like agents waiting for tasks
+    tracemalloc.start()
+    start_size = tracemalloc.get_traced_memory()[0]
+
+    connections = []
+    for connection_id in range(1, IDLE_CONNECTION_COUNT + 1):
+        connection = NetTaskConnection(connection_id, 'server', False)
+        connection.handle_received_segment(
+            NetTaskSegment(1, time.time(), connection_id, NetTaskWindowSegmentBody(33, 'agent')))
+        connections.append(connection)
+
+    total_size = tracemalloc.get_traced_memory()[0] - start_size
+    tracemalloc.stop()
+
+    print(f'{IDLE_CONNECTION_COUNT} idle connections')
+    print(f'Total: {total_size / 2 ** 20:.1f} MiB')
+    print(f'Per connection: {total_size / IDLE_CONNECTION_COUNT:.0f} B')
+
+def nettask_rate_limited_transfer(
+    port: int,
+    pacing: bool,
+    congestion_controller: Callable[[], NetTaskCongestionController]) -> tuple[float, int]:
+
+    server = NetTask('server', port)
+    emulator = UDPEmulator(port + 1, ('127.0.0.1', port),
+                           LinkConditions(rate=PACING_LINK_RATE, queue_size=PACING_QUEUE_SIZE))
+
+    client = NetTask('client', pacing=pacing, congestion_controller=congestion_controller)
+    client.connect('server', ('127.0.0.1', port + 1))
+
+    def send_all() -> None:
+        for _ in range(PACING_MESSAGE_COUNT):
+            client.send(b':)' * 500, 'server')
+
+    start = time.time()
+    sender_thread = Thread(target=send_all)
+    sender_thread.daemon = True
+    sender_thread.start()
+
+    received = 0
+    while received < PACING_MESSAGE_COUNT:
+        messages, _ = server.receive()
+        received += len(messages)
+
+    return time.time() - start, sum(link.dropped for link in emulator.links())
+
+def nettask_pacing_benchmark() -> None:
+    controllers: dict[str, Callable[[], NetTaskCongestionController]] = {
+        'none': NetTaskNoCongestionController,
+        'AIMD': NetTaskAIMDCongestionController
+    }
+
+    print(f'{PACING_MESSAGE_COUNT} messages, {PACING_LINK_RATE / 2 ** 10:.0f} KiB/s link, '
+          f'{PACING_QUEUE_SIZE} datagram queue')
+    print('congestion control', 'pacing', 'time (s)', 'queue drops', sep='\t')
+
+    port = PACING_BASE_PORT
+    for name, controller in controllers.items():
+        for pacing in [False, True]:
+            transfer_time, dropped = nettask_rate_limited_transfer(port, pacing, controller)
+            print(name, 'on' if pacing else 'off', f'{transfer_time:.3f}', dropped, sep='\t')
+            port += 2
+
+def timestamped_message(size: int = EMULATED_MESSAGE_SIZE) -> bytes:
+    return struct.pack('>d', time.time()) + b'\0' * (size - 8)
+
+def message_latency(message: bytes, current_time: float) -> float:
+    return current_time - struct.unpack_from('>d', message)[0]
+
+def nettask_emulated_transfer(port: int, conditions: LinkConditions) \
+    -> tuple[float, list[float], int]:
+
+    server = NetTask('server', port, mtu=EMULATED_MTU)
+    UDPEmulator(port + 1, ('127.0.0.1', port), conditions)
+    client = NetTask('client', mtu=EMULATED_MTU)
+    client.connect('server', ('127.0.0.1', port + 1))
+
+    def send_all() -> None:
+        for _ in range(EMULATED_MESSAGE_COUNT):
+            client.send(timestamped_message(), 'server')
+
+    start = time.time()
+    sender_thread = Thread(target=send_all)
+    sender_thread.daemon = True
+    sender_thread.start()
+
+    latencies: list[float] = []
+    while len(latencies) < EMULATED_MESSAGE_COUNT:
+        messages, _ = server.receive()
+        current_time = time.time()
+        latencies += [message_latency(message, current_time) for message in messages]
+
+    throughput = EMULATED_MESSAGE_COUNT / (time.time() - start)
+    return throughput, sorted(latencies), int(client.stats('server')['retransmitted_segments'])
+
+class AlertFlowLatencyServer(AlertFlow):
+    def __init__(self, port: int, message_count: int = EMULATED_MESSAGE_COUNT):
+        super().__init__('server', port)
+        self.__message_count = message_count
+        self.latencies: list[float] = []
+        self.arrival_times: list[float] = []
+        self.all_received = Event()
+
+    def handle_message(self, message: bytes, host: str) -> None:
+        current_time = time.time()
+        self.latencies.append(message_latency(message, current_time))
+        self.arrival_times.append(current_time)
+        if len(self.latencies) == self.__message_count:
+            self.all_received.set()
+
+    def reset(self) -> None:
+        self.latencies = []
+        self.arrival_times = []
+        self.all_received.clear()
+
+def alertflow_emulated_transfer(port: int, conditions: LinkConditions) \
+    -> tuple[float, list[float], int]:
+
+    server = AlertFlowLatencyServer(port)
+    server_thread = Thread(target=server.connection_acceptance_loop)
+    server_thread.daemon = True
+    server_thread.start()
+
+    # TCP retransmissions are emulated as stalls, so the emulator counts them
+    emulator = TCPEmulator(port + 1, ('127.0.0.1', port), conditions)
+    client = AlertFlow('client')
+    client.connect('127.0.0.1', port + 1)
+
+    start = time.time()
+    for _ in range(EMULATED_MESSAGE_COUNT):
+        client.send(timestamped_message())
+    server.all_received.wait()
+
+    throughput = EMULATED_MESSAGE_COUNT / (time.time() - start)
+    client.close()
+    return throughput, sorted(server.latencies), sum(link.lost for link in emulator.links())
+
+def emulated_links_benchmark() -> None:
+    transfers: dict[str, Callable[[int, LinkConditions], tuple[float, list[float], int]]] = {
+        'NetTask': nettask_emulated_transfer,
+        'AlertFlow': alertflow_emulated_transfer
+    }
+
+    print(f'{EMULATED_MESSAGE_COUNT} messages of {EMULATED_MESSAGE_SIZE} B')
+    print('transport', 'link', 'messages/s', 'p50 (ms)', 'p99 (ms)', 'retransmissions', sep='\t')
+
+    port = EMULATED_BASE_PORT
+    for transport, transfer in transfers.items():
+        for link, conditions in EMULATED_LINKS.items():
+            throughput, latencies, retransmissions = transfer(port, conditions)
+            port += 2
+
+            print(transport, link, f'{throughput:.0f}',
+                  f'{1000 * latencies[len(latencies) // 2]:.1f}',
+                  f'{1000 * latencies[int(len(latencies) * 0.99)]:.1f}',
+                  retransmissions,
+                  sep='\t')
+
+def codec_operations_per_second(serialize: Callable[[], bytes],
+                                deserialize: Callable[[bytes], object]) -> tuple[float, float]:
+
+    data = serialize()
+    serialize_time = \
+        min(timeit.repeat(serialize, number=CODEC_OPERATION_COUNT, repeat=CODEC_REPEAT_COUNT))
+    deserialize_time = min(timeit.repeat(lambda: deserialize(data),
+                                         number=CODEC_OPERATION_COUNT,
+                                         repeat=CODEC_REPEAT_COUNT))
+
+    return CODEC_OPERATION_COUNT / serialize_time, CODEC_OPERATION_COUNT / deserialize_time
+
+def codec_benchmark() -> None:
+    segment = NetTaskSegment(1, 1.5, 1, NetTaskAckSegmentBody(1))
+    data_segment = NetTaskSegment(1, 1.5, 1, NetTaskDataSegmentBody(b':)' * 25))
+    task = MessageTask('task', 10.0, PingCommand(['1.1.1.1', '9.9.9.9'], 5, 100.0))
+
+    codecs: dict[str, tuple[Callable[[], bytes], Callable[[bytes], object]]] = {
+        'ACK segment': (segment.serialize, NetTaskSegment.deserialize),
+        'data segment (50 B)': (data_segment.serialize, NetTaskSegment.deserialize),
+        'PingOutput': (PingOutput('9.9.9.9', 10.125, 1.5).serialize, Message.deserialize),
+        'IPOutput': (IPOutput('wlan0', True, 1000, 10, 20000, 200).serialize, Message.deserialize),
+        'MessageTask': (task.serialize, Message.deserialize),
+        'SystemMonitorCommand': (SystemMonitorCommand(0.5, 0.75).serialize, Command.deserialize)
+    }
+
+    print('Type', 'Serialize (ops/s)', 'Deserialize (ops/s)', sep='\t')
+    for name, (serialize, deserialize) in codecs.items():
+        serialize_rate, deserialize_rate = codec_operations_per_second(serialize, deserialize)
+        print(name, f'{serialize_rate:.0f}', f'{deserialize_rate:.0f}', sep='\t')
+
 def main(argv: list[str]) -> None:
     fn = {
         '-uc': nettask_client,
         '-us': nettask_server,
+        '-ul': nettask_loss_benchmark,
+        '-ut': nettask_timer_benchmark,
+        '-ua': nettask_async_benchmark,
+        '-uw': nettask_sharded_benchmark,
+        '-up': nettask_latency_benchmark,
+        '-um': nettask_allocation_benchmark,
+        '-ui': nettask_idle_connections_memory,
+        '-ur': nettask_pacing_benchmark,
+        '-ue': emulated_links_benchmark,
+        '-uk': codec_benchmark,
         '-tc': alertflow_client,
-        '-ts': alertflow_server
+        '-ts': alertflow_server,
+        '-tm': alertflow_connections_benchmark,
+        '-tr': alertflow_reconnection_benchmark
     }
 
     if len(argv) != 2 or argv[1] not in fn: